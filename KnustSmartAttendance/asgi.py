@@ -3,6 +3,12 @@ ASGI config for KnustSmartAttendance project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with e.g.
+
+    gunicorn KnustSmartAttendance.asgi:application -k uvicorn.workers.UvicornWorker
+
+and set ATTENDANCE_ASYNC_SCAN=1 so QR codes open the async scan view.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,64 @@
+"""Bootstraps Django for the standalone benchmark scripts.
+
+Each benchmark runs against a throwaway database created the same way the
+test runner creates one, so the project database is never touched. Pass
+``on_disk=True`` to use a temporary SQLite file instead of memory when the
+cost of commits is what is being measured.
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KnustSmartAttendance.settings')
+# Every benchmark client posts from one address; measure the views, not the limiter
+os.environ.setdefault('ATTENDANCE_RATE_LIMIT_ENABLED', '0')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    setup_test_environment, teardown_test_environment)
+
+
+@contextmanager
+def test_database(on_disk=False):
+    """Creates a fresh migrated database for the duration of the block."""
+    tmpdir = None
+    if on_disk and connection.vendor == 'sqlite':
+        tmpdir = tempfile.TemporaryDirectory()
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(
+            tmpdir.name, 'bench.sqlite3')
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+
+@contextmanager
+def timer(results, label):
+    """Stores the elapsed wall time of the block in ``results[label]``."""
+    start = time.perf_counter()
+    yield
+    results[label] = time.perf_counter() - start
+
+
+def percentile(values, pct):
+    """Returns the nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
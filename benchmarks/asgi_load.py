@@ -0,0 +1,147 @@
+"""Scan capacity of one server process, WSGI (gunicorn) vs ASGI (uvicorn).
+
+Starts each server as a single worker process on a temporary on-disk SQLite
+database, then has ``--clients`` concurrent students each open the scan form
+(to get the CSRF cookie) and submit it, exactly as a phone would. Reports
+throughput and p50/p99 submit latency for each server at each concurrency.
+
+    python benchmarks/asgi_load.py [--students 2000] [--clients 16 64 256]
+                                   [--wsgi-threads 8]
+
+The WSGI run uses ``gunicorn --threads``, so its concurrency is capped by the
+thread count; the ASGI run serves scan_attendance_async on one event loop.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+_tmpdir = tempfile.TemporaryDirectory()
+DATABASE_URL = f"sqlite:///{os.path.join(_tmpdir.name, 'asgi_load.sqlite3')}"
+# Must be set before Django reads the settings
+os.environ['DATABASE_URL'] = DATABASE_URL
+
+from _django import ROOT, percentile  # noqa: E402
+
+from django.core.management import call_command  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from benchmarks.fixtures import make_course, make_lecturer, make_students  # noqa: E402
+from core.models import AttendanceRecord, LectureSession, SessionKey  # noqa: E402
+
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(kind, port, threads):
+    if kind == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'KnustSmartAttendance.wsgi',
+                '--workers', '1', '--threads', str(threads),
+                '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'KnustSmartAttendance.asgi:application',
+            '--workers', '1', '--host', '127.0.0.1', '--port', str(port),
+            '--log-level', 'warning', '--no-access-log']
+
+
+def start_server(kind, threads):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=DATABASE_URL,
+               ATTENDANCE_ASYNC_SCAN='1' if kind == 'asgi' else '0')
+    process = subprocess.Popen(server_command(kind, port, threads), cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def student_scan(url, student):
+    """GETs the form and POSTs it; returns the POST latency or None on failure."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    try:
+        page = opener.open(url, timeout=60).read().decode()
+        token = CSRF_INPUT.search(page).group(1)
+        body = urllib.parse.urlencode({
+            'csrfmiddlewaretoken': token,
+            'full_name': student.full_name,
+            'index_number': student.index_number,
+            'latitude': '6.6710', 'longitude': '-1.5658'}).encode()
+        began = time.perf_counter()
+        result = opener.open(url, data=body, timeout=60).read().decode()
+    except (OSError, AttributeError):
+        return None
+    if 'Attendance recorded' not in result:
+        return None
+    return time.perf_counter() - began
+
+
+def run_level(url, students, clients):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(lambda s: student_scan(url, s), students))
+    wall = time.perf_counter() - start
+    ok = [value for value in latencies if value is not None]
+    return ok, len(latencies) - len(ok), wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--clients', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--wsgi-threads', type=int, default=8)
+    parser.add_argument('--servers', nargs='+', default=['wsgi', 'asgi'],
+                        choices=['wsgi', 'asgi'])
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    course = make_course(make_lecturer(), code='ASGI 101')
+    students = make_students(course, args.students)
+    session = SessionKey.objects.create(
+        key=f'{course.pk}|asgi', course=course,
+        expires_at=timezone.now() + timedelta(hours=1),
+        required_latitude=6.6710, required_longitude=-1.5658)
+    LectureSession.for_session_key(session)
+
+    print(f"{'server':>6} {'clients':>8} {'ok':>6} {'failed':>7} {'scans/s':>8} "
+          f"{'p50 (ms)':>9} {'p99 (ms)':>9}")
+    try:
+        for kind in args.servers:
+            view = 'core:scan_attendance_async' if kind == 'asgi' else 'core:scan_attendance'
+            path = reverse(view, kwargs={'key': session.key})
+            process, host = start_server(kind, args.wsgi_threads)
+            try:
+                for clients in args.clients:
+                    AttendanceRecord.objects.all().delete()
+                    ok, failed, wall = run_level(host + path, students, clients)
+                    print(f"{kind:>6} {clients:>8} {len(ok):>6} {failed:>7} "
+                          f"{len(ok) / wall:>8.0f} {percentile(ok, 50) * 1000:>9.1f} "
+                          f"{percentile(ok, 99) * 1000:>9.1f}")
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        _tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
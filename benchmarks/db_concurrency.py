@@ -0,0 +1,143 @@
+"""Concurrent scan writes under each database connection configuration.
+
+Drives ``--threads`` clients posting ``--students`` scans as fast as they can
+and reports throughput, p50/p99 latency and "database is locked" errors for:
+
+* ``sqlite-default``  rollback journal, deferred transactions, no tuning
+* ``sqlite-tuned``    the project settings: WAL, busy_timeout,
+                      synchronous=NORMAL and IMMEDIATE transactions
+* ``postgres``        persistent connections (CONN_MAX_AGE) with health checks
+* ``postgres-pool``   a psycopg 3 connection pool
+
+The Postgres configurations run only when DATABASE_URL points at a server
+the user may create a test database on.
+
+    python benchmarks/db_concurrency.py [--students 1000] [--threads 32]
+                                        [--configs sqlite-default sqlite-tuned]
+"""
+import argparse
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from _django import percentile, test_database
+
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from benchmarks.fixtures import make_course, make_lecturer, make_students
+from core.models import AttendanceRecord, LectureSession, SessionKey
+from core.session_cache import active_sessions
+
+CONFIGS = {
+    'sqlite-default': ('sqlite', {'CONN_MAX_AGE': 0, 'OPTIONS': {}}),
+    'sqlite-tuned': ('sqlite', {}),
+    'postgres': ('postgresql', {'CONN_MAX_AGE': 60, 'OPTIONS': {}}),
+    'postgres-pool': ('postgresql', {
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {'pool': {'min_size': 4, 'max_size': 16, 'timeout': 10}}}),
+}
+
+
+def open_session(course):
+    session = SessionKey.objects.create(
+        key=f'{course.pk}|db', course=course,
+        expires_at=timezone.now() + timedelta(hours=1),
+        required_latitude=6.6710, required_longitude=-1.5658)
+    LectureSession.for_session_key(session)
+    active_sessions.put(session)
+    return session
+
+
+def run_writes(url, students, threads):
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, errors = [], {'locked': 0, 'other': 0}
+
+    def scan(student):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client()
+        began = time.perf_counter()
+        try:
+            client.post(url, {
+                'full_name': student.full_name,
+                'index_number': student.index_number,
+                'latitude': '6.6710', 'longitude': '-1.5658'})
+        except OperationalError as exc:
+            with lock:
+                errors['locked' if 'locked' in str(exc) else 'other'] += 1
+            return
+        finally:
+            # What request_finished does: keeps the connection if the
+            # configuration allows it, like a real worker thread would
+            close_old_connections()
+        with lock:
+            latencies.append(time.perf_counter() - began)
+
+    barrier = threading.Barrier(threads)
+
+    def release(_):
+        # One per worker thread, so every thread closes its own connection
+        barrier.wait()
+        connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(scan, students))
+        wall = time.perf_counter() - start
+        list(pool.map(release, range(threads)))
+    return latencies, errors, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS))
+    args = parser.parse_args()
+
+    vendor = connection.vendor
+    configs = args.configs or [name for name, (v, _) in CONFIGS.items() if v == vendor]
+    original = copy.deepcopy(connection.settings_dict)
+
+    print(f"{'config':>15} {'ok':>6} {'locked':>7} {'other':>6} {'scans/s':>8} "
+          f"{'p50 (ms)':>9} {'p99 (ms)':>9} {'records':>8}")
+    for name in configs:
+        backend, overrides = CONFIGS[name]
+        if backend != vendor:
+            print(f'{name:>15} skipped, DATABASE_URL is {vendor}')
+            continue
+        # Thread connections are built from this same dict, so updating it
+        # in place reconfigures every connection opened from here on
+        connection.close()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(copy.deepcopy(original), **overrides)
+
+        with test_database(on_disk=True):
+            course = make_course(make_lecturer(), code=f'DB {name}')
+            students = make_students(course, args.students)
+            session = open_session(course)
+            url = reverse('core:scan_attendance', kwargs={'key': session.key})
+            connection.close()
+
+            latencies, errors, wall = run_writes(url, students, args.threads)
+
+            print(f"{name:>15} {len(latencies):>6} {errors['locked']:>7} "
+                  f"{errors['other']:>6} {len(latencies) / wall:>8.0f} "
+                  f"{percentile(latencies, 50) * 1000:>9.1f} "
+                  f"{percentile(latencies, 99) * 1000:>9.1f} "
+                  f"{AttendanceRecord.objects.count():>8}")
+            active_sessions.clear()
+
+    connection.close()
+    connection.settings_dict.clear()
+    connection.settings_dict.update(original)
+
+
+if __name__ == '__main__':
+    main()
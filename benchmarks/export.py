@@ -0,0 +1,85 @@
+"""Export time and peak Python memory over a synthetic dataset.
+
+Builds ``--courses`` courses whose students attend ``--sessions`` sessions,
+for ``--records`` attendance records in total, then times the streaming
+grade sheet and register exports. "buffered" builds the same rows as a
+list first, the way view_grades builds its student_data table.
+
+    python benchmarks/export.py [--records 100000] [--courses 4] [--sessions 25]
+"""
+import argparse
+import io
+import time
+import tracemalloc
+from datetime import timedelta
+
+from _django import test_database
+
+from django.utils import timezone
+
+from benchmarks.fixtures import make_course, make_lecturer, make_students
+from core.exports import iter_grade_sheet, iter_register, stream_csv
+from core.models import AttendanceRecord, Course, LectureSession
+
+
+def build_dataset(records, courses, sessions):
+    lecturer = make_lecturer()
+    students_per_course = records // (courses * sessions)
+    start = timezone.now() - timedelta(days=sessions * 7)
+    for c in range(courses):
+        course = make_course(lecturer, code=f'EXP {c}')
+        students = make_students(course, students_per_course, prefix=str(c + 1))
+        for s in range(sessions):
+            lecture = LectureSession.objects.create(
+                course=course, label=f'Week {s + 1}',
+                held_at=start + timedelta(days=7 * s))
+            AttendanceRecord.objects.bulk_create([
+                AttendanceRecord(course=course, student=student, session=lecture,
+                                 timestamp=lecture.held_at)
+                for student in students
+            ], batch_size=2000)
+
+
+def measure(label, produce):
+    tracemalloc.start()
+    began = time.perf_counter()
+    lines = produce()
+    elapsed = time.perf_counter() - began
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:>22} {lines:>9} {elapsed:>9.2f} {peak / 1024 / 1024:>10.1f}")
+
+
+def drain(chunks):
+    sink, lines = io.StringIO(), 0
+    for chunk in chunks:
+        sink.write(chunk)
+        sink.seek(0)
+        sink.truncate()
+        lines += 1
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--courses', type=int, default=4)
+    parser.add_argument('--sessions', type=int, default=25)
+    args = parser.parse_args()
+
+    with test_database():
+        build_dataset(args.records, args.courses, args.sessions)
+        courses = list(Course.objects.order_by('course_code'))
+        print(f'{AttendanceRecord.objects.count()} attendance records')
+        print(f"{'export':>22} {'rows':>9} {'time (s)':>9} {'peak (MiB)':>10}")
+
+        measure('grades streamed', lambda: drain(stream_csv(iter_grade_sheet(courses))))
+        measure('grades buffered', lambda: drain(stream_csv(list(iter_grade_sheet(courses)))))
+        measure('registers streamed', lambda: sum(
+            drain(stream_csv(iter_register(course))) for course in courses))
+        measure('registers buffered', lambda: sum(
+            drain(stream_csv(list(iter_register(course)))) for course in courses))
+
+
+if __name__ == '__main__':
+    main()
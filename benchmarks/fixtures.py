@@ -0,0 +1,32 @@
+"""Synthetic data builders shared by the benchmark scripts."""
+from django.contrib.auth.models import User
+
+from core.models import Course, Student, StudentMaxMarks
+
+
+def make_lecturer(username='bench-lecturer'):
+    user, _ = User.objects.get_or_create(username=username)
+    return user
+
+
+def make_course(lecturer, code='BENCH 101', lectures=12):
+    course = Course.objects.create(
+        course_code=code, name=f'{code} Benchmark', lecturer=lecturer,
+        total_lectures_possible=lectures)
+    StudentMaxMarks.objects.create(course=course)
+    return course
+
+
+def make_students(course, count, prefix='9'):
+    """Creates and enrolls ``count`` students in bulk and returns them."""
+    students = Student.objects.bulk_create([
+        Student(index_number=f'{prefix}{course.pk:03d}{i:06d}',
+                full_name=f'Benchmark Student {course.pk} {i}')
+        for i in range(count)
+    ])
+    Through = Student.courses.through
+    Through.objects.bulk_create([
+        Through(student_id=s.index_number, course_id=course.pk)
+        for s in students
+    ])
+    return students
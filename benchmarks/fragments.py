@@ -0,0 +1,77 @@
+"""Rendering time saved by the cached course pickers and roster table.
+
+Each lecturer page is requested through the test client with the
+fragment cache emptied before every request ("cold", as every request
+rendered before fragments were cached) and again with it warm.
+
+    python benchmarks/fragments.py [--students 500] [--courses 8]
+    ATTENDANCE_CACHE=file python benchmarks/fragments.py
+"""
+import argparse
+import time
+
+from _django import test_database
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from fixtures import make_course, make_lecturer, make_students
+
+
+def measure(client, url, iterations, cold):
+    """Returns (ms per request, queries per request)."""
+    queries = [0]
+
+    def counter(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    spent = 0.0
+    client.get(url)
+    with connection.execute_wrapper(counter):
+        for _ in range(iterations):
+            if cold:
+                cache.clear()
+            start = time.perf_counter()
+            response = client.get(url)
+            spent += time.perf_counter() - start
+            assert response.status_code == 200, response.status_code
+    return spent / iterations * 1000, queries[0] / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--courses', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database(), override_settings(DEBUG=False):
+        lecturer = make_lecturer()
+        courses = [make_course(lecturer, code=f'BENCH {100 + number}')
+                   for number in range(args.courses)]
+        make_students(courses[0], args.students)
+        client = Client()
+        client.force_login(lecturer)
+
+        pages = [
+            ('record_attendance + roster',
+             f"{reverse('core:record_attendance')}?course_id={courses[0].pk}"),
+            ('record_attendance', reverse('core:record_attendance')),
+            ('view_grades', reverse('core:view_grades')),
+            ('generate_qr_code', reverse('core:generate_qr_code')),
+        ]
+        print(f"{'page':<28} {'cold (ms)':>10} {'warm (ms)':>10} {'saved':>7} "
+              f"{'cold q':>7} {'warm q':>7}")
+        for label, url in pages:
+            cold_ms, cold_q = measure(client, url, args.iterations, cold=True)
+            warm_ms, warm_q = measure(client, url, args.iterations, cold=False)
+            print(f'{label:<28} {cold_ms:>10.2f} {warm_ms:>10.2f} '
+                  f'{1 - warm_ms / cold_ms:>7.0%} {cold_q:>7.1f} {warm_q:>7.1f}')
+
+
+if __name__ == '__main__':
+    main()
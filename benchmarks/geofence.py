@@ -0,0 +1,64 @@
+"""Geofence throughput, scalar checks against the NumPy batch API.
+
+"legacy" is the original per-request haversine on Decimal fields,
+"scalar" is a precomputed fence's check() in a Python loop, and "batch"
+is check_many() over the whole array. No database is needed.
+
+    python benchmarks/geofence.py [--points 10000 100000 1000000]
+"""
+import argparse
+import time
+from decimal import Decimal
+from math import atan2, cos, radians, sin, sqrt
+
+import _django  # noqa: F401
+
+import numpy as np
+
+from core.geofence import CircleFence, PolygonFence
+
+CENTRE = (6.6710, -1.5658)
+HALL = [[6.6705, -1.5663], [6.6705, -1.5653], [6.6715, -1.5653], [6.6715, -1.5663]]
+
+
+def legacy_check(required_lat, required_lon, lat, lon, tolerance):
+    lat1, lon1 = map(radians, [required_lat, required_lon])
+    lat2, lon2 = map(radians, [float(lat), float(lon)])
+    dlon, dlat = lon2 - lon1, lat2 - lat1
+    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+    return 6371 * 2 * atan2(sqrt(a), sqrt(1 - a)) * 1000 <= tolerance
+
+
+def rate(count, fn):
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--points', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+    rng = np.random.default_rng(3)
+    required = (Decimal('6.671000'), Decimal('-1.565800'))
+
+    print(f"{'points':>9} {'fence':>8} {'legacy/s':>12} {'scalar/s':>12} "
+          f"{'batch/s':>14} {'batch vs scalar':>16}")
+    for count in args.points:
+        lats = CENTRE[0] + rng.normal(0, 0.0008, count)
+        lons = CENTRE[1] + rng.normal(0, 0.0008, count)
+        pairs = list(zip(lats.tolist(), lons.tolist()))
+
+        legacy = rate(count, lambda: [
+            legacy_check(*required, lat, lon, 50) for lat, lon in pairs])
+        for fence in (CircleFence(*CENTRE, 50), PolygonFence(HALL, 10)):
+            scalar = rate(count, lambda: [fence.check(lat, lon) for lat, lon in pairs])
+            batch = rate(count, lambda: fence.check_many(lats, lons))
+            legacy_col = f'{legacy:>12,.0f}' if fence.kind == 'circle' else f"{'-':>12}"
+            print(f"{count:>9} {fence.kind:>8} {legacy_col} {scalar:>12,.0f} "
+                  f"{batch:>14,.0f} {batch / scalar:>15.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Cold and warm QR generation time.
+
+"legacy" renders the PNG and base64-encodes it, as generate_qr_code did on
+every request. "cold" is the first session_qr_image() call for a key and
+"warm" a repeat call served from the LRU cache.
+
+    python benchmarks/qr_image.py [--keys 200]
+"""
+import argparse
+import base64
+import time
+
+import _django  # noqa: F401
+
+from core.qr import render_qr, scan_url, session_qr_image
+
+
+def per_call_ms(fn, keys):
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter() - start) / len(keys) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--keys', type=int, default=200)
+    args = parser.parse_args()
+    keys = [f'{i}|{1700000000 + i}.123456' for i in range(args.keys)]
+
+    legacy = per_call_ms(
+        lambda key: base64.b64encode(render_qr(scan_url(key))).decode(), keys)
+    print(f"{'format':>6} {'legacy (ms)':>12} {'cold (ms)':>10} {'warm (ms)':>10} {'bytes':>7}")
+    for fmt in ('png', 'svg'):
+        session_qr_image.cache_clear()
+        cold = per_call_ms(lambda key: session_qr_image(key, fmt), keys)
+        warm = per_call_ms(lambda key: session_qr_image(key, fmt), keys)
+        size = len(session_qr_image(keys[0], fmt)[0])
+        legacy_col = f'{legacy:>12.3f}' if fmt == 'png' else f"{'-':>12}"
+        print(f"{fmt:>6} {legacy_col} {cold:>10.3f} {warm:>10.4f} {size:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Rotating QR token verification throughput.
+
+Compares verify_token() for a current, a just-rotated and a forged token
+with the database lookup the scan path used to do for every request.
+
+    python benchmarks/qr_tokens.py [--iterations 100000]
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from _django import test_database
+
+from django.utils import timezone
+
+from benchmarks.fixtures import make_course, make_lecturer
+from core.models import SessionKey
+from core.tokens import current_slot, make_token, verify_token
+
+PERIOD = 30
+FORM_SECONDS = 120
+
+
+def per_second(iterations, fn):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+    key = '12|1700000000.123456'
+    slot = current_slot(PERIOD)
+    cases = {
+        'current (scan)': (make_token(key, slot), PERIOD),
+        'previous (form)': (make_token(key, slot - 1), FORM_SECONDS),
+        'forged (form)': ('AAAAAAAAAAAAAAAA', FORM_SECONDS),
+    }
+
+    print(f"{'case':>18} {'verifications/s':>16}")
+    for label, (token, max_age) in cases.items():
+        rate = per_second(args.iterations,
+                          lambda: verify_token(key, token, PERIOD, max_age))
+        print(f"{label:>18} {rate:>16,.0f}")
+
+    with test_database():
+        course = make_course(make_lecturer())
+        SessionKey.objects.create(key=key, course=course,
+                                  expires_at=timezone.now() + timedelta(hours=1))
+        rate = per_second(min(args.iterations, 20000), lambda: SessionKey.objects
+                          .select_related('course').get(key=key))
+        print(f"{'SessionKey lookup':>18} {rate:>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
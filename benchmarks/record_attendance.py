@@ -0,0 +1,52 @@
+"""Commit time of a manual attendance submission, before and after batching.
+
+"before" replays the original per-student get() + create() loop, where each
+insert autocommits on its own. "after" uses record_manual_session, which
+resolves all students in one lookup and bulk-inserts in one transaction.
+
+    python benchmarks/record_attendance.py [--sizes 50 500 5000]
+"""
+import argparse
+
+from _django import test_database, timer
+
+from django.utils import timezone
+
+from benchmarks.fixtures import make_course, make_lecturer, make_students
+from core.attendance import record_manual_session
+from core.models import AttendanceRecord, LectureSession, Student
+
+
+def legacy_submit(course, label, index_numbers):
+    lecture = LectureSession.objects.create(course=course, label=label)
+    for index_number in index_numbers:
+        student = Student.objects.get(index_number=index_number)
+        AttendanceRecord.objects.create(
+            course=course, student=student, session=lecture,
+            timestamp=timezone.now())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    args = parser.parse_args()
+
+    with test_database(on_disk=True):
+        lecturer = make_lecturer()
+        print(f"{'students':>8} {'before (s)':>12} {'after (s)':>12} {'speedup':>8}")
+        for size in args.sizes:
+            course = make_course(lecturer, code=f'BENCH {size}')
+            index_numbers = [s.index_number for s in make_students(course, size)]
+
+            results = {}
+            with timer(results, 'before'):
+                legacy_submit(course, 'legacy', index_numbers)
+            with timer(results, 'after'):
+                record_manual_session(course, 'bulk', index_numbers)
+
+            print(f"{size:>8} {results['before']:>12.4f} {results['after']:>12.4f}"
+                  f" {results['before'] / results['after']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Roster import time for tens of thousands of enrollments.
+
+Writes a synthetic CSV roster of ``--enrollments`` rows spread over
+``--courses`` courses and imports it with import_roster. "one at a time"
+times the admin-style path (create the student, then add the course) on
+a sample and extrapolates it to the full roster.
+
+    python benchmarks/roster_import.py [--enrollments 50000] [--courses 10]
+"""
+import argparse
+import csv
+import io
+import time
+
+from _django import test_database
+
+from benchmarks.fixtures import make_course, make_lecturer
+from core.models import Student
+from core.roster_import import import_roster, iter_roster_rows
+
+
+def make_roster(enrollments, course_codes):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['index_number', 'full_name', 'course_code'])
+    students = enrollments // 2
+    for i in range(enrollments):
+        student = i % students
+        writer.writerow([f'{student:08d}', f'Imported Student {student}',
+                         course_codes[i % len(course_codes)]])
+    return io.BytesIO(buffer.getvalue().encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--enrollments', type=int, default=50000)
+    parser.add_argument('--courses', type=int, default=10)
+    parser.add_argument('--sample', type=int, default=500)
+    args = parser.parse_args()
+
+    with test_database(on_disk=True):
+        lecturer = make_lecturer()
+        courses = [make_course(lecturer, code=f'IMP {c}') for c in range(args.courses)]
+        roster = make_roster(args.enrollments, [c.course_code for c in courses])
+
+        began = time.perf_counter()
+        report = import_roster(iter_roster_rows(roster), progress=lambda r: None)
+        bulk = time.perf_counter() - began
+
+        began = time.perf_counter()
+        for i in range(args.sample):
+            student = Student.objects.create(index_number=f'S{i:07d}',
+                                             full_name=f'Sample Student {i}')
+            student.courses.add(courses[i % len(courses)])
+        per_row = (time.perf_counter() - began) / args.sample
+
+        print(f'{report.enrollments} enrollments for {Student.objects.count() - args.sample} '
+              f'students imported in {bulk:.2f}s '
+              f'({report.enrollments / bulk:,.0f} rows/s)')
+        print(f'one at a time: {per_row * 1000:.2f} ms/row, about '
+              f'{per_row * args.enrollments:.0f}s for the same roster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Fuzzy name match latency against roster size.
+
+"before" scores every student with fuzzywuzzy in a Python loop, lowercasing
+each name on every scan, as scan_attendance used to. "after" queries a
+prebuilt RosterIndex. No database is needed.
+
+    python benchmarks/roster_match.py [--sizes 100 1000 5000] [--scans 200]
+"""
+import argparse
+import random
+import time
+
+import _django  # noqa: F401
+
+from fuzzywuzzy import fuzz
+
+from core.roster import RosterIndex
+
+FIRST = ['Kwame', 'Ama', 'Kofi', 'Akosua', 'Yaw', 'Abena', 'Kwesi', 'Efua',
+         'Kojo', 'Adwoa', 'Kwabena', 'Afua', 'Kwaku', 'Esi']
+LAST = ['Mensah', 'Owusu', 'Boateng', 'Asante', 'Osei', 'Agyeman', 'Appiah',
+        'Darko', 'Amoah', 'Ofori', 'Acheampong', 'Frimpong', 'Sarpong']
+
+
+def make_roster(size, rng):
+    return [(f'{i:08d}', f'{rng.choice(FIRST)} {rng.choice(FIRST)} '
+             f'{rng.choice(LAST)} {i}') for i in range(size)]
+
+
+def legacy_match(query, roster):
+    best_match, highest_score = None, 0
+    for index_number, full_name in roster:
+        score = fuzz.partial_ratio(query.lower(), full_name.lower())
+        if score > 85 and score > highest_score:
+            best_match, highest_score = index_number, score
+    return best_match
+
+
+def per_scan_ms(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--scans', type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"{'roster':>7} {'build (ms)':>11} {'before (ms/scan)':>17} "
+          f"{'after (ms/scan)':>16} {'speedup':>8}")
+    for size in args.sizes:
+        roster = make_roster(size, rng)
+        queries = [rng.choice(roster)[1].upper() for _ in range(args.scans)]
+
+        start = time.perf_counter()
+        index = RosterIndex(roster)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        before = per_scan_ms(lambda q: legacy_match(q, roster), queries)
+        after = per_scan_ms(index.match, queries)
+        print(f"{size:>7} {build_ms:>11.2f} {before:>17.3f} {after:>16.3f}"
+              f" {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
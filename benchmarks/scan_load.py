@@ -0,0 +1,114 @@
+"""Load test of concurrent QR scans, synchronous writes vs the ingest queue.
+
+Simulates ``--students`` students scanning within ``--duration`` seconds
+(arrival times uniformly spread) from ``--threads`` concurrent clients
+against an on-disk SQLite database, and reports p50/p99 latency and the
+number of "database is locked" errors for each mode.
+
+    python benchmarks/scan_load.py [--students 1000] [--duration 60]
+                                   [--threads 50] [--modes sync queued]
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from _django import percentile, test_database
+
+from django.db import OperationalError, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from benchmarks.fixtures import make_course, make_lecturer, make_students
+from core import ingest
+from core.models import AttendanceRecord, SessionKey
+from core.session_cache import active_sessions
+
+
+def open_session(course):
+    session = SessionKey.objects.create(
+        key=f'{course.pk}|load', course=course,
+        expires_at=timezone.now() + timedelta(hours=1),
+        required_latitude=6.6710, required_longitude=-1.5658)
+    active_sessions.put(session)
+    return session
+
+
+def run_load(url, students, duration, threads, seed):
+    rng = random.Random(seed)
+    schedule = sorted(rng.uniform(0, duration) for _ in students)
+    jobs = list(zip(schedule, students))
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, errors = [], {'locked': 0, 'other': 0}
+    start = time.perf_counter()
+
+    def scan(job):
+        at, student = job
+        delay = start + at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client()
+        began = time.perf_counter()
+        try:
+            client.post(url, {
+                'full_name': student.full_name,
+                'index_number': student.index_number,
+                'latitude': '6.6710', 'longitude': '-1.5658'})
+        except OperationalError as exc:
+            with lock:
+                errors['locked' if 'locked' in str(exc) else 'other'] += 1
+            return
+        finally:
+            connections.close_all()
+        with lock:
+            latencies.append(time.perf_counter() - began)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(scan, jobs))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--modes', nargs='+', default=['sync', 'queued'],
+                        choices=['sync', 'queued'])
+    args = parser.parse_args()
+
+    print(f"{'mode':>7} {'ok':>6} {'locked':>7} {'other':>6} {'p50 (ms)':>9} "
+          f"{'p99 (ms)':>9} {'records':>8} {'wall (s)':>9}")
+    for mode in args.modes:
+        with test_database(on_disk=True), tempfile.TemporaryDirectory() as spool:
+            course = make_course(make_lecturer(), code=f'LOAD {mode}')
+            students = make_students(course, args.students)
+            session = open_session(course)
+            url = reverse('core:scan_attendance', kwargs={'key': session.key})
+            config = {'ENABLED': mode == 'queued', 'BATCH_SIZE': 200,
+                      'FLUSH_INTERVAL': 0.5, 'SPOOL_DIR': spool}
+
+            with override_settings(ATTENDANCE_INGEST=config):
+                ingest._queue = None
+                latencies, errors, wall = run_load(
+                    url, students, args.duration, args.threads, seed=1)
+                if ingest._queue is not None:
+                    ingest._queue.stop()
+                    ingest._queue = None
+
+            print(f"{mode:>7} {len(latencies):>6} {errors['locked']:>7} "
+                  f"{errors['other']:>6} {percentile(latencies, 50) * 1000:>9.1f} "
+                  f"{percentile(latencies, 99) * 1000:>9.1f} "
+                  f"{AttendanceRecord.objects.count():>8} {wall:>9.1f}")
+            connections.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""Repeatable benchmark of the main attendance workflows, reported as JSON.
+
+Drives scan_attendance (student form submissions), batched scans through
+the JSON API, record_attendance (manual registers), view_grades and
+generate_qr_code through the Django test client and reports, per workflow, throughput, latency percentiles and
+SQL queries per request, together with the commit and machine it ran on.
+
+By default a fresh on-disk database is filled with a synthetic dataset of
+the given size (same seed, same data). ``--existing`` instead runs against
+the configured database, e.g. one filled by ``manage.py generate_dataset``,
+inside a transaction that is rolled back afterwards.
+
+    python benchmarks/suite.py [--courses 10] [--students 4000]
+                               [--records 100000] [--output results.json]
+    DATABASE_URL=sqlite:////tmp/load.sqlite3 python benchmarks/suite.py --existing
+
+Compare two runs with any JSON diff; keys are stable across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from _django import ROOT, percentile, test_database
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment)
+from django.urls import reverse
+from django.utils import timezone
+
+from core.api import issue_token
+from core.models import Course, LectureSession, SessionKey, Student
+from core.session_cache import active_sessions
+from core.synthetic import generate_dataset
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True,
+                                capture_output=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    cwd=ROOT, text=True, capture_output=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+class Workflow:
+    """Latencies and query counts of one workflow's requests."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.queries = []
+        self.failures = 0
+        self._elapsed = 0.0
+
+    @contextmanager
+    def request(self):
+        count = [0]
+
+        def counter(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            began = time.perf_counter()
+            yield
+            spent = time.perf_counter() - began
+        self.latencies.append(spent)
+        self.queries.append(count[0])
+        self._elapsed += spent
+
+    def check(self, response, expected=200, text=None):
+        if response.status_code != expected or (
+                text is not None and text not in response.content.decode()):
+            self.failures += 1
+
+    def summary(self):
+        ms = [value * 1000 for value in self.latencies]
+        return {
+            'requests': len(ms),
+            'failures': self.failures,
+            'throughput_per_s': round(len(ms) / self._elapsed, 1) if self._elapsed else 0,
+            'latency_ms': {
+                'mean': round(sum(ms) / len(ms), 2) if ms else 0,
+                'p50': round(percentile(ms, 50), 2),
+                'p90': round(percentile(ms, 90), 2),
+                'p99': round(percentile(ms, 99), 2),
+                'max': round(max(ms), 2) if ms else 0,
+            },
+            'queries_per_request': {
+                'mean': round(sum(self.queries) / len(self.queries), 1) if self.queries else 0,
+                'max': max(self.queries, default=0),
+            },
+        }
+
+
+def pick_course():
+    """The course with the largest roster, which is the worst case for every view."""
+    return (Course.objects.annotate(size=Count('student'))
+            .order_by('-size', 'pk').select_related('lecturer').first())
+
+
+def bench_scans(course, iterations, rng):
+    workflow = Workflow('scan_attendance')
+    session = SessionKey.objects.create(
+        key=f'{course.pk}|suite', course=course,
+        expires_at=timezone.now() + timedelta(hours=1),
+        required_latitude=6.6710, required_longitude=-1.5658)
+    LectureSession.for_session_key(session)
+    active_sessions.put(session)
+    url = reverse('core:scan_attendance', kwargs={'key': session.key})
+    roster = list(Student.objects.filter(courses=course).order_by('index_number'))
+    client = Client()
+    for student in rng.sample(roster, min(iterations, len(roster))):
+        with workflow.request():
+            response = client.post(url, {
+                'full_name': student.full_name, 'index_number': student.index_number,
+                'latitude': '6.6710', 'longitude': '-1.5658'})
+        workflow.check(response, text='Attendance recorded')
+    return workflow
+
+
+def bench_api_batches(course, iterations, batch_size, rng):
+    workflow = Workflow('api_submit_scans')
+    headers = {'Authorization': f'Bearer {issue_token(course.lecturer)}'}
+    roster = list(Student.objects.filter(courses=course)
+                  .values_list('index_number', 'full_name'))
+    client = Client()
+    for number in range(iterations):
+        # A fresh session per batch, so every scan in it is a new record
+        session = SessionKey.objects.create(
+            key=f'{course.pk}|suite-api-{number}', course=course,
+            expires_at=timezone.now() + timedelta(hours=1),
+            required_latitude=6.6710, required_longitude=-1.5658)
+        LectureSession.for_session_key(session)
+        active_sessions.put(session)
+        url = reverse('core:api_submit_scans', kwargs={'key': session.key})
+        scans = [{'index_number': index_number, 'full_name': full_name,
+                  'latitude': 6.6710, 'longitude': -1.5658}
+                 for index_number, full_name in rng.sample(roster, min(batch_size, len(roster)))]
+        with workflow.request():
+            response = client.post(url, {'scans': scans}, content_type='application/json',
+                                   headers=headers)
+        workflow.check(response, text='"rejected": 0')
+    return workflow
+
+
+def bench_manual_registers(course, client, iterations, rng):
+    workflow = Workflow('record_attendance')
+    roster = list(Student.objects.filter(courses=course).values_list('index_number', flat=True))
+    url = reverse('core:record_attendance')
+    for number in range(iterations):
+        # A register is one form, so it stays under DATA_UPLOAD_MAX_NUMBER_FIELDS
+        present = rng.sample(roster, min(int(len(roster) * 0.75),
+                                         settings.DATA_UPLOAD_MAX_NUMBER_FIELDS - 10))
+        with workflow.request():
+            response = client.post(url, {'course_id': course.pk,
+                                         'session_key': f'Suite week {number}',
+                                         'present_students': present})
+        workflow.check(response, expected=302)
+    return workflow
+
+
+def bench_grades(course, client, iterations):
+    workflow = Workflow('view_grades')
+    url = reverse('core:view_grades')
+    for _ in range(iterations):
+        with workflow.request():
+            response = client.post(url, {'course_id': course.pk})
+        workflow.check(response)
+    return workflow
+
+
+def bench_qr_sessions(course, client, iterations):
+    workflow = Workflow('generate_qr_code')
+    url = reverse('core:generate_qr_code')
+    for _ in range(iterations):
+        with workflow.request():
+            response = client.post(url, {'course_id': course.pk, 'duration': 10})
+        workflow.check(response)
+    return workflow
+
+
+def run_suite(args, dataset):
+    rng = random.Random(args.seed)
+    course = pick_course()
+    client = Client()
+    client.force_login(course.lecturer)
+    active_sessions.clear()
+
+    workflows = [
+        bench_scans(course, args.scans, rng),
+        bench_api_batches(course, args.api_batches, args.batch_size, rng),
+        bench_manual_registers(course, client, args.registers, rng),
+        bench_grades(course, client, args.grades),
+        bench_qr_sessions(course, client, args.qr_sessions),
+    ]
+    return {
+        'meta': {
+            'commit': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': args.seed,
+            'dataset': dataset,
+            'course': {'code': course.course_code, 'students': course.size},
+        },
+        'workflows': {workflow.name: workflow.summary() for workflow in workflows},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--existing', action='store_true',
+                        help='Use the configured database instead of a fresh one.')
+    parser.add_argument('--courses', type=int, default=10)
+    parser.add_argument('--students', type=int, default=4000)
+    parser.add_argument('--records', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scans', type=int, default=300)
+    parser.add_argument('--api-batches', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=250)
+    parser.add_argument('--registers', type=int, default=10)
+    parser.add_argument('--grades', type=int, default=20)
+    parser.add_argument('--qr-sessions', type=int, default=50)
+    parser.add_argument('--output', help='Write the JSON here instead of stdout.')
+    args = parser.parse_args()
+
+    # Production-like: no query log, no DEBUG slow-query reports
+    with override_settings(DEBUG=False):
+        if args.existing:
+            setup_test_environment()
+            try:
+                with transaction.atomic():
+                    results = run_suite(args, dataset='existing')
+                    transaction.set_rollback(True)
+            finally:
+                teardown_test_environment()
+        else:
+            with test_database(on_disk=True):
+                dataset = generate_dataset(
+                    courses=args.courses, students=args.students,
+                    records=args.records, seed=args.seed)
+                results = run_suite(args, dataset=dataset)
+
+    output = json.dumps(results, indent=2)
+    with (open(args.output, 'w') if args.output else nullcontext(sys.stdout)) as target:
+        target.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 # core/admin.py
 
 from django.contrib import admin
-from .models import Course, Student, AttendanceRecord, StudentMaxMarks
+from .models import (
+    Course, Student, AttendanceRecord, StudentMaxMarks, ArchivedAttendance, SessionKey)
 
 # --- Custom Admin Class for Course ---
 
@@ -25,8 +26,26 @@ class CourseAdmin(admin.ModelAdmin):
         return form
 
 
+# --- QR sessions: edit the location, tolerance and lecture-hall outline ---
+
+
+class SessionKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'course', 'created_at', 'expires_at', 'location_tolerance_m')
+    list_filter = ('course',)
+    readonly_fields = ('created_at',)
+
+    # Lecturers only see the sessions of their own courses
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(course__lecturer=request.user)
+
+
 # Register models using the custom class
 admin.site.register(Course, CourseAdmin)  # <-- Use the custom class
 admin.site.register(Student)
 admin.site.register(AttendanceRecord)
 admin.site.register(StudentMaxMarks)
+admin.site.register(ArchivedAttendance)
+admin.site.register(SessionKey, SessionKeyAdmin)
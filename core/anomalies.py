@@ -0,0 +1,158 @@
+"""Batch detection of proxy attendance in recorded QR scans.
+
+One phone marking several friends present leaves a recognizable trace:
+different index numbers recorded from practically the same position
+within seconds of each other. Records are streamed in session order and
+each session is analyzed with NumPy:
+
+1. Coordinates are projected to metres around the session's centre.
+2. Every scan is bucketed into a (cell, cell, time window) grid.
+3. Distinct students are counted per bucket.
+
+A bucket boundary can split a cluster, so the grid is evaluated twice,
+the second time shifted by half a bucket in every dimension. Sessions in
+which a large share of scans were fuzzy name matches are flagged too: a
+name typed in instead of an index number is the easiest way to mark
+someone else present.
+
+Manual registers carry no coordinates and are skipped.
+"""
+from dataclasses import dataclass, field
+from math import cos, radians
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+METRES_PER_DEGREE = 111320.0
+
+# Defaults: scans within ~1 m and 20 s of each other from 3+ students. A
+# phone reports the same fix for every friend it marks, while neighbours in
+# a hall are several metres apart in GPS terms
+CELL_M = 1.0
+WINDOW_S = 20.0
+MIN_CLUSTER = 3
+# Flag sessions where at least this share of (at least MIN_SCANS) scans
+# were fuzzy name matches
+NAME_MATCH_SHARE = 0.3
+MIN_SCANS = 5
+
+
+@dataclass
+class ScanCluster:
+    """Students scanned from one spot within one time window."""
+    student_ids: list
+    latitude: float
+    longitude: float
+    first_scan: float
+    last_scan: float
+
+
+@dataclass
+class SessionFinding:
+    session_id: int
+    scans: int
+    name_matches: int
+    clusters: list = field(default_factory=list)
+
+    @property
+    def name_match_share(self):
+        return self.name_matches / self.scans if self.scans else 0.0
+
+
+def find_clusters(students, latitudes, longitudes, timestamps,
+                  cell_m=CELL_M, window_s=WINDOW_S, min_cluster=MIN_CLUSTER):
+    """Returns the ScanClusters among one session's scans.
+
+    ``students`` is an array of index numbers; the other arguments are
+    float arrays of the same length (timestamps in epoch seconds).
+    """
+    if len(students) < min_cluster:
+        return []
+    # Equirectangular projection; exact enough across a lecture hall
+    lat0 = float(np.mean(latitudes))
+    y = (latitudes - lat0) * METRES_PER_DEGREE
+    x = (longitudes - float(np.mean(longitudes))) * METRES_PER_DEGREE * cos(radians(lat0))
+    t = timestamps - float(timestamps.min())
+    _, student_codes = np.unique(students, return_inverse=True)
+
+    found = {}
+    for offset in (0.0, 0.5):
+        buckets = np.column_stack([
+            np.floor(x / cell_m + offset),
+            np.floor(y / cell_m + offset),
+            np.floor(t / window_s + offset),
+        ]).astype(np.int64)
+        # One row per (bucket, student), then students per bucket
+        pairs = np.unique(np.column_stack([buckets, student_codes]), axis=0)
+        keys, counts = np.unique(pairs[:, :3], axis=0, return_counts=True)
+        for bucket in keys[counts >= min_cluster]:
+            members = np.all(buckets == bucket, axis=1)
+            group = frozenset(students[members].tolist())
+            if len(group) >= min_cluster and group not in found:
+                found[group] = ScanCluster(
+                    student_ids=sorted(group),
+                    latitude=float(latitudes[members].mean()),
+                    longitude=float(longitudes[members].mean()),
+                    first_scan=float(timestamps[members].min()),
+                    last_scan=float(timestamps[members].max()))
+
+    # A cluster seen whole on one grid and partially on the other is reported once
+    groups = sorted(found, key=len, reverse=True)
+    kept = [g for i, g in enumerate(groups) if not any(g < other for other in groups[:i])]
+    return [found[group] for group in kept]
+
+
+def _analyze(session_id, rows, options):
+    students = np.array([row[1] for row in rows])
+    located = np.array([row[2] is not None and row[3] is not None for row in rows])
+    finding = SessionFinding(session_id=session_id, scans=len(rows),
+                             name_matches=sum(1 for row in rows if row[5]))
+    if located.sum() >= options['min_cluster']:
+        coords = np.array([(row[2], row[3], row[4].timestamp())
+                           for row, ok in zip(rows, located) if ok])
+        finding.clusters = find_clusters(
+            students[located], coords[:, 0], coords[:, 1], coords[:, 2],
+            cell_m=options['cell_m'], window_s=options['window_s'],
+            min_cluster=options['min_cluster'])
+    return finding
+
+
+def scan_sessions(records, chunk_size=20000, cell_m=CELL_M, window_s=WINDOW_S,
+                  min_cluster=MIN_CLUSTER, name_share=NAME_MATCH_SHARE,
+                  min_scans=MIN_SCANS):
+    """Yields a SessionFinding for every suspicious QR session in ``records``.
+
+    ``records`` is an AttendanceRecord queryset (e.g. one course's). Rows
+    are streamed in session order, so memory holds one session at a time.
+    """
+    options = {'cell_m': cell_m, 'window_s': window_s, 'min_cluster': min_cluster}
+    rows = (
+        # Only QR scans carry coordinates
+        records.filter(student_latitude__isnull=False)
+        # Floats straight from the database, no Decimal round-trip
+        .annotate(lat=Cast('student_latitude', FloatField()),
+                  lon=Cast('student_longitude', FloatField()))
+        .order_by('session_id')
+        .values_list('session_id', 'student_id', 'lat', 'lon', 'timestamp',
+                     'matched_by_name')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    def suspicious(finding):
+        return finding.clusters or (
+            finding.scans >= min_scans and finding.name_match_share >= name_share)
+
+    current, batch = None, []
+    for row in rows:
+        if row[0] != current and batch:
+            finding = _analyze(current, batch, options)
+            if suspicious(finding):
+                yield finding
+            batch = []
+        current = row[0]
+        batch.append(row)
+    if batch:
+        finding = _analyze(current, batch, options)
+        if suspicious(finding):
+            yield finding
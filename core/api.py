@@ -0,0 +1,280 @@
+"""JSON API for tablets and other clients that sync attendance in bulk.
+
+Clients exchange a lecturer's username and password for a signed bearer
+token (no database table: the token is the user id and session auth hash,
+signed with SECRET_KEY, so changing the password revokes it) and then:
+
+- list the lecturer's courses,
+- open QR sessions,
+- fetch a course roster, revalidated with its ETag,
+- submit up to ``MAX_BATCH`` scans of a session per request.
+
+Scans go through the same checks as scan_attendance (core.scans) and are
+written with one bulk insert; the response reports a result per scan. A
+scan carries the time it was taken, so a tablet that was offline can sync
+up to ``SYNC_GRACE_SECONDS`` after the session expired. Rotating QR tokens
+are not checked: the tablet is signed in as the lecturer.
+"""
+import functools
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core import signing
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .attendance import open_qr_session, record_scans
+from .caching import get_version
+from .geofence import clean_polygon
+from .models import AttendanceRecord, Course
+from .qr import scan_url
+from .roster import get_roster_index, roster_ttl, roster_version_name
+from .scans import check_scans
+from .session_cache import active_sessions
+
+TOKEN_SALT = 'core.api.token'
+
+DEFAULTS = {
+    'TOKEN_MAX_AGE': 12 * 3600,  # seconds
+    'MAX_BATCH': 500,
+    'SYNC_GRACE_SECONDS': 24 * 3600,
+    # Tolerated drift of a tablet's clock into the future
+    'CLOCK_SKEW_SECONDS': 120,
+}
+
+
+def api_settings():
+    """Returns ATTENDANCE_API merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'ATTENDANCE_API', {})}
+
+
+def _error(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _json_body(request):
+    """Returns the decoded JSON object of a request, or None."""
+    try:
+        data = json.loads(request.body)
+    except (UnicodeDecodeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def issue_token(user):
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(
+        f'{user.pk}:{user.get_session_auth_hash()}')
+
+
+def user_for_token(token):
+    """Returns the active user a token was issued to, or None."""
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=api_settings()['TOKEN_MAX_AGE'])
+    except signing.BadSignature:
+        return None
+    user_id, _, auth_hash = value.partition(':')
+    user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+    if user is None or not constant_time_compare(auth_hash, user.get_session_auth_hash()):
+        return None
+    return user
+
+
+def api_view(view):
+    """Authenticates a view with ``Authorization: Bearer <token>``."""
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        user = user_for_token(token) if scheme == 'Bearer' and token else None
+        if user is None:
+            return _error(401, 'A valid bearer token is required.')
+        request.user = user
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@csrf_exempt
+@require_POST
+def api_token(request):
+    """Exchanges a username and password for a bearer token."""
+    data = _json_body(request)
+    if data is None:
+        return _error(400, 'Expected a JSON object.')
+    user = authenticate(request, username=data.get('username'),
+                        password=data.get('password'))
+    if user is None:
+        return _error(401, 'Invalid username or password.')
+    return JsonResponse({'token': issue_token(user),
+                         'expires_in': api_settings()['TOKEN_MAX_AGE']})
+
+
+@require_GET
+@api_view
+def api_courses(request):
+    """Lists the courses taught by the signed-in lecturer."""
+    courses = (Course.objects.filter(lecturer=request.user).order_by('course_code')
+               .values('id', 'course_code', 'name', 'total_lectures_possible'))
+    return JsonResponse({'courses': list(courses)})
+
+
+@require_GET
+@api_view
+def api_roster(request, course_id):
+    """The students enrolled in a course, from the cached roster index.
+
+    The ETag is the roster's version, so an unchanged roster is answered
+    304 Not Modified without building the response. Versions are per
+    worker unless the cache is shared, so the ETag also changes every
+    ATTENDANCE_ROSTER_TTL seconds, the longest a worker serves a stale
+    roster.
+    """
+    if not Course.objects.filter(pk=course_id, lecturer=request.user).exists():
+        return _error(404, 'Course not found.')
+
+    version = get_version(roster_version_name(course_id))
+    period = int(time.time() // max(1, roster_ttl()))
+    etag = quote_etag(f'roster-{course_id}-{version}-{period}')
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        roster = get_roster_index(course_id)
+        response = JsonResponse({'course_id': course_id, 'students': [
+            {'index_number': index_number, 'full_name': full_name}
+            for index_number, full_name in zip(roster.index_numbers, roster.full_names)
+        ]})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_POST
+@api_view
+def api_open_session(request):
+    """Opens a QR session: {"course_id": ..., "duration": 10, "rotation": 0,
+    "geofence_polygon": [[lat, lon], ...]}; the polygon is optional."""
+    data = _json_body(request)
+    if data is None:
+        return _error(400, 'Expected a JSON object.')
+    try:
+        duration_minutes = int(data.get('duration', 10))
+        rotation_seconds = max(0, int(data.get('rotation') or 0))
+        course = Course.objects.get(pk=int(data.get('course_id')), lecturer=request.user)
+    except (TypeError, ValueError):
+        return _error(400, 'course_id, duration and rotation must be integers.')
+    except Course.DoesNotExist:
+        return _error(404, 'Course not found.')
+    if duration_minutes < 1:
+        return _error(400, 'duration must be at least one minute.')
+    polygon = data.get('geofence_polygon')
+    if polygon is not None:
+        try:
+            polygon = clean_polygon(polygon)
+        except ValueError as exc:
+            return _error(400, str(exc))
+
+    session_obj = open_qr_session(course, duration_minutes, rotation_seconds, polygon)
+    return JsonResponse({
+        'key': session_obj.key,
+        'course_id': course.pk,
+        'expires_at': session_obj.expires_at.isoformat(),
+        'rotation_seconds': rotation_seconds,
+        'geofence_polygon': session_obj.geofence_polygon,
+        'scan_url': scan_url(session_obj.key),
+    }, status=201)
+
+
+def _scanned_at(item, now, session_obj, skew):
+    """Returns (timestamp, error) for one submitted scan."""
+    value = item.get('scanned_at')
+    if value is None:
+        timestamp = now
+    else:
+        try:
+            timestamp = parse_datetime(value) if isinstance(value, str) else None
+        except ValueError:
+            # Well formatted but impossible, e.g. February 30th
+            timestamp = None
+        if timestamp is None:
+            return None, 'scanned_at must be an ISO 8601 date and time.'
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+        if timestamp > now + skew:
+            return None, 'scanned_at is in the future.'
+        # Entries cached by workers running older code have no created_at
+        if session_obj.created_at and timestamp < session_obj.created_at - skew:
+            return None, 'scanned_at is before the session was opened.'
+    if session_obj.is_expired(timestamp):
+        return None, 'Attendance session has expired.'
+    return timestamp, None
+
+
+@require_POST
+@api_view
+def api_submit_scans(request, key):
+    """Records a batch of scans: {"scans": [{index_number, full_name,
+    latitude, longitude, scanned_at}, ...]}.
+
+    Every scan gets a result: "recorded", "duplicate" (already recorded
+    for this session) or "rejected" with the reason.
+    """
+    config = api_settings()
+    data = _json_body(request)
+    items = data.get('scans') if data else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return _error(400, 'Expected {"scans": [...]} with one object per scan.')
+    if len(items) > config['MAX_BATCH']:
+        return _error(400, f"At most {config['MAX_BATCH']} scans can be sent at once.")
+
+    session_obj = active_sessions.get(key)
+    if session_obj is None or session_obj.lecturer_id != request.user.pk:
+        return _error(404, 'No session matches the given key.')
+    now = timezone.now()
+    if session_obj.is_expired(now - timedelta(seconds=config['SYNC_GRACE_SECONDS'])):
+        return _error(410, 'The sync window for this session has closed.')
+
+    # 1. Per-scan timestamps, then the checks shared with scan_attendance
+    results = [{'index': position, 'status': 'rejected'} for position in range(len(items))]
+    pending = []
+    skew = timedelta(seconds=config['CLOCK_SKEW_SECONDS'])
+    for result, item in zip(results, items):
+        timestamp, error = _scanned_at(item, now, session_obj, skew)
+        if error:
+            result['error'] = error
+        else:
+            pending.append((result, {**item, 'timestamp': timestamp}))
+    checked = check_scans(session_obj, [item for _, item in pending])
+
+    # 2. Students already recorded, in this session or earlier in the batch
+    seen = set(AttendanceRecord.objects.filter(
+        session_id=session_obj.lecture_id,
+        student_id__in={scan.index_number for scan in checked if scan.error is None},
+    ).values_list('student_id', flat=True))
+    accepted = []
+    for (result, _), scan in zip(pending, checked):
+        result.update(index_number=scan.index_number, full_name=scan.full_name,
+                      matched_by_name=scan.matched_by_name)
+        if scan.error:
+            result['error'] = scan.error
+        elif scan.index_number in seen:
+            result['status'] = 'duplicate'
+        else:
+            seen.add(scan.index_number)
+            result['status'] = 'recorded'
+            accepted.append(scan)
+
+    # 3. One bulk write (or one queued batch) for the whole submission
+    record_scans(session_obj, accepted)
+    counts = {status: 0 for status in ('recorded', 'duplicate', 'rejected')}
+    for result in results:
+        counts[result['status']] += 1
+    return JsonResponse({**counts, 'results': results})
@@ -0,0 +1,150 @@
+"""Attendance writing helpers shared by the attendance views and the API."""
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from .geofence import clean_polygon
+from .ingest import aget_ingest_queue, get_ingest_queue, ingest_settings
+from .live import note_arrivals
+from .models import AttendanceRecord, LectureSession, SessionKey, Student
+from .session_cache import active_sessions
+from .tallies import sync_tallies
+
+
+class UnknownStudentsError(Exception):
+    """Raised when a submission references index numbers that do not exist."""
+
+    def __init__(self, index_numbers):
+        self.index_numbers = sorted(index_numbers)
+        super().__init__(', '.join(self.index_numbers))
+
+
+def record_manual_session(course, label, index_numbers):
+    """Marks every listed student present for a manually recorded lecture.
+
+    The lecture session is created if needed, all students are resolved
+    with one lookup and written with a single bulk insert inside one
+    transaction, so a submission is either recorded in full or not at all.
+    Returns the number of students marked present.
+    """
+    # Preserve submission order while dropping repeated checkboxes
+    index_numbers = list(dict.fromkeys(index_numbers))
+    students = Student.objects.in_bulk(index_numbers)
+
+    missing = set(index_numbers) - set(students)
+    if missing:
+        raise UnknownStudentsError(missing)
+
+    now = timezone.now()
+    with transaction.atomic():
+        lecture, _ = LectureSession.objects.get_or_create(
+            course=course, label=label, defaults={'held_at': now})
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(
+                course=course,
+                student=students[index_number],
+                session=lecture,
+                timestamp=now,
+            )
+            for index_number in index_numbers
+        ], ignore_conflicts=True)
+        sync_tallies(course.pk, index_numbers)
+    return len(index_numbers)
+
+
+def open_qr_session(course, duration_minutes, rotation_seconds=0,
+                    geofence_polygon=None):
+    """Starts a QR attendance session for ``course`` and caches it.
+
+    ``geofence_polygon`` optionally outlines the lecture hall as
+    ``[[lat, lon], ...]``, checked instead of the circle around the
+    required location. Returns the SessionKey; its lecture is created
+    alongside it.
+    """
+    # 1. Generate a unique key
+    unique_key_data = f"{course.pk}|{timezone.now().timestamp()}"
+
+    # 2. Set expiry time
+    expires_at = timezone.now() + timedelta(minutes=duration_minutes)
+
+    # 3. Save the session details to the database (Hardcoded location for now)
+    session_obj = SessionKey.objects.create(
+        key=unique_key_data,
+        course=course,
+        expires_at=expires_at,
+        required_latitude=6.6710,  # Example KNUST Lat
+        required_longitude=-1.5658,  # Example KNUST Lon
+        rotation_seconds=rotation_seconds,
+        geofence_polygon=clean_polygon(geofence_polygon) if geofence_polygon else None,
+    )
+    LectureSession.objects.create(
+        course=course, label=unique_key_data, session_key=session_obj,
+        held_at=session_obj.created_at)
+    active_sessions.put(session_obj)
+    return session_obj
+
+
+def _scan_row(session, index_number, latitude, longitude, matched_by_name,
+              timestamp=None):
+    return dict(
+        course_id=session.course_id,
+        student_id=index_number,
+        session_id=session.lecture_id,
+        timestamp=timestamp or timezone.now(),
+        student_latitude=latitude,
+        student_longitude=longitude,
+        matched_by_name=matched_by_name,
+    )
+
+
+def _write_scans(scans):
+    with transaction.atomic():
+        AttendanceRecord.objects.bulk_create(
+            [AttendanceRecord(**scan) for scan in scans], ignore_conflicts=True)
+        sync_tallies(scans[0]['course_id'], [scan['student_id'] for scan in scans])
+        note_arrivals([scans[0]['session_id']])
+
+
+def _scan_rows(session, scans):
+    return [_scan_row(session, scan.index_number, scan.latitude, scan.longitude,
+                      scan.matched_by_name, scan.timestamp)
+            for scan in scans]
+
+
+def record_scans(session, scans):
+    """Records validated CheckedScans of one active session.
+
+    Written with one bulk insert and one tally update, or queued when
+    write-behind ingestion is enabled. Students already recorded for the
+    session are skipped by the unique constraint.
+    """
+    rows = _scan_rows(session, scans)
+    if not rows:
+        return
+    if ingest_settings()['ENABLED']:
+        queue = get_ingest_queue()
+        for row in rows:
+            queue.submit(**row)
+    else:
+        _write_scans(rows)
+
+
+async def arecord_scans(session, scans):
+    """Async version of record_scans.
+
+    Queuing never touches the database once the queue exists. A direct
+    write runs the insert and the tally update as one transaction on a
+    worker thread, since the async ORM cannot hold a transaction open
+    across awaits.
+    """
+    rows = _scan_rows(session, scans)
+    if not rows:
+        return
+    if ingest_settings()['ENABLED']:
+        queue = await aget_ingest_queue()
+        for row in rows:
+            queue.submit(**row)
+    else:
+        await sync_to_async(_write_scans)(rows)
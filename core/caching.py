@@ -0,0 +1,39 @@
+"""Version counters for invalidating process-local caches.
+
+Counters live in the configured Django cache, so a bump made by one worker
+is seen by every worker sharing that cache backend.
+"""
+from django.core.cache import cache
+
+VERSION_PREFIX = 'core:version:'
+
+
+def get_version(name):
+    """Returns the current version number for ``name``."""
+    key = VERSION_PREFIX + name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def get_versions(names):
+    """Returns {name: version} for several counters in one cache round-trip."""
+    keys = {VERSION_PREFIX + name: name for name in names}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, name in keys.items():
+        if key not in found:
+            versions[name] = get_version(name)
+    return versions
+
+
+def bump_version(name):
+    """Invalidates everything cached under the previous version of ``name``."""
+    key = VERSION_PREFIX + name
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
+        return 2
@@ -0,0 +1,115 @@
+"""Per-course statistics for the lecturer dashboard.
+
+All of a lecturer's courses are summarized with three aggregate queries
+(course totals, the spread of attendance counts, and scans in active
+sessions), whatever the number or size of the courses. The result is
+cached per lecturer for a short TTL, under a key built from each course's
+version counter: writing attendance or opening a lecture bumps the
+course's counter, so the next dashboard load recomputes.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .caching import bump_version, get_versions
+from .grading import CRITICAL_MISSED
+from .models import AttendanceTally, Course, LectureSession, SessionKey, Student
+
+CACHE_PREFIX = 'core:dashboard:'
+
+
+def _version_name(course_id):
+    return f'course-stats:{course_id}'
+
+
+def invalidate_course_stats(course_id):
+    """Marks a course's dashboard figures as stale once the write commits."""
+    transaction.on_commit(lambda: bump_version(_version_name(course_id)))
+
+
+def _count(queryset):
+    return Coalesce(Subquery(
+        queryset.order_by().values('course_id').annotate(n=Count('pk')).values('n'),
+        output_field=IntegerField()), Value(0))
+
+
+def compute_course_stats(course_ids):
+    """Returns one stats dict per course, in course code order."""
+    Enrollment = Student.courses.through
+    courses = list(
+        Course.objects.filter(pk__in=course_ids)
+        .annotate(
+            enrolled=_count(Enrollment.objects.filter(course_id=OuterRef('pk'))),
+            # Abandoned and regenerated QR codes are not lectures held
+            held=_count(LectureSession.objects.held().filter(course_id=OuterRef('pk'))),
+            attended=Coalesce(Subquery(
+                AttendanceTally.objects.filter(course_id=OuterRef('pk')).order_by()
+                .values('course_id').annotate(total=Sum('attended_count'))
+                .values('total'),
+                output_field=IntegerField()), Value(0)))
+        .order_by('course_code')
+        .values('pk', 'course_code', 'name', 'enrolled', 'held', 'attended'))
+
+    # How many students attended how often, per course: at most one row per
+    # (course, count), so this stays small however many students there are
+    spread = {}
+    for course_id, attended_count, students in (
+            AttendanceTally.objects.filter(course_id__in=course_ids)
+            .values('course_id', 'attended_count').annotate(students=Count('pk'))
+            .values_list('course_id', 'attended_count', 'students')):
+        spread.setdefault(course_id, []).append((attended_count, students))
+
+    live = {}
+    for course_id, key, expires_at, scans in (
+            SessionKey.objects.filter(course_id__in=course_ids,
+                                      expires_at__gt=timezone.now())
+            .annotate(scans=Count('lecture__records'))
+            .order_by('expires_at')
+            .values_list('course_id', 'key', 'expires_at', 'scans')):
+        live[course_id] = {'key': key, 'expires_at': expires_at, 'scans': scans}
+
+    stats = []
+    for course in courses:
+        held, enrolled = course['held'], course['enrolled']
+        at_risk = 0
+        if held >= 3:
+            # Students without a tally attended nothing and are at risk too
+            safe = sum(students for attended, students in spread.get(course['pk'], [])
+                       if held - attended < CRITICAL_MISSED)
+            at_risk = max(0, enrolled - safe)
+        stats.append({
+            'course_id': course['pk'],
+            'course_code': course['course_code'],
+            'name': course['name'],
+            'enrolled': enrolled,
+            'sessions_held': held,
+            'average_attendance': (round(100 * course['attended'] / (held * enrolled), 1)
+                                   if held and enrolled else None),
+            'at_risk': at_risk,
+            'live_session': live.get(course['pk']),
+        })
+    return stats
+
+
+def lecturer_dashboard(lecturer):
+    """Returns the cached course stats of everything ``lecturer`` teaches."""
+    course_ids = list(Course.objects.filter(lecturer=lecturer)
+                      .order_by('pk').values_list('pk', flat=True))
+    if not course_ids:
+        return []
+
+    versions = get_versions([_version_name(pk) for pk in course_ids])
+    fingerprint = hashlib.sha1(','.join(
+        f'{pk}:{versions[_version_name(pk)]}' for pk in course_ids).encode()).hexdigest()
+    key = f'{CACHE_PREFIX}{lecturer.pk}:{fingerprint}'
+
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_course_stats(course_ids)
+        cache.set(key, stats, timeout=settings.ATTENDANCE_DASHBOARD_TTL)
+    return stats
@@ -0,0 +1,104 @@
+"""Streaming exports of grade sheets and attendance registers.
+
+Rows are produced by generators over chunked, iterator-based querysets, so
+memory use stays flat however many students or records a course has. CSV
+output is streamed straight to the client; XLSX output is written with
+openpyxl's write-only workbook into a temporary file.
+"""
+import csv
+import re
+
+from .grading import iter_course_grades
+from .models import AttendanceRecord, LectureSession, Student
+
+CHUNK_SIZE = 5000
+GRADE_HEADER = ['Course', 'Index Number', 'Student Name', 'Lectures Attended',
+                'Attendance Score', 'Status']
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def iter_grade_sheet(courses):
+    """Yields a header row, then one grade row per student per course."""
+    yield GRADE_HEADER
+    for course in courses:
+        for row in iter_course_grades(course, chunk_size=CHUNK_SIZE):
+            yield [course.course_code, row['index_number'], row['full_name'],
+                   row['attended'], row['attendance_score'], row['warning']]
+
+
+def course_sessions(course):
+    """Returns (id, label) of the course's lectures held, in order."""
+    return list(
+        LectureSession.objects.filter(course=course).held()
+        .order_by('held_at', 'pk')
+        .values_list('pk', 'label')
+    )
+
+
+def iter_register(course):
+    """Yields a session-by-student attendance matrix for one course.
+
+    Enrolled students and their attendance records are streamed side by
+    side, both ordered by index number, so only one student's row is held
+    in memory at a time.
+    """
+    sessions = course_sessions(course)
+    column = {session_id: i for i, (session_id, _) in enumerate(sessions)}
+    yield ['Index Number', 'Student Name', *(label for _, label in sessions), 'Total']
+
+    students = (
+        Student.objects.filter(courses=course)
+        .order_by('index_number')
+        .values_list('index_number', 'full_name')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    records = (
+        AttendanceRecord.objects.filter(course=course, student__courses=course)
+        .order_by('student_id')
+        .values_list('student_id', 'session_id')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+    record = next(records, None)
+    for index_number, full_name in students:
+        marks = [''] * len(sessions)
+        total = 0
+        while record is not None and record[0] == index_number:
+            marks[column[record[1]]] = 'P'
+            total += 1
+            record = next(records, None)
+        yield [index_number, full_name, *marks, total]
+
+
+class Echo:
+    """A file-like object that hands written lines back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """Encodes rows as CSV lines one at a time."""
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def sheet_title(title):
+    """Makes a string safe to use as an Excel worksheet name."""
+    return re.sub(r'[\[\]:*?/\\]', '-', title)[:31] or 'Sheet'
+
+
+def write_xlsx(target, sheets):
+    """Writes ``(title, rows)`` pairs as worksheets of a write-only workbook."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, rows in sheets:
+        worksheet = workbook.create_sheet(sheet_title(title))
+        for row in rows:
+            worksheet.append(row)
+    workbook.save(target)
@@ -0,0 +1,37 @@
+"""Version counters keying the cached template fragments.
+
+Course pickers and the roster table of the manual register are rendered
+inside ``{% cache %}`` blocks whose keys include the versions returned by
+``fragment_versions``. The querysets behind them are lazy, so a page
+served from a cached fragment runs no course or roster query at all.
+
+A lecturer's course list version is bumped when one of their courses is
+saved or deleted; the roster version is the roster index's, bumped when
+enrollment or a student changes. ``ATTENDANCE_FRAGMENT_TTL`` bounds how
+stale a fragment can get when workers do not share the cache backend.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .caching import bump_version, get_versions
+from .roster import roster_version_name
+
+
+def _course_list_name(lecturer_id):
+    return f'course-list:{lecturer_id}'
+
+
+def invalidate_course_list(lecturer_id):
+    """Marks a lecturer's cached course pickers as stale once the write commits."""
+    transaction.on_commit(lambda: bump_version(_course_list_name(lecturer_id)))
+
+
+def fragment_versions(lecturer_id, course_id=None):
+    """Returns the template context keying a lecturer's cached fragments."""
+    names = {'courses_version': _course_list_name(lecturer_id)}
+    if course_id is not None:
+        names['roster_version'] = roster_version_name(course_id)
+    versions = get_versions(names.values())
+    context = {key: versions[name] for key, name in names.items()}
+    context['fragment_ttl'] = settings.ATTENDANCE_FRAGMENT_TTL
+    return context
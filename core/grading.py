@@ -0,0 +1,80 @@
+"""Course-wide grade computation.
+
+Scores and warnings for every student in a course are read from the
+materialized attendance tallies in a single query, so the cost of a grade
+page does not grow with the number of students enrolled or records kept.
+"""
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.functions import Coalesce
+
+from .models import LectureSession, Student, StudentMaxMarks
+
+# Missed-lecture thresholds used by the warning system
+CRITICAL_MISSED = 3
+WARNING_MISSED = 2
+
+
+def compute_score(attended_count, total_possible, max_attendance_marks):
+    """Scales an attendance count to the course's attendance marks."""
+    if not total_possible or not max_attendance_marks:
+        return 0.0
+    score = (attended_count / total_possible) * max_attendance_marks
+    return round(score, 2)
+
+
+def warning_for(missed_count, lectures_held):
+    """Returns the warning label for the number of missed lectures."""
+    if lectures_held >= 3:
+        if missed_count >= CRITICAL_MISSED:
+            return "CRITICAL: Missed 3 or more lectures."
+        if missed_count == WARNING_MISSED:
+            return "WARNING: Missed 2 lectures."
+    return ""
+
+
+def max_attendance_marks_for(course):
+    """Returns the configured attendance marks for a course, or None."""
+    return StudentMaxMarks.objects.filter(course=course).values_list(
+        'max_attendance_marks', flat=True).first()
+
+
+def iter_course_grades(course, chunk_size=2000):
+    """Yields one row per enrolled student with score and warning status.
+
+    Scores are scaled against the configured ``total_lectures_possible``;
+    missed lectures are counted against the sessions actually held (with
+    attendance recorded; see ``LectureSessionQuerySet.held``). Runs
+    three queries regardless of enrollment: the max marks configuration,
+    the number of sessions held, and one indexed join against the course's
+    attendance tallies, which is streamed in chunks.
+    """
+    max_marks = max_attendance_marks_for(course)
+    total_lectures = course.total_lectures_possible
+    lectures_held = LectureSession.objects.filter(course=course).held().count()
+
+    students = (
+        Student.objects.filter(courses=course)
+        .annotate(
+            tally=FilteredRelation('tallies', condition=Q(tallies__course=course)),
+            attended=Coalesce(F('tally__attended_count'), 0))
+        .order_by('full_name')
+        .values_list('index_number', 'full_name', 'attended')
+    )
+
+    for index_number, full_name, attended in students.iterator(chunk_size=chunk_size):
+        if max_marks is None:
+            score = 0.0
+        else:
+            score = compute_score(attended, total_lectures, max_marks)
+        yield {
+            'full_name': full_name,
+            'index_number': index_number,
+            'attendance_score': score,
+            'attended': attended,
+            'warning': warning_for(max(0, lectures_held - attended), lectures_held),
+        }
+
+
+def course_grades(course):
+    """Returns the rows of ``iter_course_grades`` as a list."""
+    return list(iter_course_grades(course))
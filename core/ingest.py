@@ -0,0 +1,328 @@
+"""Write-behind ingestion of scanned attendance.
+
+During a scan burst every request used to commit its own INSERT against
+the single SQLite writer lock. When ``ATTENDANCE_INGEST['ENABLED']`` is
+set, validated scans are instead appended to an in-memory batch and to an
+on-disk spool segment, the student is acknowledged immediately, and a
+background thread commits the batch in one transaction once it reaches
+``BATCH_SIZE`` rows or ``FLUSH_INTERVAL`` seconds have passed.
+
+Spool segments are only deleted after their batch commits, so scans
+accepted by a worker that crashes are replayed by the next worker to
+start (or by ``manage.py flush_attendance_spool``).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import AttendanceRecord
+from .live import note_arrivals
+from .tallies import sync_records
+
+try:
+    import fcntl
+except ImportError:  # Windows: segments are only replayed by the command
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 0.5,
+    'SPOOL_DIR': None,
+    'FSYNC': False,
+}
+
+
+def ingest_settings():
+    """Returns ATTENDANCE_INGEST merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'ATTENDANCE_INGEST', {})}
+
+
+def _lock(handle):
+    """Takes a non-blocking exclusive lock; returns False if already held."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def serialize_scan(course_id, student_id, session_id, timestamp,
+                   student_latitude=None, student_longitude=None,
+                   matched_by_name=False):
+    """Converts a scan into a JSON-safe row for the queue and the spool."""
+    return {
+        'course_id': course_id,
+        'student_id': student_id,
+        'session_id': session_id,
+        'timestamp': timestamp.isoformat(),
+        'student_latitude': None if student_latitude in (None, '') else str(student_latitude),
+        'student_longitude': None if student_longitude in (None, '') else str(student_longitude),
+        'matched_by_name': matched_by_name,
+    }
+
+
+def write_rows(rows):
+    """Commits serialized scans, returning the number of records written.
+
+    The batch is written with one bulk insert; scans already recorded for
+    the same session are skipped. If it violates an integrity
+    constraint (for example a student deleted since scanning), rows are
+    retried one at a time and the offending ones are logged and dropped.
+    OperationalError (such as a locked database) propagates so the caller
+    can retry the whole batch later.
+    """
+    records = [
+        AttendanceRecord(**{**row, 'timestamp': parse_datetime(row['timestamp'])})
+        for row in rows
+    ]
+    try:
+        with transaction.atomic():
+            AttendanceRecord.objects.bulk_create(records, ignore_conflicts=True)
+            sync_records(records)
+            note_arrivals(record.session_id for record in records)
+        return len(records)
+    except IntegrityError:
+        pass
+
+    written = 0
+    for record in records:
+        try:
+            with transaction.atomic():
+                AttendanceRecord.objects.bulk_create(
+                    [record], ignore_conflicts=True)
+                sync_records([record])
+                note_arrivals([record.session_id])
+            written += 1
+        except IntegrityError:
+            logger.exception('Dropping unwritable attendance scan %s/%s',
+                             record.course_id, record.student_id)
+    return written
+
+
+def read_segment(path):
+    rows = []
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    logger.warning('Skipping corrupt spool line in %s', path)
+    return rows
+
+
+class IngestQueue:
+    """Batches scans in memory and on disk until they are committed."""
+
+    def __init__(self, batch_size=200, flush_interval=0.5, spool_dir=None,
+                 fsync=False):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.fsync = fsync
+
+        self._pending = []
+        self._segment = None
+        self._retained = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self.accepted = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+
+        if self.spool_dir:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+    # --- Accepting scans ---
+
+    def submit(self, **scan):
+        """Queues one scan; returns once it is durable in the spool."""
+        row = serialize_scan(**scan)
+        with self._lock:
+            self._pending.append(row)
+            self._append_to_segment(row)
+            self.accepted += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    # --- Flushing ---
+
+    def flush(self):
+        """Commits everything queued so far; returns the rows written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+                segment, self._segment = self._segment, None
+            if segment is not None:
+                self._retained.append(segment)
+            if not rows:
+                return 0
+
+            try:
+                written = write_rows(rows)
+            except Exception as exc:
+                # Put the batch back in front of newer scans and retry later.
+                # Its spool segment stays retained, so nothing acknowledged
+                # is released before it commits.
+                if isinstance(exc, OperationalError):
+                    logger.warning('Attendance batch of %d deferred', len(rows),
+                                   exc_info=True)
+                else:
+                    logger.exception('Attendance batch of %d failed; will retry',
+                                     len(rows))
+                self.retries += 1
+                with self._lock:
+                    self._pending[:0] = rows
+                return 0
+
+            self.written += written
+            self.batches += 1
+            self._release_retained()
+            return written
+
+    def start(self):
+        """Starts the background flusher thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='attendance-ingest', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Stops the flusher thread after a final flush."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Attendance ingest flush failed')
+                time.sleep(self.flush_interval)
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'accepted': self.accepted,
+            'written': self.written,
+            'batches': self.batches,
+            'retries': self.retries,
+        }
+
+    # --- Spool segments ---
+
+    def _append_to_segment(self, row):
+        if self.spool_dir is None:
+            return
+        if self._segment is None:
+            path = self.spool_dir / f'{os.getpid()}-{uuid.uuid4().hex}.jsonl'
+            handle = open(path, 'a', encoding='utf-8')
+            _lock(handle)
+            self._segment = (path, handle)
+        handle = self._segment[1]
+        handle.write(json.dumps(row) + '\n')
+        handle.flush()
+        if self.fsync:
+            os.fsync(handle.fileno())
+
+    def _release_retained(self):
+        for path, handle in self._retained:
+            handle.close()
+            path.unlink(missing_ok=True)
+        self._retained = []
+
+    def recover(self):
+        """Replays spool segments left behind by workers that died.
+
+        Segments still locked by a live worker are skipped. Returns the
+        number of records written.
+        """
+        if self.spool_dir is None:
+            return 0
+        own = {path for path, _ in self._retained}
+        if self._segment is not None:
+            own.add(self._segment[0])
+
+        written = 0
+        for path in sorted(self.spool_dir.glob('*.jsonl')):
+            if path in own:
+                continue
+            with open(path, 'a', encoding='utf-8') as handle:
+                if not _lock(handle):
+                    continue
+                rows = read_segment(path)
+                if rows:
+                    written += write_rows(rows)
+                path.unlink(missing_ok=True)
+        return written
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_ingest_queue():
+    """Returns this process's queue, starting it and replaying orphans once."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                config = ingest_settings()
+                queue = IngestQueue(
+                    batch_size=config['BATCH_SIZE'],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    spool_dir=config['SPOOL_DIR'],
+                    fsync=config['FSYNC'],
+                )
+                if fcntl is not None:
+                    try:
+                        queue.recover()
+                    except Exception:
+                        logger.exception('Could not replay the attendance spool')
+                queue.start()
+                _queue = queue
+    return _queue
+
+
+async def aget_ingest_queue():
+    """Async version of get_ingest_queue.
+
+    The first call replays the spool through the ORM, which cannot run on
+    the event loop, so it is made on a worker thread.
+    """
+    if _queue is not None:
+        return _queue
+    return await sync_to_async(get_ingest_queue)()
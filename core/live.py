@@ -0,0 +1,60 @@
+"""Live attendance feed for the QR display page.
+
+Each lecture has a counter in the Django cache that is bumped whenever
+scans for it are committed. The display page polls with the ETag built
+from that counter, so a poll between scans is answered 304 Not Modified
+without touching the attendance tables. Only when the counter has moved
+does a poll count the lecture's records and read its latest arrivals,
+two small indexed queries.
+
+When the cache is not shared between workers, a worker does not see
+bumps made by the others. The ETag therefore also changes every
+``STALE_AFTER`` seconds, which bounds how far a feed can fall behind.
+"""
+import time
+
+from django.db import transaction
+
+from .caching import bump_version, get_version
+from .models import AttendanceRecord
+
+RECENT_ARRIVALS = 10
+STALE_AFTER = 10  # seconds
+
+
+def _counter_name(lecture_id):
+    return f'live:{lecture_id}'
+
+
+def note_arrivals(lecture_ids):
+    """Advances the feeds of lectures whose scans are being written."""
+    lecture_ids = set(lecture_ids)
+
+    def bump():
+        for lecture_id in lecture_ids:
+            bump_version(_counter_name(lecture_id))
+    transaction.on_commit(bump)
+
+
+def feed_etag(lecture_id):
+    """Returns the current ETag value of a lecture's feed."""
+    version = get_version(_counter_name(lecture_id))
+    return f'{lecture_id}-{version}-{int(time.time() // STALE_AFTER)}'
+
+
+def feed_snapshot(session):
+    """Returns the present count and latest arrivals for an ActiveSession."""
+    records = AttendanceRecord.objects.filter(session_id=session.lecture_id)
+    recent = (records.order_by('-timestamp')
+              .values_list('student__full_name', 'student_id', 'timestamp')
+              [:RECENT_ARRIVALS])
+    return {
+        'key': session.key,
+        'present': records.count(),
+        'expires_at': session.expires_at.isoformat(),
+        'recent': [
+            {'full_name': full_name, 'index_number': index_number,
+             'time': timestamp.isoformat()}
+            for full_name, index_number, timestamp in recent
+        ],
+    }
@@ -0,0 +1,96 @@
+import csv
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import anomalies
+from core.models import AttendanceRecord, Course, LectureSession
+
+
+def _clock(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%H:%M:%S')
+
+
+class Command(BaseCommand):
+    help = ("Flags QR sessions with likely proxy attendance: several students "
+            "scanned from the same spot within seconds, or a high share of "
+            "fuzzy name matches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='courses',
+                            metavar='COURSE_CODE',
+                            help='Limit to this course; repeat for several.')
+        parser.add_argument('--cell-m', type=float, default=anomalies.CELL_M,
+                            help='Size of a location bucket in metres.')
+        parser.add_argument('--window-s', type=float, default=anomalies.WINDOW_S,
+                            help='Length of a time bucket in seconds.')
+        parser.add_argument('--min-cluster', type=int, default=anomalies.MIN_CLUSTER,
+                            help='Students from one bucket that count as a cluster.')
+        parser.add_argument('--name-share', type=float,
+                            default=anomalies.NAME_MATCH_SHARE,
+                            help='Share of fuzzy name matches that flags a session.')
+        parser.add_argument('--csv', metavar='PATH',
+                            help='Also write one row per flagged cluster here.')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('course_code')
+        if options['courses']:
+            courses = courses.filter(course_code__in=options['courses'])
+            if not courses.exists():
+                raise CommandError('No matching courses.')
+
+        writer = None
+        if options['csv']:
+            target = open(options['csv'], 'w', newline='')
+            writer = csv.writer(target)
+            writer.writerow(['course_code', 'session', 'held_at', 'scans',
+                             'name_matches', 'cluster_size', 'student_ids',
+                             'latitude', 'longitude', 'first_scan', 'last_scan'])
+
+        started = time.perf_counter()
+        flagged = 0
+        try:
+            for course in courses.iterator():
+                findings = list(anomalies.scan_sessions(
+                    AttendanceRecord.objects.filter(course=course),
+                    cell_m=options['cell_m'], window_s=options['window_s'],
+                    min_cluster=options['min_cluster'],
+                    name_share=options['name_share']))
+                if not findings:
+                    continue
+                lectures = LectureSession.objects.in_bulk(
+                    [finding.session_id for finding in findings])
+                for finding in findings:
+                    flagged += 1
+                    self.report(course, lectures[finding.session_id], finding, writer)
+        finally:
+            if writer is not None:
+                target.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{flagged} suspicious session(s) found in '
+            f'{time.perf_counter() - started:.1f}s.'))
+
+    def report(self, course, lecture, finding, writer):
+        self.stdout.write(
+            f'{course.course_code} "{lecture.label}" ({lecture.held_at:%Y-%m-%d}): '
+            f'{finding.scans} scans, {finding.name_matches} by name '
+            f'({finding.name_match_share:.0%})')
+        for cluster in finding.clusters:
+            self.stdout.write(
+                f'  {len(cluster.student_ids)} students at '
+                f'{cluster.latitude:.6f},{cluster.longitude:.6f} between '
+                f'{_clock(cluster.first_scan)} and {_clock(cluster.last_scan)} UTC: '
+                f"{', '.join(cluster.student_ids)}")
+        if writer is None:
+            return
+        base = [course.course_code, lecture.label, lecture.held_at.isoformat(),
+                finding.scans, finding.name_matches]
+        if not finding.clusters:
+            writer.writerow(base + [0, '', '', '', '', ''])
+        for cluster in finding.clusters:
+            writer.writerow(base + [
+                len(cluster.student_ids), ' '.join(cluster.student_ids),
+                f'{cluster.latitude:.6f}', f'{cluster.longitude:.6f}',
+                _clock(cluster.first_scan), _clock(cluster.last_scan)])
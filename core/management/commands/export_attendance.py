@@ -0,0 +1,61 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import iter_grade_sheet, iter_register, stream_csv, write_xlsx
+from core.models import Course
+
+
+class Command(BaseCommand):
+    help = ("Exports grade sheets and session-by-student attendance registers "
+            "for every course (or the given ones) as CSV or XLSX.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['grades', 'register', 'all'],
+                            default='all')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--course', action='append', dest='courses',
+                            metavar='COURSE_CODE',
+                            help='Course code to export; repeat for several. '
+                                 'Defaults to every course.')
+        parser.add_argument('--output', default='.',
+                            help='Directory to write the files to.')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('course_code')
+        if options['courses']:
+            courses = courses.filter(course_code__in=options['courses'])
+            missing = set(options['courses']) - set(
+                courses.values_list('course_code', flat=True))
+            if missing:
+                raise CommandError(f"Unknown course(s): {', '.join(sorted(missing))}")
+
+        output = Path(options['output'])
+        output.mkdir(parents=True, exist_ok=True)
+        fmt = options['format']
+        kinds = ['grades', 'register'] if options['kind'] == 'all' else [options['kind']]
+
+        if 'grades' in kinds:
+            path = output / f'grades.{fmt}'
+            self.write(path, fmt, [('Grades', iter_grade_sheet(courses))])
+
+        if 'register' in kinds:
+            if fmt == 'xlsx':
+                # One workbook with a sheet per course
+                path = output / 'register.xlsx'
+                self.write(path, fmt, ((course.course_code, iter_register(course))
+                                       for course in courses.iterator()))
+            else:
+                for course in courses.iterator():
+                    name = course.course_code.replace(' ', '_')
+                    self.write(output / f'register-{name}.csv', fmt,
+                               [(course.course_code, iter_register(course))])
+
+    def write(self, path, fmt, sheets):
+        if fmt == 'xlsx':
+            write_xlsx(path, sheets)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as handle:
+                for _, rows in sheets:
+                    handle.writelines(stream_csv(rows))
+        self.stdout.write(f'Wrote {path}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.ingest import IngestQueue, ingest_settings
+
+
+class Command(BaseCommand):
+    help = ("Replays attendance scans left in the ingestion spool by a crashed "
+            "worker. Segments still locked by a running worker are skipped; "
+            "on platforms without file locking, stop the workers first.")
+
+    def handle(self, *args, **options):
+        spool_dir = ingest_settings()['SPOOL_DIR']
+        if not spool_dir:
+            self.stdout.write('No ATTENDANCE_INGEST spool directory is configured.')
+            return
+        written = IngestQueue(spool_dir=spool_dir).recover()
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {written} attendance record(s) from {spool_dir}.'))
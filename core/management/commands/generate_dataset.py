@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.synthetic import generate_dataset
+
+
+class Command(BaseCommand):
+    help = ("Fills the database with a synthetic term of courses, students, "
+            "lectures and attendance records for load testing. Use a fresh "
+            "database (e.g. DATABASE_URL=sqlite:////tmp/load.sqlite3).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=50)
+        parser.add_argument('--students', type=int, default=20000)
+        parser.add_argument('--records', type=int, default=1_000_000,
+                            help='Approximate number of attendance records.')
+        parser.add_argument('--courses-per-student', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        try:
+            summary = generate_dataset(
+                courses=options['courses'], students=options['students'],
+                records=options['records'],
+                courses_per_student=options['courses_per_student'],
+                seed=options['seed'], chunk_size=options['chunk_size'],
+                progress=lambda message: self.stdout.write(f'  {message}'))
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Generated {courses} courses, {students} students, {enrollments} '
+            'enrollments, {lectures} lectures and {records} attendance records '
+            'in {seconds}s.'.format(**summary)))
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Course
+from core.roster_import import import_roster, iter_roster_rows
+
+
+class Command(BaseCommand):
+    help = ("Imports students and course enrollments from a CSV or XLSX roster "
+            "with index_number, full_name and (optionally) course_code columns.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--course', metavar='COURSE_CODE',
+                            help='Enroll every row in this course.')
+        parser.add_argument('--format', choices=['csv', 'xlsx'],
+                            help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or ('xlsx' if path.suffix.lower() == '.xlsx' else 'csv')
+
+        course = None
+        if options['course']:
+            try:
+                course = Course.objects.get(course_code=options['course'])
+            except Course.DoesNotExist:
+                raise CommandError(f"Unknown course: {options['course']}")
+
+        def progress(report):
+            self.stdout.write(f'  {report.rows} rows read, {report.students} students, '
+                              f'{report.enrollments} enrollments, {report.skipped} skipped')
+
+        try:
+            with open(path, 'rb') as source:
+                report = import_roster(iter_roster_rows(source, fmt), course=course,
+                                       chunk_size=options['chunk_size'], progress=progress)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.students} students and {report.enrollments} enrollments '
+            f'from {report.rows} rows ({report.skipped} skipped).'))
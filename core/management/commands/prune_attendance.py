@@ -0,0 +1,106 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.models import AttendanceRecord, Course, LectureSession
+from core.retention import (
+    archive_semester, compact_database, expired_unscanned_keys, purge_expired_sessions)
+
+
+def _database_size():
+    """Size of the SQLite file in bytes, or None for other databases."""
+    if connection.vendor != 'sqlite':
+        return None
+    try:
+        return os.path.getsize(connection.settings_dict['NAME'])
+    except (OSError, TypeError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Deletes QR session keys (and their empty lectures) that expired long "
+            "ago without a scan, optionally archives the attendance of lectures "
+            "held before a date into per-student semester summaries, then "
+            "vacuums and analyzes the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions-older-than', type=int, default=30, metavar='DAYS',
+                            help='Delete session keys that expired more than DAYS '
+                                 'days ago with no attendance recorded (default 30); '
+                                 '0 keeps them all.')
+        parser.add_argument('--archive-before', metavar='YYYY-MM-DD',
+                            help='Archive lectures held before this date.')
+        parser.add_argument('--semester', metavar='LABEL',
+                            help='Label of the archived semester, e.g. "2024/25 S1".')
+        parser.add_argument('--course', action='append', dest='courses',
+                            metavar='COURSE_CODE',
+                            help='Limit archiving to this course; repeat for several.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Session keys deleted per transaction.')
+        parser.add_argument('--no-vacuum', action='store_true',
+                            help='Skip VACUUM/ANALYZE.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be removed without changing anything.')
+
+    def handle(self, *args, **options):
+        before = None
+        if options['archive_before']:
+            if not options['semester']:
+                raise CommandError('--archive-before needs a --semester label.')
+            try:
+                before = timezone.make_aware(
+                    datetime.strptime(options['archive_before'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--archive-before must be a date like 2025-01-31.')
+
+        courses = Course.objects.order_by('course_code')
+        if options['courses']:
+            courses = courses.filter(course_code__in=options['courses'])
+            if not courses.exists():
+                raise CommandError('No matching courses.')
+
+        expired_before = None
+        if options['sessions_older_than'] > 0:
+            expired_before = timezone.now() - timedelta(days=options['sessions_older_than'])
+
+        if options['dry_run']:
+            self.report_plan(expired_before, before, courses)
+            return
+
+        started = time.perf_counter()
+        if expired_before is not None:
+            purged = purge_expired_sessions(expired_before, batch_size=options['batch_size'])
+            self.stdout.write(f'Deleted {purged} expired unscanned session key(s) and their lectures.')
+
+        if before is not None:
+            totals = archive_semester(
+                before, options['semester'], courses,
+                progress=lambda message: self.stdout.write(f'  {message}'))
+            self.stdout.write(
+                'Archived {lectures} lecture(s) and {records} attendance record(s) '
+                'from {courses} course(s).'.format(**totals))
+
+        if not options['no_vacuum']:
+            size = _database_size()
+            if not compact_database():
+                self.stdout.write('Skipped VACUUM/ANALYZE inside a transaction.')
+            elif size is not None:
+                self.stdout.write(f'Database file: {size / 2**20:.1f} MiB -> '
+                                  f'{_database_size() / 2**20:.1f} MiB.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Retention run finished in {time.perf_counter() - started:.1f}s.'))
+
+    def report_plan(self, expired_before, before, courses):
+        if expired_before is not None:
+            count = expired_unscanned_keys(expired_before).count()
+            self.stdout.write(f'Would delete {count} expired unscanned session key(s) and their lectures.')
+        if before is not None:
+            lectures = LectureSession.objects.filter(course__in=courses, held_at__lt=before)
+            records = AttendanceRecord.objects.filter(session__in=lectures).count()
+            self.stdout.write(f'Would archive {lectures.count()} lecture(s) and '
+                              f'{records} attendance record(s).')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Course
+from core.tallies import check_tallies, rebuild_tallies
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the per-student attendance tallies from the attendance "
+            "records, or with --check only reports tallies that disagree.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='courses',
+                            metavar='COURSE_CODE',
+                            help='Limit to this course; repeat for several.')
+        parser.add_argument('--check', action='store_true',
+                            help='Verify the tallies without changing them.')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('course_code')
+        if options['courses']:
+            courses = courses.filter(course_code__in=options['courses'])
+
+        if not options['check']:
+            rebuilt = rebuild_tallies(courses)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} attendance tallies.'))
+            return
+
+        mismatches = check_tallies(courses)
+        for course_code, student_id, stored, actual in mismatches:
+            self.stdout.write(f'{course_code} {student_id}: tally {stored}, records {actual}')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} tally mismatch(es); '
+                               'run without --check to rebuild.')
+        self.stdout.write(self.style.SUCCESS('All attendance tallies match the records.'))
@@ -0,0 +1,292 @@
+"""In-process request metrics, exported in the Prometheus text format.
+
+The middleware (or the ``instrument`` decorator on a single view) records
+per route the wall time, the number and total time of SQL queries, and the
+time spent in sections marked with ``timed`` (fuzzy matching, geofence
+checks, QR rendering). Values go into fixed-bucket histograms kept by each
+worker process, next to counters such as the requests refused by
+``core.ratelimit``; ``render_prometheus`` formats them for scraping.
+
+With DEBUG on, requests that run many queries or a slow one log their most
+expensive statements to the ``core.metrics`` logger, grouped by SQL so an
+N+1 shows up as one statement repeated N times.
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import ContextDecorator, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+HISTOGRAMS = {
+    'core_request_seconds': ('Wall time of requests per route.', SECONDS_BUCKETS),
+    'core_request_sql_queries': ('SQL queries run per request.', COUNT_BUCKETS),
+    'core_request_sql_seconds': ('Time spent in SQL per request.', SECONDS_BUCKETS),
+    'core_section_seconds': ('Time spent per request in an instrumented section.',
+                             SECONDS_BUCKETS),
+}
+
+COUNTERS = {
+    'core_throttled_requests_total': 'Requests refused by a rate limit rule.',
+}
+
+_current = ContextVar('core_request_metrics', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of one labelled series."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """All histograms and counters of this process, keyed by name and label values."""
+
+    def __init__(self):
+        self._series = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Histogram(HISTOGRAMS[name][1])
+            series.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter_values(self, name):
+        """Returns {labels: value} for one counter, labels as sorted tuples."""
+        with self._lock:
+            return {labels: value for (counter, labels), value in self._counters.items()
+                    if counter == name}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+
+    def render(self):
+        """Returns every series in the Prometheus text exposition format."""
+        with self._lock:
+            series = sorted(self._series.items())
+            lines = []
+            for name, (help_text, _) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (series_name, labels), histogram in series:
+                    if series_name != name:
+                        continue
+                    label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    for bound, total in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {total}')
+                    lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{label_text}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{label_text}}} {histogram.count}')
+            counters = sorted(self._counters.items())
+            for name, help_text in COUNTERS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (counter_name, labels), value in counters:
+                    if counter_name == name:
+                        label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                        lines.append(f'{name}{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def render_prometheus():
+    return registry.render()
+
+
+def metrics_settings():
+    return {
+        'TOKEN': '',
+        'SLOW_QUERY_MS': 100,
+        'QUERY_COUNT_WARNING': 50,
+        **getattr(settings, 'ATTENDANCE_METRICS', {}),
+    }
+
+
+class RequestMetrics:
+    """What one request spent its time on."""
+
+    def __init__(self, keep_queries=False):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.sections = {}
+        # (sql, seconds) of every query, only kept for the DEBUG slow log
+        self.statements = [] if keep_queries else None
+
+    def add_section(self, section, seconds):
+        self.sections[section] = self.sections.get(section, 0.0) + seconds
+
+    def observe(self, route, seconds):
+        registry.observe('core_request_seconds', seconds, route=route)
+        registry.observe('core_request_sql_queries', self.queries, route=route)
+        registry.observe('core_request_sql_seconds', self.sql_seconds, route=route)
+        for section, spent in self.sections.items():
+            registry.observe('core_section_seconds', spent, route=route, section=section)
+
+    def log_slow_queries(self, route, seconds):
+        config = metrics_settings()
+        slowest = max((spent for _, spent in self.statements), default=0)
+        if (self.queries < config['QUERY_COUNT_WARNING']
+                and slowest * 1000 < config['SLOW_QUERY_MS']):
+            return
+        grouped = {}
+        for sql, spent in self.statements:
+            count, total = grouped.get(sql, (0, 0.0))
+            grouped[sql] = (count + 1, total + spent)
+        top = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:5]
+        logger.warning(
+            '%s took %.0fms with %d queries (%.0fms in SQL); most expensive:\n%s',
+            route, seconds * 1000, self.queries, self.sql_seconds * 1000,
+            '\n'.join(f'  {count}x {total * 1000:.1f}ms  {sql}'
+                      for sql, (count, total) in top))
+
+
+class timed(ContextDecorator):
+    """Adds the time spent in a block or function to the current request.
+
+    A no-op outside an instrumented request.
+    """
+
+    def __init__(self, section):
+        self.section = section
+        self._metrics = None
+        self._start = 0.0
+
+    def _recreate_cm(self):
+        # A fresh instance per call, so concurrent calls don't share state
+        return type(self)(self.section)
+
+    def __enter__(self):
+        self._metrics = _current.get()
+        if self._metrics is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._metrics is not None:
+            self._metrics.add_section(self.section, time.perf_counter() - self._start)
+        return False
+
+
+def _record_sql(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        spent = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.sql_seconds += spent
+        if metrics.statements is not None:
+            metrics.statements.append((sql, spent))
+
+
+def _wrap_connection(connection, **kwargs):
+    if _record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_sql)
+
+
+# Connections opened from now on, in any thread, report their queries
+connection_created.connect(_wrap_connection)
+
+
+@contextmanager
+def _track(request):
+    if _current.get() is not None:
+        # Already measured by the middleware
+        yield
+        return
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(connection)
+    metrics = RequestMetrics(keep_queries=settings.DEBUG)
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _current.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unmatched'
+        metrics.observe(route, seconds)
+        if metrics.statements is not None:
+            metrics.log_slow_queries(route, seconds)
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """Measures every request. Streamed bodies are timed until the response
+    is returned, not until the last chunk is sent."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with _track(request):
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with _track(request):
+                return get_response(request)
+    return middleware
+
+
+def instrument(view):
+    """Measures a single view when the middleware is not installed."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with _track(request):
+                return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with _track(request):
+                return view(request, *args, **kwargs)
+    return wrapper
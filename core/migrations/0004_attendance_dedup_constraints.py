@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_attendance(apps, schema_editor):
+    """Keeps the earliest record of each (student, course, session_key)."""
+    AttendanceRecord = apps.get_model('core', 'AttendanceRecord')
+    duplicates = (
+        AttendanceRecord.objects.values('student', 'course', 'session_key')
+        .annotate(first_id=Min('id'), copies=Count('id'))
+        .filter(copies__gt=1)
+    )
+    for group in duplicates.iterator():
+        AttendanceRecord.objects.filter(
+            student=group['student'], course=group['course'],
+            session_key=group['session_key'],
+        ).exclude(id=group['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_attendance_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['course', 'session_key'], name='attendance_course_session_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendancerecord',
+            constraint=models.UniqueConstraint(fields=('student', 'course', 'session_key'), name='unique_attendance_per_session'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_attendance_dedup_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionkey',
+            name='geofence_polygon',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
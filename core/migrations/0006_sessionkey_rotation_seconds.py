@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_sessionkey_geofence_polygon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionkey',
+            name='rotation_seconds',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
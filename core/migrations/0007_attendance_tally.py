@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def build_tallies(apps, schema_editor):
+    """Fills the tally table from the existing attendance records."""
+    AttendanceRecord = apps.get_model('core', 'AttendanceRecord')
+    AttendanceTally = apps.get_model('core', 'AttendanceTally')
+    rows = (
+        AttendanceRecord.objects.values('course_id', 'student_id')
+        .annotate(attended=Count('id'), last=Max('timestamp'))
+    )
+    AttendanceTally.objects.bulk_create(
+        (AttendanceTally(course_id=row['course_id'], student_id=row['student_id'],
+                         attended_count=row['attended'], last_seen=row['last'])
+         for row in rows.iterator()),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_sessionkey_rotation_seconds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attended_count', models.PositiveIntegerField(default=0)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tallies', to='core.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tallies', to='core.student')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('course', 'student'), name='unique_tally_per_student_course')],
+            },
+        ),
+        migrations.RunPython(build_tallies, migrations.RunPython.noop),
+    ]
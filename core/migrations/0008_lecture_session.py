@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_attendance_tally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LectureSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=100)),
+                ('held_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecture_sessions', to='core.course')),
+                ('session_key', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lecture', to='core.sessionkey')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='session',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='records', to='core.lecturesession'),
+        ),
+        migrations.AddConstraint(
+            model_name='lecturesession',
+            constraint=models.UniqueConstraint(fields=('course', 'label'), name='unique_lecture_label_per_course'),
+        ),
+    ]
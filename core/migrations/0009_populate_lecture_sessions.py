@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.db.models import Min
+
+
+def populate_lecture_sessions(apps, schema_editor):
+    """Turns each distinct (course, session_key) string into a LectureSession.
+
+    QR sessions are linked to their SessionKey. SessionKeys that were
+    opened but never scanned were not lectures held and get no lecture;
+    one is created if a scan arrives later.
+    """
+    AttendanceRecord = apps.get_model('core', 'AttendanceRecord')
+    LectureSession = apps.get_model('core', 'LectureSession')
+    SessionKey = apps.get_model('core', 'SessionKey')
+
+    session_keys = {key.key: key for key in SessionKey.objects.all()}
+    held = (
+        AttendanceRecord.objects.values('course_id', 'session_key')
+        .annotate(held_at=Min('timestamp'))
+        .order_by()
+    )
+    for row in held.iterator():
+        session_key = session_keys.pop(row['session_key'], None)
+        if session_key is not None and session_key.course_id != row['course_id']:
+            session_key = None
+        lecture = LectureSession.objects.create(
+            course_id=row['course_id'], label=row['session_key'],
+            session_key=session_key, held_at=row['held_at'])
+        AttendanceRecord.objects.filter(
+            course_id=row['course_id'], session_key=row['session_key'],
+        ).update(session=lecture)
+
+
+def restore_session_keys(apps, schema_editor):
+    AttendanceRecord = apps.get_model('core', 'AttendanceRecord')
+    LectureSession = apps.get_model('core', 'LectureSession')
+    for lecture in LectureSession.objects.all().iterator():
+        AttendanceRecord.objects.filter(session=lecture).update(session_key=lecture.label[:50])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_lecture_session'),
+    ]
+
+    operations = [
+        # The string-keyed constraint and index are replaced in 0010; they are
+        # dropped first so that, backwards, they return after the strings do
+        migrations.RemoveConstraint(
+            model_name='attendancerecord',
+            name='unique_attendance_per_session',
+        ),
+        migrations.RemoveIndex(
+            model_name='attendancerecord',
+            name='attendance_course_session_idx',
+        ),
+        migrations.RunPython(populate_lecture_sessions, restore_session_keys),
+    ]
@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_populate_lecture_sessions'),
+    ]
+
+    operations = [
+        # A default lets the column be restored when migrating backwards
+        migrations.AlterField(
+            model_name='attendancerecord',
+            name='session_key',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.RemoveField(
+            model_name='attendancerecord',
+            name='session_key',
+        ),
+        migrations.AlterField(
+            model_name='attendancerecord',
+            name='session',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='records', to='core.lecturesession'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendancerecord',
+            constraint=models.UniqueConstraint(fields=('session', 'student'), name='unique_attendance_per_session'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['student', 'course'], name='attendance_student_course_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_attendance_session_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='matched_by_name',
+            field=models.BooleanField(default=False),
+        ),
+    ]
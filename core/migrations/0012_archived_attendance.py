@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_attendance_matched_by_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.CharField(max_length=40)),
+                ('attended_count', models.PositiveIntegerField()),
+                ('sessions_held', models.PositiveIntegerField()),
+                ('first_seen', models.DateTimeField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance', to='core.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance', to='core.student')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('course', 'semester', 'student'), name='unique_archive_per_student_semester')],
+            },
+        ),
+    ]
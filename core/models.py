@@ -1,6 +1,10 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .geofence import clean_polygon
+
 # --- 1. Course Model ---
 
 
@@ -36,23 +40,22 @@ class Student(models.Model):
         course = self.courses.first()
         if not course:
             return 0.0
+        return self.attendance_score_for(course)
 
-        try:
-            # Fetches the max marks configuration for this course
-            max_marks_record = StudentMaxMarks.objects.get(course=course)
-        except StudentMaxMarks.DoesNotExist:
-            return 0.0
-
-        # Number of times the student was marked present
-        attended_count = self.attendancerecord_set.count()
-        total_possible = course.total_lectures_possible
-        max_attendance_marks = max_marks_record.max_attendance_marks
+    def attendance_score_for(self, course):
+        """Calculates the attendance score for one specific course."""
+        from .grading import compute_score, max_attendance_marks_for
 
-        if total_possible == 0 or max_attendance_marks == 0:
+        # Fetches the max marks configuration for this course
+        max_attendance_marks = max_attendance_marks_for(course)
+        if max_attendance_marks is None:
             return 0.0
 
-        score = (attended_count / total_possible) * max_attendance_marks
-        return round(score, 2)
+        # Number of times the student was marked present in this course only
+        attended_count = self.tallies.filter(course=course).values_list(
+            'attended_count', flat=True).first() or 0
+        return compute_score(
+            attended_count, course.total_lectures_possible, max_attendance_marks)
 
 # --- 3. Session Key Model (For QR Code/Location) ---
 
@@ -70,21 +73,84 @@ class SessionKey(models.Model):
     required_longitude = models.DecimalField(
         max_digits=9, decimal_places=6, null=True, blank=True)
 
+    # Optional lecture-hall outline as [[lat, lon], ...]; when set it is used
+    # instead of the circle around the required location
+    geofence_polygon = models.JSONField(null=True, blank=True)
+
     # Allowed distance tolerance in meters
     location_tolerance_m = models.IntegerField(default=50)
 
+    # When non-zero, the QR code carries a token that changes this often
+    rotation_seconds = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"{self.course.course_code} - {self.key}"
 
-# --- 4. Attendance Record Model ---
+    def clean(self):
+        if self.geofence_polygon:
+            try:
+                self.geofence_polygon = clean_polygon(self.geofence_polygon)
+            except ValueError as exc:
+                raise ValidationError({'geofence_polygon': str(exc)})
+
+# --- 4. Lecture Session Model ---
+
+
+class LectureSessionQuerySet(models.QuerySet):
+
+    def held(self):
+        """Lectures with attendance recorded.
+
+        A QR lecture is created with its session, so codes that were opened
+        and abandoned or regenerated before anyone scanned are left out.
+        """
+        return self.filter(models.Exists(
+            AttendanceRecord.objects.filter(session=models.OuterRef('pk'))))
+
+
+class LectureSession(models.Model):
+    """A lecture that was actually held, opened by QR code or recorded manually."""
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='lecture_sessions')
+    # "Week 1" for manual registers, the SessionKey key for QR sessions
+    label = models.CharField(max_length=100)
+    session_key = models.OneToOneField(
+        SessionKey, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='lecture')
+    held_at = models.DateTimeField(default=timezone.now)
+
+    objects = LectureSessionQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['course', 'label'], name='unique_lecture_label_per_course'),
+        ]
+
+    def __str__(self):
+        return f"{self.course.course_code} - {self.label}"
+
+    @classmethod
+    def for_session_key(cls, session_key):
+        """Returns the lecture opened by a QR SessionKey, creating it if needed."""
+        lecture, _ = cls.objects.get_or_create(
+            session_key=session_key,
+            defaults={'course_id': session_key.course_id, 'label': session_key.key,
+                      'held_at': session_key.created_at})
+        return lecture
+
+# --- 5. Attendance Record Model ---
 
 
 class AttendanceRecord(models.Model):
     """Logs when a student was successfully marked present for a lecture."""
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    session_key = models.CharField(max_length=50)
+    # Set from the scan time rather than the insert time, so scans flushed
+    # later by the ingestion queue keep the moment they were taken
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    session = models.ForeignKey(
+        LectureSession, on_delete=models.CASCADE, related_name='records')
 
     # Fields to record the student's location at the time of scan
     student_latitude = models.DecimalField(
@@ -92,10 +158,48 @@ class AttendanceRecord(models.Model):
     student_longitude = models.DecimalField(
         max_digits=9, decimal_places=6, null=True, blank=True)
 
+    # True when the scan gave an unknown index number and the student was
+    # found by fuzzy-matching the typed name against the course roster
+    matched_by_name = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            # One record per student per session; repeated scans are no-ops
+            models.UniqueConstraint(
+                fields=['session', 'student'],
+                name='unique_attendance_per_session'),
+        ]
+        indexes = [
+            # Tally refreshes and per-student course statistics
+            models.Index(fields=['student', 'course'],
+                         name='attendance_student_course_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.full_name} present for {self.course.course_code}"
 
-# --- 5. Student Max Marks (Configuration Model) ---
+# --- 6. Attendance Tally (Materialized per-student counts) ---
+
+
+class AttendanceTally(models.Model):
+    """Running attendance count per student per course, kept in step with AttendanceRecord."""
+    student = models.ForeignKey(
+        Student, on_delete=models.CASCADE, related_name='tallies')
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='tallies')
+    attended_count = models.PositiveIntegerField(default=0)
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['course', 'student'], name='unique_tally_per_student_course'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} attended {self.attended_count} of {self.course.course_code}"
+
+# --- 7. Student Max Marks (Configuration Model) ---
 
 
 class StudentMaxMarks(models.Model):
@@ -115,3 +219,31 @@ class StudentMaxMarks(models.Model):
     def __str__(self):
 
         return f"Max Marks for {self.course.course_code}"
+
+# --- 8. Archived Attendance (Compacted past semesters) ---
+
+
+class ArchivedAttendance(models.Model):
+    """A student's attendance in one course over a semester rolled out of the hot tables."""
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='archived_attendance')
+    student = models.ForeignKey(
+        Student, on_delete=models.CASCADE, related_name='archived_attendance')
+    # Label given when archiving, e.g. "2024/25 Semester 1"
+    semester = models.CharField(max_length=40)
+    attended_count = models.PositiveIntegerField()
+    # Lectures the course held in the archived semester
+    sessions_held = models.PositiveIntegerField()
+    first_seen = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['course', 'semester', 'student'],
+                name='unique_archive_per_student_semester'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} attended {self.attended_count}/{self.sessions_held} of {self.course.course_code} ({self.semester})"
@@ -0,0 +1,61 @@
+"""QR code rendering for attendance sessions.
+
+Images are rendered once per (session key, format, size) and kept in an
+LRU cache, so the display page and any refreshes of it are served from
+memory after the first request.
+"""
+import hashlib
+import io
+from functools import lru_cache
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.urls import reverse
+
+from .metrics import timed
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+DEFAULT_BOX_SIZE = 10
+MAX_BOX_SIZE = 40
+
+
+def scan_url(key, token=None):
+    """Returns the absolute URL a student's phone opens for a session."""
+    view = ('core:scan_attendance_async' if settings.ATTENDANCE_ASYNC_SCAN
+            else 'core:scan_attendance')
+    path = reverse(view, kwargs={'key': key})
+    if token:
+        path = f'{path}?t={token}'
+    return f"{settings.ATTENDANCE_PUBLIC_HOST}{path}"
+
+
+@timed('qr_render')
+def render_qr(content, fmt='png', box_size=DEFAULT_BOX_SIZE):
+    """Rasterizes ``content`` as a PNG or SVG QR code and returns the bytes."""
+    factory = qrcode.image.svg.SvgPathImage if fmt == 'svg' else None
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=5,
+                       image_factory=factory)
+    qr.add_data(content)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image().save(buffer)
+    else:
+        qr.make_image(fill='black', back_color='white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=256)
+def session_qr_image(key, fmt='png', box_size=DEFAULT_BOX_SIZE, token=None):
+    """Returns (bytes, etag) for a session's QR code, cached per size and format.
+
+    Rotating sessions pass the current token, so each rotation is rendered
+    once and then served from the cache for the rest of its slot.
+    """
+    data = render_qr(scan_url(key, token), fmt, box_size)
+    return data, hashlib.sha1(data).hexdigest()
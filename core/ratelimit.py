@@ -0,0 +1,151 @@
+"""Token-bucket rate limiting of the scan views.
+
+Every rule in ``ATTENDANCE_RATE_LIMIT['RULES']`` is a bucket of
+``capacity`` tokens refilled at ``per_second`` tokens a second; a request
+takes one token from each bucket it falls in and is refused with 429 when
+one of them is empty. Two rules apply to scans:
+
+1. ``ip``: every request from one client address, across sessions.
+   Sized for a whole lecture hall behind one NAT address, where every
+   student loads the form and submits it within about a minute; it only
+   stops floods far beyond a class.
+2. ``student``: form submissions for one index number (or typed name) in
+   one session. Tight, so a replayed or scripted submission loop is cut
+   off after a few attempts.
+
+Bucket keys come from the request alone, so a refused request is turned
+away before the session lookup, the ORM or the fuzzy matcher run.
+
+``MemoryBackend`` keeps buckets per worker process. ``CacheBackend`` keeps
+them in the Django cache, shared by every worker using the same cache
+server; its read-modify-write is not atomic, so concurrent requests may
+occasionally be let through one token early.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .metrics import registry
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'core.ratelimit.MemoryBackend',
+    # Proxies in front of the app that append to X-Forwarded-For; 0 trusts
+    # REMOTE_ADDR only
+    'FORWARDED_PROXIES': 0,
+    'RULES': {
+        'ip': {'capacity': 1000, 'per_second': 10.0},
+        'student': {'capacity': 5, 'per_second': 0.05},
+    },
+}
+
+CACHE_PREFIX = 'core:ratelimit:'
+
+
+def rate_limit_settings():
+    """Returns ATTENDANCE_RATE_LIMIT merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'ATTENDANCE_RATE_LIMIT', {})}
+
+
+def _take(tokens, updated, capacity, per_second, now):
+    """Refills a bucket up to ``now`` and takes a token if there is one.
+
+    Returns (tokens left, seconds to wait); the wait is 0 when allowed.
+    """
+    tokens = min(capacity, tokens + (now - updated) * per_second)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / per_second
+
+
+class MemoryBackend:
+    """Buckets in a dict of this process, pruned once they refill."""
+
+    MAX_BUCKETS = 100_000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, per_second):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens, wait = _take(tokens, updated, capacity, per_second, now)
+            # Kept with the moment it will be full again, for pruning
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / per_second)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        # A bucket that has refilled is the same as no bucket at all
+        self._buckets = {key: bucket for key, bucket in self._buckets.items()
+                         if bucket[2] > now}
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBackend:
+    """Buckets in the Django cache, shared by workers using the same cache."""
+
+    def consume(self, key, capacity, per_second):
+        now = time.time()
+        key = CACHE_PREFIX + key
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens, wait = _take(tokens, updated, capacity, per_second, now)
+        # Expires once it would have refilled anyway
+        cache.set(key, (tokens, now), timeout=int((capacity - tokens) / per_second) + 1)
+        return wait
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(path):
+    """Returns the shared instance of the backend class at ``path``."""
+    backend = _backends.get(path)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.setdefault(path, import_string(path)())
+    return backend
+
+
+def client_ip(request, forwarded_proxies=0):
+    """Returns the client address, as seen by the outermost trusted proxy."""
+    if forwarded_proxies:
+        hops = [hop.strip() for hop in
+                request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(hops) >= forwarded_proxies:
+            return hops[-forwarded_proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def throttle_scan(request, key):
+    """Returns the seconds to wait if this scan request must be refused, else None."""
+    config = rate_limit_settings()
+    if not config['ENABLED']:
+        return None
+
+    buckets = [('ip', client_ip(request, config['FORWARDED_PROXIES']))]
+    if request.method == 'POST':
+        student = (request.POST.get('index_number', '').strip()
+                   or ' '.join(request.POST.get('full_name', '').lower().split()))
+        buckets.append(('student', f'{key}:{student}'))
+
+    backend = get_backend(config['BACKEND'])
+    for rule, ident in buckets:
+        limits = config['RULES'].get(rule)
+        if limits is None:
+            continue
+        wait = backend.consume(f'{rule}:{ident}', limits['capacity'], limits['per_second'])
+        if wait:
+            registry.increment('core_throttled_requests_total', rule=rule)
+            return wait
+    return None
@@ -0,0 +1,142 @@
+"""Retention of expired QR sessions and compaction of past semesters.
+
+Every QR session leaves a SessionKey behind, and attendance records pile
+up semester after semester. Three jobs keep the hot tables small, each
+committing in batches so the database writer lock is only held briefly:
+
+1. ``purge_expired_sessions`` deletes SessionKeys that expired before a
+   cutoff without a single scan recorded, e.g. QR codes generated again
+   before anyone scanned them, together with their empty lectures. Keys
+   of lectures with attendance keep the
+   location and fence the geofence audit re-checks scans against, and go
+   when their lectures are archived.
+2. ``archive_semester`` rolls, course by course, the lectures held before
+   a cutoff into one ArchivedAttendance row per student, then deletes the
+   lectures and their records and recomputes the affected tallies. Grades
+   then reflect the current semester only.
+3. ``compact_database`` reclaims the freed pages and refreshes the query
+   planner statistics (VACUUM and ANALYZE).
+"""
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min
+
+from .dashboard import invalidate_course_stats
+from .models import (
+    ArchivedAttendance, AttendanceRecord, AttendanceTally, Course, LectureSession,
+    SessionKey)
+from .tallies import sync_tallies
+
+HOT_TABLES = (AttendanceRecord, AttendanceTally, LectureSession, SessionKey,
+              ArchivedAttendance)
+
+
+def expired_unscanned_keys(before):
+    """SessionKeys that expired before ``before`` with no attendance recorded."""
+    return SessionKey.objects.filter(expires_at__lt=before).exclude(
+        lecture__records__isnull=False)
+
+
+def purge_expired_sessions(before, batch_size=1000):
+    """Deletes unscanned SessionKeys that expired before ``before`` and their
+    empty lectures; returns how many keys."""
+    purged = 0
+    while True:
+        keys = list(expired_unscanned_keys(before)
+                    .order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return purged
+        with transaction.atomic():
+            # Nothing was recorded at these lectures, so nothing is archived
+            LectureSession.objects.filter(session_key__in=keys).exclude(
+                records__isnull=False).delete()
+            SessionKey.objects.filter(pk__in=keys).delete()
+        purged += len(keys)
+
+
+def archive_course(course, before, semester):
+    """Archives one course's lectures held before ``before`` in one transaction.
+
+    Returns (lectures archived, records archived). Archiving under a
+    semester label that already has rows for the course adds to them.
+    """
+    lectures = LectureSession.objects.filter(course=course, held_at__lt=before)
+    records = AttendanceRecord.objects.filter(session__in=lectures)
+    with transaction.atomic():
+        held = lectures.count()
+        if not held:
+            return 0, 0
+        summary = list(records.values('student_id').annotate(
+            attended=Count('id'), first=Min('timestamp'), last=Max('timestamp')))
+
+        existing = {row.student_id: row for row in ArchivedAttendance.objects.filter(
+            course=course, semester=semester)}
+        held_before = max((row.sessions_held for row in existing.values()), default=0)
+        for row in existing.values():
+            row.sessions_held += held
+        created = []
+        for row in summary:
+            archived = existing.get(row['student_id'])
+            if archived is None:
+                created.append(ArchivedAttendance(
+                    course=course, student_id=row['student_id'], semester=semester,
+                    attended_count=row['attended'], sessions_held=held_before + held,
+                    first_seen=row['first'], last_seen=row['last']))
+            else:
+                archived.attended_count += row['attended']
+                archived.first_seen = min(filter(None, (archived.first_seen, row['first'])))
+                archived.last_seen = max(filter(None, (archived.last_seen, row['last'])))
+        ArchivedAttendance.objects.bulk_create(created, batch_size=2000)
+        ArchivedAttendance.objects.bulk_update(
+            existing.values(), ['attended_count', 'sessions_held', 'first_seen', 'last_seen'],
+            batch_size=2000)
+
+        # Deleted without loading rows or sending per-row signals; tallies
+        # and dashboard figures are refreshed below for the whole course
+        session_keys = list(lectures.exclude(session_key=None)
+                            .values_list('session_key', flat=True))
+        archived_records = records._raw_delete(records.db)
+        lectures._raw_delete(lectures.db)
+        SessionKey.objects.filter(pk__in=session_keys).delete()
+        sync_tallies(course.pk, [row['student_id'] for row in summary])
+        invalidate_course_stats(course.pk)
+    return held, archived_records
+
+
+def archive_semester(before, semester, courses=None, progress=None):
+    """Archives every course's lectures held before ``before``.
+
+    Returns {'courses': n, 'lectures': n, 'records': n}.
+    """
+    courses = Course.objects.order_by('course_code') if courses is None else courses
+    totals = {'courses': 0, 'lectures': 0, 'records': 0}
+    for course in list(courses):
+        lectures, records = archive_course(course, before, semester)
+        if not lectures:
+            continue
+        totals['courses'] += 1
+        totals['lectures'] += lectures
+        totals['records'] += records
+        if progress:
+            progress(f'{course.course_code}: {lectures} lectures, {records} records')
+    return totals
+
+
+def compact_database(using='default'):
+    """Reclaims free space and refreshes planner statistics.
+
+    SQLite rebuilds the whole file; PostgreSQL vacuums the hot tables.
+    VACUUM cannot run inside a transaction, so nothing is done there and
+    False is returned.
+    """
+    connection = connections[using]
+    if connection.in_atomic_block:
+        return False
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+            cursor.execute('ANALYZE')
+        elif connection.vendor == 'postgresql':
+            for model in HOT_TABLES:
+                cursor.execute(f'VACUUM ANALYZE {quote(model._meta.db_table)}')
+    return True
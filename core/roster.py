@@ -0,0 +1,98 @@
+"""Per-course roster index used for fuzzy name matching during scans.
+
+Each index holds the enrolled students' names already normalized, and is
+built once per course and reused until enrollment changes or
+``ATTENDANCE_ROSTER_TTL`` seconds pass, whichever comes first: the
+version counters only reach every worker when the cache backend is
+shared. Matching uses
+RapidFuzz's batch extractOne with a score cutoff instead of scoring every
+student in a Python loop.
+"""
+import threading
+import time
+
+from django.conf import settings
+from rapidfuzz import fuzz, process
+
+from .caching import bump_version, get_version
+from .metrics import timed
+from .models import Student
+
+# Minimum partial-ratio score for a name to count as a match
+MATCH_THRESHOLD = 85
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def normalize_name(name):
+    """Lowercases a name and collapses runs of whitespace."""
+    return ' '.join(name.lower().split())
+
+
+class RosterIndex:
+    """Pre-normalized names of the students enrolled in one course."""
+
+    def __init__(self, students):
+        self.index_numbers = []
+        self.full_names = []
+        self.names = []
+        for index_number, full_name in students:
+            self.index_numbers.append(index_number)
+            self.full_names.append(full_name)
+            self.names.append(normalize_name(full_name))
+
+    def __len__(self):
+        return len(self.names)
+
+    @timed('fuzzy_match')
+    def match(self, name, threshold=MATCH_THRESHOLD):
+        """Returns the (index_number, full_name) best matching ``name``, or None."""
+        query = normalize_name(name or '')
+        if not query or not self.names:
+            return None
+        result = process.extractOne(
+            query, self.names, scorer=fuzz.partial_ratio, processor=None,
+            score_cutoff=threshold)
+        if result is None or result[1] <= threshold:
+            return None
+        position = result[2]
+        return self.index_numbers[position], self.full_names[position]
+
+
+def roster_version_name(course_id):
+    return f'roster:{course_id}'
+
+
+def roster_ttl():
+    return getattr(settings, 'ATTENDANCE_ROSTER_TTL', 300)
+
+
+def _fresh(cached, version):
+    return (cached is not None and cached[0] == version
+            and time.monotonic() - cached[1] < roster_ttl())
+
+
+def get_roster_index(course_id):
+    """Returns the cached roster index for a course, rebuilding it if stale."""
+    version = get_version(roster_version_name(course_id))
+    cached = _indexes.get(course_id)
+    if _fresh(cached, version):
+        return cached[2]
+
+    with _lock:
+        cached = _indexes.get(course_id)
+        if _fresh(cached, version):
+            return cached[2]
+        index = RosterIndex(
+            Student.objects.filter(courses=course_id)
+            .order_by('full_name')
+            .values_list('index_number', 'full_name'))
+        _indexes[course_id] = (version, time.monotonic(), index)
+        return index
+
+
+def invalidate_roster(course_id):
+    """Marks a course's roster index as stale in every worker."""
+    bump_version(roster_version_name(course_id))
+    _indexes.pop(course_id, None)
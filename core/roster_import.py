@@ -0,0 +1,207 @@
+"""Bulk import of student rosters and course enrollments.
+
+A roster is a CSV or XLSX file with ``index_number`` and ``full_name``
+columns and, unless every row is for the same course, a ``course_code``
+column. Rows are streamed from the file and processed in chunks. Each
+chunk is one transaction that inserts the chunk's new students with a
+single statement, renames existing ones with a single bulk update and
+adds their enrollments with a single conflict-ignoring bulk insert.
+
+An import limited to some courses (a lecturer's upload) only renames
+students enrolled in one of those courses; others keep their registered
+name and are still enrolled.
+"""
+import csv
+import io
+import re
+import zipfile
+
+from django.db import transaction
+
+from .dashboard import invalidate_course_stats
+from .models import Course, Student
+from .roster import invalidate_roster
+
+INDEX_NUMBER_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9/-]{0,14}$')
+MAX_REPORTED_ERRORS = 100
+
+# Accepted spellings of each column, after lowercasing and trimming
+COLUMN_ALIASES = {
+    'index_number': {'index_number', 'index number', 'index', 'index no'},
+    'full_name': {'full_name', 'full name', 'name', 'student name'},
+    'course_code': {'course_code', 'course code', 'course'},
+}
+
+
+class ImportReport:
+    """Counts and row errors collected while importing a roster."""
+
+    def __init__(self):
+        self.rows = 0
+        self.students = 0
+        self.enrollments = 0
+        self.skipped = 0
+        # Existing students outside the allowed courses, not renamed
+        self.names_kept = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'Row {line}: {message}')
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'students': self.students,
+            'enrollments': self.enrollments,
+            'skipped': self.skipped,
+            'names_kept': self.names_kept,
+            'errors': self.errors,
+        }
+
+
+def _column_map(header):
+    columns = {}
+    for position, name in enumerate(header):
+        name = str(name or '').strip().lower()
+        for field, aliases in COLUMN_ALIASES.items():
+            if name in aliases:
+                columns[field] = position
+    return columns
+
+
+def iter_roster_rows(source, fmt='csv'):
+    """Yields (line number, {field: value}) for each data row of a roster file.
+
+    ``source`` is a binary file object. Raises ValueError if the file
+    cannot be read or the header lacks the required columns.
+    """
+    if fmt == 'xlsx':
+        from openpyxl import load_workbook
+
+        try:
+            workbook = load_workbook(source, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, KeyError, OSError):
+            # Not a zip archive, or one without the workbook parts
+            raise ValueError('The file is not a readable Excel (.xlsx) workbook.')
+        rows = workbook.active.iter_rows(values_only=True)
+    else:
+        rows = csv.reader(io.TextIOWrapper(source, encoding='utf-8-sig', newline=''))
+
+    header = next(rows, None) or []
+    columns = _column_map(header)
+    missing = {'index_number', 'full_name'} - set(columns)
+    if missing:
+        raise ValueError(f"Roster is missing column(s): {', '.join(sorted(missing))}")
+
+    for line, row in enumerate(rows, start=2):
+        if not any(row):
+            continue
+        yield line, {
+            field: str(row[position]).strip() if position < len(row) and row[position] is not None else ''
+            for field, position in columns.items()
+        }
+
+
+def import_roster(rows, course=None, allowed_courses=None, chunk_size=2000,
+                  progress=None):
+    """Upserts students and enrollments from ``iter_roster_rows`` output.
+
+    ``course`` enrolls every row in that course; otherwise each row names
+    its course. ``allowed_courses`` optionally restricts which courses
+    may be enrolled into and whose students may be renamed. ``progress``
+    is called with the report after every chunk. Returns the ImportReport.
+    """
+    courses = Course.objects.all() if allowed_courses is None else allowed_courses
+    course_ids = dict(courses.values_list('course_code', 'pk'))
+    renamable = None if allowed_courses is None else set(course_ids.values())
+    report = ImportReport()
+    touched = set()
+    chunk = []
+
+    for line, row in rows:
+        report.rows += 1
+        index_number = row.get('index_number', '')
+        full_name = row.get('full_name', '')
+        if not INDEX_NUMBER_RE.match(index_number):
+            report.error(line, f'invalid index number "{index_number}".')
+            continue
+        if not full_name or len(full_name) > 150:
+            report.error(line, 'full name is missing or too long.')
+            continue
+
+        if course is not None:
+            course_id = course.pk
+        else:
+            code = row.get('course_code', '')
+            course_id = course_ids.get(code)
+            if course_id is None:
+                report.error(line, f'unknown course "{code}".')
+                continue
+
+        chunk.append((index_number, full_name, course_id))
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, report, touched, renamable)
+            chunk = []
+            if progress:
+                progress(report)
+
+    if chunk:
+        _write_chunk(chunk, report, touched, renamable)
+        if progress:
+            progress(report)
+
+    # Bulk writes bypass the model signals, so cached rosters and dashboard
+    # figures are invalidated here
+    for course_id in touched:
+        invalidate_roster(course_id)
+        invalidate_course_stats(course_id)
+    return report
+
+
+def _write_chunk(chunk, report, touched, renamable=None):
+    # Last row wins when a student appears more than once in a chunk
+    students = {index_number: full_name for index_number, full_name, _ in chunk}
+    enrollments = {(index_number, course_id) for index_number, _, course_id in chunk}
+    Through = Student.courses.through
+
+    with transaction.atomic():
+        current = dict(Student.objects.filter(pk__in=students)
+                       .values_list('index_number', 'full_name'))
+        renamed = {index_number for index_number, full_name in current.items()
+                   if full_name != students[index_number]}
+        if renamed and renamable is not None:
+            allowed = set(Through.objects.filter(
+                student_id__in=renamed, course_id__in=renamable,
+            ).values_list('student_id', flat=True))
+            report.names_kept += len(renamed - allowed)
+            renamed &= allowed
+
+        Student.objects.bulk_create(
+            [Student(index_number=index_number, full_name=full_name)
+             for index_number, full_name in students.items() if index_number not in current],
+            ignore_conflicts=True,
+        )
+        Student.objects.bulk_update(
+            [Student(index_number=index_number, full_name=students[index_number])
+             for index_number in renamed],
+            ['full_name'], batch_size=500,
+        )
+        # Only enrollments that did not exist yet are inserted and reported
+        enrollments -= set(Through.objects.filter(
+            student_id__in=students, course_id__in={course_id for _, course_id in enrollments},
+        ).values_list('student_id', 'course_id'))
+        Through.objects.bulk_create(
+            [Through(student_id=index_number, course_id=course_id)
+             for index_number, course_id in enrollments],
+            ignore_conflicts=True,
+        )
+        if renamed:
+            # A new name shows in the roster of every course the student takes
+            touched.update(Through.objects.filter(student_id__in=renamed)
+                           .values_list('course_id', flat=True))
+
+    report.students += len(students)
+    report.enrollments += len(enrollments)
+    touched.update(course_id for _, course_id in enrollments)
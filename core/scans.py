@@ -0,0 +1,127 @@
+"""Validation of QR scans, shared by the scan views and the JSON API.
+
+``check_scans`` applies the checks of scan_attendance to any number of
+scans of one session in a constant number of queries:
+
+1. Index numbers enrolled in the session's course are resolved with one
+   query on the enrollment table.
+2. Index numbers of students who exist but are not enrolled are refused;
+   any other scan falls back to a fuzzy match of the typed name against
+   the cached course roster.
+3. Positions are checked against the session's geofence in one
+   vectorized call.
+
+Session-level checks (expiry, rotating QR tokens) depend on how the scan
+arrived and are left to the caller.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from math import isfinite
+
+import numpy as np
+
+from .models import Student
+from .roster import get_roster_index
+
+NOT_FOUND = 'Student not found or name did not match database records.'
+NOT_ENROLLED = 'Error: Student is not registered for this course.'
+NO_LOCATION = 'Attendance requires geolocation. Please enable location services in your browser.'
+BAD_LOCATION = 'Your location could not be read. Please try again.'
+
+
+@dataclass
+class CheckedScan:
+    """One scan after validation; ``error`` says why it was refused."""
+    index_number: str
+    full_name: str = ''
+    latitude: object = None
+    longitude: object = None
+    timestamp: datetime = None
+    matched_by_name: bool = False
+    error: str = None
+
+
+def _outside_message(fence, distance_m):
+    where = 'away' if fence.kind == 'circle' else 'outside the lecture hall'
+    return f"Attendance flagged: You are {round(distance_m)}m {where}, but the limit is {fence.limit_m}m. Please move closer to the lecture hall."
+
+
+def _position(latitude, longitude):
+    """Returns (lat, lon) as floats, or an error message."""
+    if latitude in (None, '') or longitude in (None, ''):
+        return NO_LOCATION
+    try:
+        position = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return BAD_LOCATION
+    return position if all(isfinite(value) for value in position) else BAD_LOCATION
+
+
+def _check_locations(session, scans):
+    located = []
+    for scan in scans:
+        position = _position(scan.latitude, scan.longitude)
+        if isinstance(position, str):
+            scan.error = position
+        else:
+            located.append((scan, position))
+    fence = session.fence
+    if fence is None or not located:
+        return
+    coords = np.array([position for _, position in located])
+    inside, distance_m = fence.check_many(coords[:, 0], coords[:, 1])
+    for (scan, _), ok, distance in zip(located, inside, distance_m):
+        if not ok:
+            scan.error = _outside_message(fence, float(distance))
+
+
+def check_scans(session, scans):
+    """Validates scans of an ActiveSession; returns one CheckedScan each.
+
+    ``scans`` holds dicts with ``index_number``, ``full_name``,
+    ``latitude``, ``longitude`` and optionally ``timestamp``. Accepted scans
+    carry the resolved student's index number and name.
+    """
+    checked = [
+        CheckedScan(index_number=str(scan.get('index_number') or '').strip(),
+                    full_name=str(scan.get('full_name') or ''),
+                    latitude=scan.get('latitude'), longitude=scan.get('longitude'),
+                    timestamp=scan.get('timestamp'))
+        for scan in scans
+    ]
+
+    # 1. Exact index numbers, with the enrollment check in the same query
+    numbers = {scan.index_number for scan in checked if scan.index_number}
+    enrolled = {}
+    if numbers:
+        enrolled = dict(
+            Student.courses.through.objects
+            .filter(course_id=session.course_id, student_id__in=numbers)
+            .values_list('student_id', 'student__full_name'))
+    unknown = numbers - enrolled.keys()
+    registered = set()
+    if unknown:
+        registered = set(Student.objects.filter(pk__in=unknown)
+                         .values_list('pk', flat=True))
+
+    # 2. Fuzzy name match against the cached roster; matches are enrolled
+    # by construction
+    roster = None
+    for scan in checked:
+        if scan.index_number in enrolled:
+            scan.full_name = enrolled[scan.index_number]
+        elif scan.index_number in registered:
+            scan.error = NOT_ENROLLED
+        else:
+            if roster is None:
+                roster = get_roster_index(session.course_id)
+            best_match = roster.match(scan.full_name)
+            if best_match is None:
+                scan.error = NOT_FOUND
+            else:
+                scan.index_number, scan.full_name = best_match
+                scan.matched_by_name = True
+
+    # 3. Geofence
+    _check_locations(session, [scan for scan in checked if scan.error is None])
+    return checked
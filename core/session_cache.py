@@ -0,0 +1,197 @@
+"""Process-local cache of active attendance sessions for the scan path.
+
+A QR session is hit by the whole class within a few minutes, so each
+worker keeps the session's course, expiry and location in memory until
+``expires_at``. Setting ``ATTENDANCE_SESSION_CACHE_SHARED = True`` also
+stores entries in the configured Django cache, so workers can fill each
+other's misses when that backend is shared.
+"""
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .geofence import fence_for_session
+from .models import LectureSession, SessionKey
+
+SHARED_PREFIX = 'core:session:'
+
+
+class ActiveSession:
+    """The fields of a SessionKey the scan path needs, detached from the ORM."""
+
+    __slots__ = ('key', 'course_id', 'course_code', 'lecturer_id', 'lecture_id',
+                 'created_at', 'expires_at', 'required_latitude', 'required_longitude',
+                 'location_tolerance_m', 'rotation_seconds', 'fence')
+
+    def __init__(self, key, course_id, course_code, lecture_id, expires_at,
+                 required_latitude, required_longitude, location_tolerance_m,
+                 rotation_seconds=0, fence=None, lecturer_id=None, created_at=None):
+        self.key = key
+        self.course_id = course_id
+        self.course_code = course_code
+        self.lecturer_id = lecturer_id
+        self.lecture_id = lecture_id
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.required_latitude = required_latitude
+        self.required_longitude = required_longitude
+        self.location_tolerance_m = location_tolerance_m
+        self.rotation_seconds = rotation_seconds
+        self.fence = fence
+
+    @classmethod
+    def from_model(cls, session_obj):
+        def as_float(value):
+            return None if value is None else float(value)
+
+        try:
+            lecture = session_obj.lecture
+        except LectureSession.DoesNotExist:
+            lecture = LectureSession.for_session_key(session_obj)
+
+        return cls(
+            key=session_obj.key,
+            course_id=session_obj.course_id,
+            course_code=session_obj.course.course_code,
+            lecturer_id=session_obj.course.lecturer_id,
+            lecture_id=lecture.pk,
+            created_at=session_obj.created_at,
+            expires_at=session_obj.expires_at,
+            required_latitude=as_float(session_obj.required_latitude),
+            required_longitude=as_float(session_obj.required_longitude),
+            location_tolerance_m=session_obj.location_tolerance_m,
+            rotation_seconds=session_obj.rotation_seconds,
+            fence=fence_for_session(session_obj),
+        )
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        # Entries shared by workers running older code may lack newer fields
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+
+    def is_expired(self, now=None):
+        return self.expires_at < (now or timezone.now())
+
+
+class SessionCache:
+    """Active sessions keyed by session key, evicted at their expiry time."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def shared(self):
+        return getattr(settings, 'ATTENDANCE_SESSION_CACHE_SHARED', False)
+
+    def get(self, key):
+        """Returns the ActiveSession for ``key``, or None if it does not exist.
+
+        Expired sessions are still returned (so callers can report the
+        expiry) but are never kept in the cache.
+        """
+        now = timezone.now()
+        entry = self._cached(key, now)
+        if entry is not None:
+            return entry
+
+        self.misses += 1
+        session_obj = self._query(key).first()
+        if session_obj is None:
+            return None
+        entry = ActiveSession.from_model(session_obj)
+        self._store(entry, now)
+        return entry
+
+    async def aget(self, key):
+        """Async version of get; only a miss leaves the event loop."""
+        now = timezone.now()
+        entry = self._cached(key, now)
+        if entry is not None:
+            return entry
+
+        self.misses += 1
+        session_obj = await self._query(key).afirst()
+        if session_obj is None:
+            return None
+        # Sessions created before lectures existed get one on first use
+        entry = await sync_to_async(ActiveSession.from_model)(session_obj)
+        self._store(entry, now)
+        return entry
+
+    def put(self, session_obj):
+        """Caches a newly created SessionKey and returns its ActiveSession."""
+        entry = ActiveSession.from_model(session_obj)
+        self._store(entry, timezone.now())
+        return entry
+
+    def evict(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.evictions += 1
+        if self.shared:
+            cache.delete(SHARED_PREFIX + key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the cache counters for operators."""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _cached(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not entry.is_expired(now):
+                self.hits += 1
+                return entry
+            self.evict(key)
+
+        if self.shared:
+            entry = cache.get(SHARED_PREFIX + key)
+            if entry is not None and not entry.is_expired(now):
+                self.shared_hits += 1
+                self._entries[key] = entry
+                return entry
+        return None
+
+    @staticmethod
+    def _query(key):
+        return SessionKey.objects.select_related('course', 'lecture').filter(key=key)
+
+    def _store(self, entry, now):
+        if entry.is_expired(now):
+            return
+        with self._lock:
+            self._purge_expired(now)
+            self._entries[entry.key] = entry
+        if self.shared:
+            ttl = (entry.expires_at - now).total_seconds()
+            cache.set(SHARED_PREFIX + entry.key, entry, timeout=max(1, int(ttl)))
+
+    def _purge_expired(self, now):
+        expired = [key for key, entry in self._entries.items()
+                   if entry.is_expired(now)]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+
+
+active_sessions = SessionCache()
@@ -0,0 +1,92 @@
+"""Signal handlers keeping cached course data in step with the database."""
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .dashboard import invalidate_course_stats
+from .fragments import invalidate_course_list
+from .models import AttendanceRecord, Course, LectureSession, SessionKey, Student
+from .roster import invalidate_roster
+from .session_cache import active_sessions
+from .tallies import sync_tallies
+
+
+@receiver(m2m_changed, sender=Student.courses.through)
+def enrollment_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidates roster indexes when students join or leave courses."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # instance is a Course whose student set changed
+        course_ids = [instance.pk]
+    elif action == 'pre_clear':
+        course_ids = list(instance.courses.values_list('pk', flat=True))
+    else:
+        course_ids = pk_set or []
+    for course_id in course_ids:
+        invalidate_roster(course_id)
+        invalidate_course_stats(course_id)
+
+
+@receiver(post_save, sender=Student)
+@receiver(pre_delete, sender=Student)
+def student_changed(sender, instance, **kwargs):
+    """Invalidates the rosters of a student whose name or record changed."""
+    if kwargs.get('created'):
+        return
+    for course_id in instance.courses.values_list('pk', flat=True):
+        invalidate_roster(course_id)
+
+
+@receiver(pre_save, sender=Course)
+def remember_course_lecturer(sender, instance, **kwargs):
+    """Notes who taught an edited course before the edit."""
+    if instance.pk and not kwargs.get('raw'):
+        instance._previous_lecturer_id = sender.objects.filter(pk=instance.pk).values_list(
+            'lecturer_id', flat=True).first()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    """Refreshes the cached course pickers of the course's lecturer(s)."""
+    invalidate_course_list(instance.lecturer_id)
+    previous = getattr(instance, '_previous_lecturer_id', None)
+    if previous and previous != instance.lecturer_id:
+        invalidate_course_list(previous)
+
+
+@receiver(post_save, sender=SessionKey)
+@receiver(post_delete, sender=SessionKey)
+def session_key_changed(sender, instance, **kwargs):
+    """Drops edited or deleted sessions from the active-session cache."""
+    if kwargs.get('created'):
+        return
+    active_sessions.evict(instance.key)
+
+
+@receiver(post_save, sender=LectureSession)
+@receiver(post_delete, sender=LectureSession)
+def lecture_changed(sender, instance, **kwargs):
+    """Refreshes the dashboard figures when a lecture is opened or removed."""
+    invalidate_course_stats(instance.course_id)
+
+
+@receiver(pre_save, sender=AttendanceRecord)
+def remember_tally_owner(sender, instance, **kwargs):
+    """Notes who an edited record belonged to before the edit."""
+    if instance.pk and not kwargs.get('raw'):
+        instance._previous_owner = sender.objects.filter(pk=instance.pk).values_list(
+            'course_id', 'student_id').first()
+
+
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+def attendance_changed(sender, instance, **kwargs):
+    """Keeps tallies exact for records saved or deleted one at a time."""
+    if kwargs.get('raw'):
+        return
+    sync_tallies(instance.course_id, [instance.student_id])
+    previous = getattr(instance, '_previous_owner', None)
+    if previous and previous != (instance.course_id, instance.student_id):
+        sync_tallies(previous[0], [previous[1]])
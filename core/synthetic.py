@@ -0,0 +1,168 @@
+"""Synthetic attendance datasets for load tests and benchmarks.
+
+``generate_dataset`` fills the database with courses, students enrolled in
+several courses each, past QR-opened lectures and their attendance records,
+then rebuilds the tallies. The shape is meant to look like a real term:
+course sizes are skewed, each student has their own attendance habit, and
+scans are scattered around the lecture hall. The same seed always produces
+the same data.
+
+Synthetic course codes start with ``SYN`` and index numbers with ``8``, so
+the data can be told apart from (and does not collide with) real rosters.
+"""
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    AttendanceRecord, Course, LectureSession, SessionKey, Student, StudentMaxMarks)
+from .tallies import rebuild_tallies
+
+COURSE_PREFIX = 'SYN'
+HALL_LATITUDE = 6.6710
+HALL_LONGITUDE = -1.5658
+# Typical share of enrolled students present at a lecture
+ATTENDANCE_RATE = 0.75
+
+FIRST_NAMES = [
+    'Kwame', 'Kofi', 'Kwabena', 'Kwaku', 'Yaw', 'Kwasi', 'Kojo', 'Ama', 'Akosua',
+    'Abena', 'Akua', 'Yaa', 'Afua', 'Adwoa', 'Esi', 'Efua', 'Ekow', 'Nana',
+    'Emmanuel', 'Samuel', 'Daniel', 'Joseph', 'Richmond', 'Prince', 'Isaac',
+    'Grace', 'Mercy', 'Priscilla', 'Gifty', 'Comfort', 'Ruth', 'Elizabeth',
+]
+LAST_NAMES = [
+    'Mensah', 'Owusu', 'Boateng', 'Asante', 'Osei', 'Agyemang', 'Appiah',
+    'Ofori', 'Amoah', 'Acheampong', 'Badu', 'Darko', 'Antwi', 'Awuah',
+    'Gyamfi', 'Frimpong', 'Sarpong', 'Nkrumah', 'Addo', 'Quaye', 'Tetteh',
+    'Annan', 'Quansah', 'Bonsu', 'Amponsah', 'Adjei', 'Kusi', 'Opoku',
+]
+
+
+def _lecture_count(records, enrollments):
+    """Lectures per course so that ``records`` scans fit a realistic rate."""
+    if not enrollments:
+        return 1
+    return max(1, round(records / (enrollments * ATTENDANCE_RATE)))
+
+
+def generate_dataset(courses=50, students=20000, records=1_000_000,
+                     courses_per_student=5, seed=0, chunk_size=20000,
+                     progress=None):
+    """Creates a synthetic term of attendance data and returns a summary dict.
+
+    ``records`` is a target: the actual count lands close to it because
+    each student's presence at each lecture is drawn at random.
+    """
+    if Course.objects.filter(course_code__startswith=f'{COURSE_PREFIX} ').exists():
+        raise ValueError('Synthetic courses already exist; use a fresh database.')
+    courses_per_student = max(1, min(courses_per_student, courses))
+    report = progress or (lambda message: None)
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+
+    # 1. Lecturers and courses; a few lecturers teach several courses each
+    with transaction.atomic():
+        lecturers = []
+        for number in range(max(1, courses // 5)):
+            lecturer, _ = User.objects.get_or_create(username=f'synthetic-lecturer-{number}')
+            lecturers.append(lecturer)
+        course_objs = Course.objects.bulk_create([
+            Course(course_code=f'{COURSE_PREFIX} {number:03d}',
+                   name=f'Synthetic Course {number}',
+                   lecturer=lecturers[number % len(lecturers)])
+            for number in range(courses)
+        ])
+        StudentMaxMarks.objects.bulk_create(
+            [StudentMaxMarks(course=course) for course in course_objs])
+    report(f'{courses} courses created')
+
+    # 2. Students, each in a few courses; popular courses get more students
+    index_numbers = [f'8{number:07d}' for number in range(students)]
+    first = rng.integers(len(FIRST_NAMES), size=students)
+    last = rng.integers(len(LAST_NAMES), size=students)
+    weights = 1.0 / np.arange(1, courses + 1) ** 0.8
+    weights /= weights.sum()
+    Through = Student.courses.through
+    rosters = [[] for _ in course_objs]
+
+    for start in range(0, students, chunk_size):
+        stop = min(start + chunk_size, students)
+        with transaction.atomic():
+            Student.objects.bulk_create([
+                Student(index_number=index_numbers[i],
+                        full_name=f'{FIRST_NAMES[first[i]]} {LAST_NAMES[last[i]]}')
+                for i in range(start, stop)
+            ])
+            enrollments = []
+            for i in range(start, stop):
+                for position in rng.choice(courses, size=courses_per_student,
+                                           replace=False, p=weights):
+                    rosters[position].append(index_numbers[i])
+                    enrollments.append(Through(student_id=index_numbers[i],
+                                               course_id=course_objs[position].pk))
+            Through.objects.bulk_create(enrollments, batch_size=chunk_size)
+        report(f'{stop} students created')
+
+    # 3. Past lectures, weekly, each opened by an (expired) QR session
+    enrolled = sum(len(roster) for roster in rosters)
+    lectures = _lecture_count(records, enrolled)
+    rate = min(0.98, records / max(1, enrolled * lectures))
+    now = timezone.now()
+    held = [now - timedelta(weeks=lectures - number) for number in range(lectures)]
+    with transaction.atomic():
+        Course.objects.filter(pk__in=[c.pk for c in course_objs]).update(
+            total_lectures_possible=lectures)
+        keys = SessionKey.objects.bulk_create([
+            SessionKey(key=f'{course.pk}|synthetic-{number}', course=course,
+                       expires_at=held[number] + timedelta(minutes=15),
+                       required_latitude=HALL_LATITUDE,
+                       required_longitude=HALL_LONGITUDE)
+            for course in course_objs for number in range(lectures)
+        ])
+        sessions = LectureSession.objects.bulk_create([
+            LectureSession(course_id=key.course_id, label=key.key, session_key=key,
+                           held_at=held[number % lectures])
+            for number, key in enumerate(keys)
+        ])
+    report(f'{len(sessions)} lectures created')
+
+    # 4. Attendance: each student has a habit around the overall rate
+    written = 0
+    for position, course in enumerate(course_objs):
+        roster = np.array(rosters[position])
+        if not len(roster):
+            continue
+        habit = rng.beta(rate * 4, (1 - rate) * 4, size=len(roster))
+        course_sessions = sessions[position * lectures:(position + 1) * lectures]
+        rows = []
+        for number, lecture in enumerate(course_sessions):
+            present = roster[rng.random(len(roster)) < habit]
+            offsets = rng.uniform(0, 600, size=len(present))
+            latitudes = HALL_LATITUDE + rng.normal(0, 0.0002, size=len(present))
+            longitudes = HALL_LONGITUDE + rng.normal(0, 0.0002, size=len(present))
+            for i, student_id in enumerate(present):
+                rows.append(AttendanceRecord(
+                    course_id=course.pk, student_id=student_id, session_id=lecture.pk,
+                    timestamp=held[number] + timedelta(seconds=float(offsets[i])),
+                    student_latitude=round(float(latitudes[i]), 6),
+                    student_longitude=round(float(longitudes[i]), 6)))
+        with transaction.atomic():
+            AttendanceRecord.objects.bulk_create(rows, batch_size=chunk_size)
+        written += len(rows)
+        report(f'{course.course_code}: {len(rows)} attendance records')
+
+    rebuild_tallies(Course.objects.filter(pk__in=[c.pk for c in course_objs]))
+    report('tallies rebuilt')
+
+    return {
+        'courses': courses,
+        'students': students,
+        'enrollments': enrolled,
+        'lectures': len(sessions),
+        'records': written,
+        'seconds': round(time.perf_counter() - started, 1),
+    }
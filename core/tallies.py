@@ -0,0 +1,112 @@
+"""Maintenance of the materialized AttendanceTally table.
+
+Tallies are refreshed for exactly the (student, course) pairs a write
+touched, with one grouped aggregate over the attendance index and one
+upsert. Recomputing rather than incrementing keeps them exact even when
+a bulk insert silently skips duplicate scans.
+
+Single-object saves and deletes (such as admin edits) are handled by
+signal handlers; bulk writers call ``sync_tallies`` themselves.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .dashboard import invalidate_course_stats
+from .models import AttendanceRecord, AttendanceTally, Course
+
+
+def sync_tallies(course_id, student_ids):
+    """Recomputes the tallies of the given students in one course."""
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+    counts = {
+        row['student_id']: row
+        for row in AttendanceRecord.objects.filter(
+            course_id=course_id, student_id__in=student_ids)
+        .values('student_id')
+        .annotate(attended=Count('id'), last=Max('timestamp'))
+    }
+    with transaction.atomic(savepoint=False):
+        AttendanceTally.objects.bulk_create(
+            [AttendanceTally(course_id=course_id, student_id=student_id,
+                             attended_count=counts[student_id]['attended'],
+                             last_seen=counts[student_id]['last'])
+             for student_id in counts],
+            update_conflicts=True,
+            unique_fields=['course', 'student'],
+            update_fields=['attended_count', 'last_seen'],
+        )
+        # Students whose last record in the course was deleted
+        emptied = student_ids - set(counts)
+        if emptied:
+            AttendanceTally.objects.filter(
+                course_id=course_id, student_id__in=emptied).delete()
+    invalidate_course_stats(course_id)
+
+
+def sync_records(records):
+    """Refreshes the tallies touched by an iterable of attendance rows.
+
+    Accepts AttendanceRecord instances or dicts with course_id/student_id.
+    """
+    touched = defaultdict(set)
+    for record in records:
+        if isinstance(record, dict):
+            touched[record['course_id']].add(record['student_id'])
+        else:
+            touched[record.course_id].add(record.student_id)
+    for course_id, student_ids in touched.items():
+        sync_tallies(course_id, student_ids)
+
+
+def expected_tallies(course):
+    """Returns {student_id: (count, last_seen)} computed from the raw records."""
+    return {
+        row['student_id']: (row['attended'], row['last'])
+        for row in AttendanceRecord.objects.filter(course=course)
+        .values('student_id')
+        .annotate(attended=Count('id'), last=Max('timestamp'))
+        .iterator()
+    }
+
+
+def rebuild_tallies(courses=None):
+    """Recomputes every tally of the given courses (default: all) from the log."""
+    courses = Course.objects.all() if courses is None else courses
+    rebuilt = 0
+    for course in courses:
+        expected = expected_tallies(course)
+        with transaction.atomic():
+            AttendanceTally.objects.filter(course=course).delete()
+            AttendanceTally.objects.bulk_create(
+                [AttendanceTally(course=course, student_id=student_id,
+                                 attended_count=count, last_seen=last)
+                 for student_id, (count, last) in expected.items()],
+                batch_size=2000,
+            )
+        invalidate_course_stats(course.pk)
+        rebuilt += len(expected)
+    return rebuilt
+
+
+def check_tallies(courses=None):
+    """Compares tallies with the raw records.
+
+    Returns a list of ``(course_code, student_id, tallied, actual)`` for
+    every pair that disagrees, where missing tallies count as zero.
+    """
+    courses = Course.objects.all() if courses is None else courses
+    mismatches = []
+    for course in courses:
+        expected = expected_tallies(course)
+        tallied = dict(AttendanceTally.objects.filter(course=course)
+                       .values_list('student_id', 'attended_count').iterator())
+        for student_id in sorted(set(expected) | set(tallied)):
+            actual = expected.get(student_id, (0, None))[0]
+            stored = tallied.get(student_id, 0)
+            if actual != stored:
+                mismatches.append((course.course_code, student_id, stored, actual))
+    return mismatches
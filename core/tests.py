@@ -1,3 +1,1213 @@
-from django.test import TestCase
+import tempfile
+from io import StringIO
+from unittest import mock
+from contextlib import contextmanager
 
-# Create your tests here.
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .anomalies import find_clusters, scan_sessions
+from .api import issue_token
+from .attendance import record_manual_session
+from .dashboard import lecturer_dashboard
+from .exports import GRADE_HEADER
+from .geofence import CircleFence, PolygonFence, audit_records
+from .grading import course_grades
+from .ingest import IngestQueue, aget_ingest_queue
+from .metrics import registry
+from .models import (
+    ArchivedAttendance, AttendanceRecord, AttendanceTally, Course, LectureSession,
+    SessionKey, Student, StudentMaxMarks)
+from .ratelimit import (
+    DEFAULTS as RATE_LIMIT_DEFAULTS, CacheBackend, get_backend, rate_limit_settings,
+    throttle_scan)
+from .roster import get_roster_index
+from .session_cache import active_sessions
+from .synthetic import generate_dataset
+from .tallies import check_tallies, rebuild_tallies
+from .tokens import current_slot, current_token, make_token
+
+
+@contextmanager
+def capture_queries():
+    """Records executed SQL, unaffected by the per-request query log reset."""
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield queries
+
+
+def reset_rate_limits():
+    get_backend(rate_limit_settings()['BACKEND']).clear()
+
+
+def make_course(lecturer, code='CSM 101', lectures=12, max_marks=10):
+    course = Course.objects.create(
+        course_code=code, name=f'{code} Course', lecturer=lecturer,
+        total_lectures_possible=lectures)
+    StudentMaxMarks.objects.create(course=course, max_attendance_marks=max_marks)
+    return course
+
+
+def open_session(course, key=None, minutes=10):
+    session = SessionKey.objects.create(
+        key=key or f'{course.pk}|session', course=course,
+        expires_at=timezone.now() + timedelta(minutes=minutes),
+        required_latitude=6.6710, required_longitude=-1.5658)
+    LectureSession.for_session_key(session)
+    return session
+
+
+def lecture(course, label):
+    return LectureSession.objects.get_or_create(course=course, label=label)[0]
+
+
+def enroll(course, count, prefix='20'):
+    students = []
+    for i in range(count):
+        student = Student.objects.create(
+            index_number=f'{prefix}{course.pk:03d}{i:05d}',
+            full_name=f'Student {prefix} {course.pk} {i}')
+        student.courses.add(course)
+        students.append(student)
+    return students
+
+
+class GradeComputationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer, lectures=4)
+        self.other = make_course(self.lecturer, code='CSM 102', lectures=4)
+
+    def test_scores_only_count_records_for_the_course(self):
+        student = enroll(self.course, 1)[0]
+        student.courses.add(self.other)
+        for i in range(2):
+            AttendanceRecord.objects.create(
+                course=self.course, student=student, session=lecture(self.course, f'W{i}'))
+        for i in range(3):
+            AttendanceRecord.objects.create(
+                course=self.other, student=student, session=lecture(self.other, f'W{i}'))
+
+        row = course_grades(self.course)[0]
+        self.assertEqual(row['attendance_score'], 5.0)
+        self.assertEqual(row['warning'], '')
+        self.assertEqual(student.attendance_score_for(self.other), 7.5)
+
+    def test_missed_lectures_count_sessions_actually_held(self):
+        student, classmate = enroll(self.course, 2)
+        AttendanceRecord.objects.create(
+            course=self.course, student=student, session=lecture(self.course, 'W1'))
+        lecture(self.course, 'W2').records.create(course=self.course, student=classmate)
+        self.assertEqual(course_grades(self.course)[0]['warning'], '')
+
+        lecture(self.course, 'W3').records.create(course=self.course, student=classmate)
+        self.assertEqual(course_grades(self.course)[0]['warning'],
+                         'WARNING: Missed 2 lectures.')
+
+    def test_abandoned_qr_sessions_are_not_lectures_held(self):
+        student = enroll(self.course, 1)[0]
+        for week in range(3):
+            # A code opened and regenerated before anyone scanned
+            open_session(self.course, key=f'abandoned {week}')
+            open_session(self.course, key=f'week {week}').lecture.records.create(
+                course=self.course, student=student)
+        self.assertEqual(course_grades(self.course)[0]['warning'], '')
+
+    def test_view_grades_query_count_is_independent_of_enrollment(self):
+        self.client.force_login(self.lecturer)
+        url = reverse('core:view_grades')
+
+        def queries_for(course):
+            with capture_queries() as queries:
+                response = self.client.post(url, {'course_id': course.pk})
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        enroll(self.course, 3, prefix='1')
+        enroll(self.other, 40, prefix='2')
+        self.client.get(url)  # Both render the same cached course picker
+        self.assertEqual(queries_for(self.course), queries_for(self.other))
+
+
+class RecordAttendanceTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.students = enroll(self.course, 5)
+        self.client.force_login(self.lecturer)
+        self.url = reverse('core:record_attendance')
+
+    def test_submission_is_written_in_bulk(self):
+        index_numbers = [s.index_number for s in self.students]
+        with capture_queries() as queries:
+            response = self.client.post(self.url, {
+                'course_id': self.course.pk, 'session_key': 'Week 1',
+                'present_students': index_numbers})
+        self.assertRedirects(response, reverse('core:index'))
+        self.assertEqual(AttendanceRecord.objects.count(), 5)
+        inserts = [sql for sql in queries
+                   if sql.startswith('INSERT') and 'core_attendancerecord' in sql]
+        self.assertEqual(len(inserts), 1)
+
+    def test_unknown_index_numbers_are_reported_together(self):
+        response = self.client.post(self.url, {
+            'course_id': self.course.pk, 'session_key': 'Week 1',
+            'present_students': [self.students[0].index_number, 'X1', 'X2']})
+        self.assertContains(response, 'X1, X2')
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    def test_course_list_and_roster_are_served_from_cached_fragments(self):
+        url = f'{self.url}?course_id={self.course.pk}'
+        self.client.get(url)
+        with capture_queries() as queries:
+            response = self.client.get(url)
+        self.assertContains(response, self.students[-1].full_name)
+        self.assertFalse(any('core_student' in sql for sql in queries))
+        # Only the selected course itself is looked up
+        self.assertEqual(len([sql for sql in queries if 'core_course' in sql]), 1)
+
+        # Enrollment bumps the roster version
+        late = Student.objects.create(index_number='2099', full_name='Late Enrollee')
+        late.courses.add(self.course)
+        self.assertContains(self.client.get(url), 'Late Enrollee')
+
+    def test_course_changes_refresh_every_course_picker(self):
+        for name in ('record_attendance', 'view_grades', 'generate_qr_code'):
+            self.assertContains(self.client.get(reverse(f'core:{name}')), self.course.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.name = 'Renamed Course'
+            self.course.save()
+            make_course(self.lecturer, code='CSM 102')
+        for name in ('record_attendance', 'view_grades', 'generate_qr_code'):
+            response = self.client.get(reverse(f'core:{name}'))
+            self.assertContains(response, 'Renamed Course')
+            self.assertContains(response, 'CSM 102')
+
+
+class RosterIndexTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.student = Student.objects.create(
+            index_number='2041', full_name='Kwame  Nkrumah Mensah')
+        self.student.courses.add(self.course)
+
+    def test_match_uses_normalized_names(self):
+        index = get_roster_index(self.course.pk)
+        self.assertEqual(index.match('KWAME NKRUMAH'),
+                         ('2041', 'Kwame  Nkrumah Mensah'))
+        self.assertIsNone(index.match('Ama Serwaa'))
+        self.assertIs(get_roster_index(self.course.pk), index)
+
+    def test_enrollment_changes_invalidate_the_index(self):
+        index = get_roster_index(self.course.pk)
+        other = Student.objects.create(index_number='2042', full_name='Ama Serwaa')
+        self.course.student_set.add(other)
+        index = get_roster_index(self.course.pk)
+        self.assertEqual(index.match('ama serwaa'), ('2042', 'Ama Serwaa'))
+
+        self.student.courses.remove(self.course)
+        self.assertEqual(len(get_roster_index(self.course.pk)), 1)
+
+    def test_index_expires_without_a_shared_version_bump(self):
+        index = get_roster_index(self.course.pk)
+        # A rename made by another worker whose version bump this one never saw
+        Student.objects.filter(pk='2041').update(full_name='Kwame Mensah')
+        self.assertIs(get_roster_index(self.course.pk), index)
+        with override_settings(ATTENDANCE_ROSTER_TTL=0):
+            index = get_roster_index(self.course.pk)
+        self.assertEqual(index.full_names, ['Kwame Mensah'])
+
+
+class ScanAttendanceTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.session = open_session(self.course)
+        self.url = reverse('core:scan_attendance', kwargs={'key': self.session.key})
+        reset_rate_limits()
+        active_sessions.clear()
+        active_sessions.put(self.session)
+
+    def scan(self, student, **extra):
+        data = {'full_name': student.full_name,
+                'index_number': student.index_number,
+                'latitude': '6.6710', 'longitude': '-1.5658'}
+        data.update(extra)
+        with capture_queries() as queries:
+            response = self.client.post(self.url, data)
+        return response, queries
+
+    def test_scan_query_count_is_independent_of_course_size(self):
+        small = enroll(self.course, 3)
+        response, queries = self.scan(small[0])
+        self.assertContains(response, 'Attendance recorded')
+
+        large = enroll(self.course, 60, prefix='3')
+        response, more_queries = self.scan(large[-1])
+        self.assertContains(response, 'Attendance recorded')
+        self.assertEqual(len(queries), len(more_queries))
+        statements = [sql for sql in queries if 'SAVEPOINT' not in sql]
+        self.assertLessEqual(len(statements), 5)
+        self.assertFalse(any('core_sessionkey' in sql for sql in queries))
+
+    def test_session_lookups_are_served_from_the_cache(self):
+        active_sessions.clear()
+        hits, misses = active_sessions.hits, active_sessions.misses
+        self.client.get(self.url)
+        with capture_queries() as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, self.course.course_code)
+        self.assertEqual(queries, [])
+        self.assertEqual(active_sessions.misses - misses, 1)
+        self.assertEqual(active_sessions.hits - hits, 1)
+
+    def test_expired_sessions_are_not_cached(self):
+        self.session.expires_at = timezone.now() - timedelta(minutes=1)
+        self.session.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'session has expired')
+        self.assertNotIn(self.session.key, active_sessions._entries)
+
+    def test_repeated_scans_record_attendance_once(self):
+        student = enroll(self.course, 1)[0]
+        for _ in range(3):
+            response, _ = self.scan(student)
+            self.assertContains(response, 'Attendance recorded')
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+
+    def test_rotating_sessions_require_a_recent_token(self):
+        self.session.rotation_seconds = 30
+        self.session.save()
+        active_sessions.put(self.session)
+        student = enroll(self.course, 1)[0]
+
+        response, _ = self.scan(student)
+        self.assertContains(response, 'no longer valid')
+
+        stale = make_token(self.session.key, current_slot(30) - 10)
+        self.url = f"{self.url}?t={stale}"
+        response, _ = self.scan(student)
+        self.assertContains(response, 'no longer valid')
+
+        token = current_token(self.session.key, 30)
+        self.url = self.url.split('?')[0] + f'?t={token}'
+        form = self.client.get(self.url)
+        self.assertContains(form, f'?t={token}')
+        response, queries = self.scan(student)
+        self.assertContains(response, 'Attendance recorded')
+        self.assertFalse(any('core_sessionkey' in sql for sql in queries))
+
+    def test_unenrolled_student_is_rejected(self):
+        outsider = Student.objects.create(index_number='999', full_name='Outsider')
+        response, _ = self.scan(outsider)
+        self.assertContains(response, 'not registered for this course')
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+
+class AsyncScanAttendanceTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.session = open_session(self.course)
+        self.url = reverse('core:scan_attendance_async', kwargs={'key': self.session.key})
+        self.students = enroll(self.course, 3)
+        reset_rate_limits()
+        active_sessions.clear()
+
+    async def scan(self, full_name, index_number):
+        return await self.async_client.post(self.url, {
+            'full_name': full_name, 'index_number': index_number,
+            'latitude': '6.6710', 'longitude': '-1.5658'})
+
+    async def test_scan_is_recorded_once_and_tallied(self):
+        student = self.students[0]
+        for _ in range(2):
+            response = await self.scan(student.full_name, student.index_number)
+            self.assertContains(response, 'Attendance recorded')
+        self.assertEqual(await AttendanceRecord.objects.acount(), 1)
+        tally = await AttendanceTally.objects.aget(student=student)
+        self.assertEqual(tally.attended_count, 1)
+
+    async def test_form_posts_back_to_the_async_view(self):
+        response = await self.async_client.get(self.url)
+        self.assertContains(response, f'action="{self.url}"')
+
+    async def test_name_falls_back_to_the_roster(self):
+        student = self.students[1]
+        response = await self.scan(student.full_name, 'mistyped')
+        self.assertContains(response, f'Attendance recorded for {student.full_name}')
+        record = await AttendanceRecord.objects.aget(student=student)
+        self.assertTrue(record.matched_by_name)
+
+    async def test_unenrolled_and_out_of_range_scans_are_refused(self):
+        await Student.objects.acreate(index_number='999', full_name='Outsider')
+        response = await self.scan('Outsider', '999')
+        self.assertContains(response, 'not registered for this course')
+
+        student = self.students[2]
+        response = await self.async_client.post(self.url, {
+            'full_name': student.full_name, 'index_number': student.index_number,
+            'latitude': '6.7000', 'longitude': '-1.5658'})
+        self.assertContains(response, 'Attendance flagged')
+        self.assertFalse(await AttendanceRecord.objects.aexists())
+
+    async def test_first_queued_scan_replays_the_spool_off_the_event_loop(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        lecture_id = (await LectureSession.objects.aget(session_key=self.session)).pk
+        crashed = IngestQueue(spool_dir=spool.name)
+        crashed.submit(course_id=self.course.pk, student_id=self.students[0].pk,
+                       session_id=lecture_id, timestamp=timezone.now(),
+                       student_latitude='6.671', student_longitude='-1.5658')
+        crashed._segment[1].close()
+
+        student = self.students[1]
+        with override_settings(ATTENDANCE_INGEST={'ENABLED': True, 'SPOOL_DIR': spool.name}), \
+                mock.patch('core.ingest._queue', None), \
+                mock.patch.object(IngestQueue, 'start'):
+            response = await self.scan(student.full_name, student.index_number)
+            queue = await aget_ingest_queue()
+        self.assertContains(response, 'Attendance recorded')
+        # The crashed worker's scan was replayed; the new one waits in the queue
+        self.assertEqual(await AttendanceRecord.objects.acount(), 1)
+        self.assertEqual(len(queue), 1)
+
+
+class IngestQueueTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.students = enroll(self.course, 3)
+        self.lecture = lecture(self.course, 'Week 1')
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool_dir = spool.name
+
+    def submit_all(self, queue):
+        for student in self.students:
+            queue.submit(course_id=self.course.pk, student_id=student.pk,
+                         session_id=self.lecture.pk, timestamp=timezone.now(),
+                         student_latitude='6.671', student_longitude='-1.5658')
+
+    def test_flush_writes_queued_scans_in_one_batch(self):
+        queue = IngestQueue(spool_dir=self.spool_dir)
+        self.submit_all(queue)
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+        with capture_queries() as queries:
+            self.assertEqual(queue.flush(), 3)
+        self.assertEqual(AttendanceRecord.objects.count(), 3)
+        self.assertEqual(sum(sql.startswith('INSERT') and 'core_attendancerecord' in sql
+                             for sql in queries), 1)
+        self.assertEqual(list(queue.spool_dir.glob('*.jsonl')), [])
+
+    def test_recover_replays_segments_of_a_dead_worker(self):
+        crashed = IngestQueue(spool_dir=self.spool_dir)
+        self.submit_all(crashed)
+        # Closing the handle releases the lock, as the worker's death would
+        crashed._segment[1].close()
+
+        self.assertEqual(IngestQueue(spool_dir=self.spool_dir).recover(), 3)
+        self.assertEqual(AttendanceRecord.objects.count(), 3)
+
+    def test_failed_batch_is_kept_until_it_commits(self):
+        queue = IngestQueue(spool_dir=self.spool_dir)
+        self.submit_all(queue)
+        with mock.patch('core.ingest.write_rows', side_effect=DatabaseError('boom')):
+            self.assertEqual(queue.flush(), 0)
+        self.assertEqual(len(list(queue.spool_dir.glob('*.jsonl'))), 1)
+
+        queue.submit(course_id=self.course.pk, student_id=self.students[0].pk,
+                     session_id=lecture(self.course, 'Week 2').pk,
+                     timestamp=timezone.now(),
+                     student_latitude='6.671', student_longitude='-1.5658')
+        self.assertEqual(queue.flush(), 4)
+        self.assertEqual(AttendanceRecord.objects.count(), 4)
+        self.assertEqual(list(queue.spool_dir.glob('*.jsonl')), [])
+
+
+class GeofenceTests(TestCase):
+    # A roughly 110m x 110m square around the example KNUST location
+    HALL = [[6.6705, -1.5663], [6.6705, -1.5653], [6.6715, -1.5653], [6.6715, -1.5663]]
+
+    def test_circle_matches_between_scalar_and_batch(self):
+        fence = CircleFence(6.6710, -1.5658, 50)
+        lats = np.array([6.6710, 6.6713, 6.6800])
+        lons = np.array([-1.5658, -1.5658, -1.5658])
+        inside, distance = fence.check_many(lats, lons)
+        self.assertEqual(inside.tolist(), [True, True, False])
+        for lat, lon, expected in zip(lats, lons, distance):
+            self.assertAlmostEqual(fence.check(lat, lon)[1], expected, places=6)
+        self.assertAlmostEqual(distance[2], 1000.8, delta=1)
+
+    def test_polygon_reports_distance_outside_the_outline(self):
+        fence = PolygonFence(self.HALL, tolerance_m=10)
+        self.assertEqual(fence.check(6.6710, -1.5658), (True, 0.0))
+        inside, distance = fence.check(6.6717, -1.5658)
+        self.assertFalse(inside)
+        self.assertAlmostEqual(distance, 22.2, delta=0.5)
+
+        lats = np.array([6.6710, 6.6717, 6.67155])
+        lons = np.array([-1.5658, -1.5658, -1.5658])
+        inside, distance = fence.check_many(lats, lons)
+        self.assertEqual(inside.tolist(), [True, False, True])
+        self.assertAlmostEqual(distance[1], 22.2, delta=0.5)
+
+    def test_audit_flags_records_outside_their_session_fence(self):
+        lecturer = User.objects.create_user('lecturer', password='pass')
+        course = make_course(lecturer)
+        session = open_session(course)
+        near, far = enroll(course, 2)
+        for student, lat in ((near, '6.671000'), (far, '6.690000')):
+            AttendanceRecord.objects.create(
+                course=course, student=student, session=session.lecture,
+                student_latitude=lat, student_longitude='-1.565800')
+
+        flagged = audit_records(AttendanceRecord.objects.all())
+        self.assertEqual([(key, round(d, -2)) for _, key, d in flagged],
+                         [(session.key, 2100.0)])
+
+
+class QRImageTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.client.force_login(self.lecturer)
+
+    def test_display_page_links_to_the_cached_image(self):
+        response = self.client.post(reverse('core:generate_qr_code'),
+                                    {'course_id': self.course.pk, 'duration': 10})
+        key = response.context['session_key']
+        url = reverse('core:qr_image', kwargs={'key': key})
+        self.assertContains(response, f'src="{url}"')
+        self.assertNotContains(response, 'base64')
+
+        image = self.client.get(url)
+        self.assertEqual(image['Content-Type'], 'image/png')
+        self.assertTrue(image.content.startswith(b'\x89PNG'))
+        self.assertIn('max-age=', image['Cache-Control'])
+
+        svg = self.client.get(url, {'format': 'svg'})
+        self.assertEqual(svg['Content-Type'], 'image/svg+xml')
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=image['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer, lectures=2)
+        self.students = enroll(self.course, 3)
+        for session_key, present in (('Week 1', self.students), ('Week 2', self.students[:1])):
+            for student in present:
+                AttendanceRecord.objects.create(
+                    course=self.course, student=student,
+                    session=lecture(self.course, session_key))
+        self.client.force_login(self.lecturer)
+        self.url = reverse('core:export_attendance')
+
+    def read_csv(self, response):
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_grade_sheet_streams_every_course(self):
+        rows = self.read_csv(self.client.get(self.url))
+        self.assertEqual(rows[0], ','.join(GRADE_HEADER))
+        self.assertEqual(len(rows), 4)
+        self.assertIn(f'CSM 101,{self.students[0].index_number},', rows[1])
+
+    def test_register_is_a_session_by_student_matrix(self):
+        rows = self.read_csv(self.client.get(
+            self.url, {'course_id': self.course.pk, 'kind': 'register'}))
+        self.assertEqual(rows[0], 'Index Number,Student Name,Week 1,Week 2,Total')
+        self.assertEqual(rows[1].split(',')[2:], ['P', 'P', '2'])
+        self.assertEqual(rows[2].split(',')[2:], ['P', '', '1'])
+
+    def test_xlsx_export(self):
+        response = self.client.get(self.url, {'course_id': self.course.pk, 'format': 'xlsx'})
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+
+class RosterImportTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.other = make_course(User.objects.create_user('other'), code='MATH 151')
+        self.client.force_login(self.lecturer)
+
+    def upload(self, text, **data):
+        roster = SimpleUploadedFile('roster.csv', text.encode())
+        return self.client.post(reverse('core:import_students'), {'roster': roster, **data})
+
+    def test_import_upserts_students_and_enrollments(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(index_number='2001', full_name='Old Name').courses.add(
+                self.course)
+        get_roster_index(self.course.pk)
+        self.assertEqual(lecturer_dashboard(self.lecturer)[0]['enrolled'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(
+                'Index Number,Full Name,Course Code\n'
+                '2001,Ama Serwaa,CSM 101\n'
+                '2002,Kofi Boateng,CSM 101\n'
+                'bad index!,Nobody,CSM 101\n'
+                '2003,Yaw Osei,MATH 151\n')
+        report = response.context['report']
+        self.assertEqual((report.students, report.skipped), (2, 2))
+        self.assertEqual(Student.objects.get(pk='2001').full_name, 'Ama Serwaa')
+        self.assertEqual(set(self.course.student_set.values_list('pk', flat=True)),
+                         {'2001', '2002'})
+        # Another lecturer's course cannot be enrolled into
+        self.assertIn('unknown course "MATH 151"', report.errors[-1])
+        # The cached roster index sees the bulk-inserted enrollments
+        self.assertEqual(len(get_roster_index(self.course.pk)), 2)
+
+        # The dashboard figures see them too
+        self.assertEqual(lecturer_dashboard(self.lecturer)[0]['enrolled'], 2)
+
+        # Enrollments that already existed are not reported again
+        response = self.upload('index_number,full_name\n2001,Ama Serwaa\n2003,Yaw Osei\n',
+                               course_id=self.course.pk)
+        self.assertEqual(response.context['report'].enrollments, 1)
+        self.assertEqual(self.course.student_set.count(), 3)
+
+    def test_import_only_renames_students_of_the_lecturers_courses(self):
+        outsider = Student.objects.create(index_number='2004', full_name='Yaw Osei')
+        outsider.courses.add(self.other)
+        mine = Student.objects.create(index_number='2005', full_name='Efua Mensa')
+        mine.courses.add(self.course, self.other)
+        get_roster_index(self.other.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload('index_number,full_name\n2004,Someone Else\n'
+                                   '2005,Efua Mensah\n', course_id=self.course.pk)
+        self.assertEqual(response.context['report'].names_kept, 1)
+        self.assertEqual(dict(Student.objects.values_list('pk', 'full_name')),
+                         {'2004': 'Yaw Osei', '2005': 'Efua Mensah'})
+        # The outsider is still enrolled under their registered name
+        self.assertTrue(self.course.student_set.filter(pk='2004').exists())
+        # The rename reaches the other lecturer's cached roster too
+        self.assertIn('Efua Mensah', get_roster_index(self.other.pk).full_names)
+
+    def test_unreadable_workbook_is_reported(self):
+        roster = SimpleUploadedFile('roster.xlsx', b'not a zip archive')
+        response = self.client.post(reverse('core:import_students'),
+                                    {'roster': roster, 'course_id': self.course.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('not a readable Excel', response.context['error_message'])
+
+
+class AttendanceTallyTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.students = enroll(self.course, 3)
+        self.client.force_login(self.lecturer)
+
+    def tally(self, student):
+        return AttendanceTally.objects.filter(
+            course=self.course, student=student).values_list(
+            'attended_count', flat=True).first() or 0
+
+    def test_every_write_path_keeps_tallies_exact(self):
+        first, second, third = self.students
+        # Manual bulk submission, resubmitted
+        for _ in range(2):
+            self.client.post(reverse('core:record_attendance'), {
+                'course_id': self.course.pk, 'session_key': 'Week 1',
+                'present_students': [first.pk, second.pk]})
+        # QR scan
+        session = open_session(self.course)
+        active_sessions.put(session)
+        self.client.post(reverse('core:scan_attendance', kwargs={'key': session.key}), {
+            'full_name': first.full_name, 'index_number': first.pk,
+            'latitude': '6.6710', 'longitude': '-1.5658'})
+        # Admin-style single saves, edits and deletes
+        record = AttendanceRecord.objects.create(
+            course=self.course, student=third, session=lecture(self.course, 'Week 2'))
+        self.assertEqual(self.tally(third), 1)
+        record.student = second
+        record.save()
+        AttendanceRecord.objects.filter(student=first, session__label='Week 1').delete()
+
+        self.assertEqual([self.tally(s) for s in self.students], [1, 2, 0])
+        self.assertEqual(check_tallies(), [])
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        AttendanceRecord.objects.create(
+            course=self.course, student=self.students[0],
+            session=lecture(self.course, 'Week 1'))
+        AttendanceTally.objects.update(attended_count=5)
+        self.assertEqual(check_tallies(), [
+            ('CSM 101', self.students[0].pk, 5, 1)])
+        rebuild_tallies()
+        self.assertEqual(check_tallies(), [])
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_sqlite_connections_are_tuned_for_concurrent_writes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.session = open_session(self.course)
+        self.students = enroll(self.course, 2)
+        active_sessions.clear()
+        registry.clear()
+
+    def test_scan_timings_are_exported_per_route(self):
+        student = self.students[0]
+        self.client.post(
+            reverse('core:scan_attendance', kwargs={'key': self.session.key}),
+            {'full_name': student.full_name, 'index_number': 'mistyped',
+             'latitude': '6.6710', 'longitude': '-1.5658'})
+
+        self.assertEqual(self.client.get(reverse('core:metrics')).status_code, 403)
+        User.objects.create_user('ops', password='pass', is_staff=True)
+        self.client.login(username='ops', password='pass')
+        body = self.client.get(reverse('core:metrics')).content.decode()
+
+        self.assertIn('# TYPE core_request_seconds histogram', body)
+        self.assertIn('core_request_seconds_count{route="core:scan_attendance"} 1', body)
+        self.assertIn('core_request_sql_queries_count{route="core:scan_attendance"} 1', body)
+        for section in ('fuzzy_match', 'geofence'):
+            self.assertIn(
+                f'core_section_seconds_count{{route="core:scan_attendance",'
+                f'section="{section}"}} 1', body)
+
+    @override_settings(ATTENDANCE_METRICS={'TOKEN': 'scrape'})
+    def test_scrapers_authenticate_with_a_bearer_token(self):
+        url = reverse('core:metrics')
+        self.assertEqual(self.client.get(
+            url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        response = self.client.get(url, headers={'Authorization': 'Bearer scrape'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(DEBUG=True, ATTENDANCE_METRICS={'QUERY_COUNT_WARNING': 3})
+    def test_debug_mode_logs_repeated_queries(self):
+        self.client.login(username='lecturer', password='pass')
+        with self.assertLogs('core.metrics', 'WARNING') as logs:
+            self.client.get(reverse('core:view_grades'))
+        self.assertIn('core:view_grades took', logs.output[0])
+        self.assertIn('x ', logs.output[0])
+
+
+class SyntheticDatasetTests(TestCase):
+
+    def test_dataset_is_consistent_and_repeatable(self):
+        summary = generate_dataset(courses=3, students=60, records=400,
+                                   courses_per_student=2, seed=7)
+        self.assertEqual(Student.objects.count(), 60)
+        self.assertEqual(Student.courses.through.objects.count(), 120)
+        self.assertEqual(AttendanceRecord.objects.count(), summary['records'])
+        self.assertAlmostEqual(summary['records'], 400, delta=120)
+        self.assertEqual(check_tallies(Course.objects.all()), [])
+        first = list(AttendanceRecord.objects.order_by('session_id', 'student_id')
+                     .values_list('session__label', 'student_id'))
+
+        with self.assertRaises(ValueError):
+            generate_dataset(courses=3, students=60, records=400, seed=7)
+
+        Course.objects.all().delete()
+        Student.objects.all().delete()
+        generate_dataset(courses=3, students=60, records=400,
+                         courses_per_student=2, seed=7)
+        again = AttendanceRecord.objects.order_by('session_id', 'student_id')
+        self.assertEqual(
+            [(label.split('|')[1], student) for label, student in
+             again.values_list('session__label', 'student_id')],
+            [(label.split('|')[1], student) for label, student in first])
+
+
+class DashboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.students = enroll(self.course, 4)
+        self.client.force_login(self.lecturer)
+
+    def attend(self, label, students):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_manual_session(self.course, label, [s.index_number for s in students])
+
+    def test_course_figures(self):
+        # Student 0 attends everything, 1 misses one, 2 misses two, 3 misses all
+        self.attend('Week 1', self.students[:1])
+        self.attend('Week 2', self.students[:2])
+        self.attend('Week 3', self.students[:3])
+        self.attend('Week 4', self.students[:3])
+        # A code regenerated before anyone scanned it is not a lecture held
+        open_session(self.course, key='regenerated')
+        session = open_session(self.course)
+        AttendanceRecord.objects.create(
+            course=self.course, student=self.students[0], session=session.lecture)
+
+        stats, = lecturer_dashboard(self.lecturer)
+        self.assertEqual(stats['enrolled'], 4)
+        self.assertEqual(stats['sessions_held'], 5)
+        self.assertEqual(stats['average_attendance'], round(100 * 10 / 20, 1))
+        self.assertEqual(stats['at_risk'], 2)
+        self.assertEqual(stats['live_session']['scans'], 1)
+
+    def test_dashboard_queries_do_not_grow_with_courses(self):
+        self.client.get(reverse('core:index'))
+        cache.clear()
+        with capture_queries() as queries:
+            self.client.get(reverse('core:index'))
+        for number in range(5):
+            course = make_course(self.lecturer, code=f'CSM {200 + number}')
+            enroll(course, 10, prefix=str(30 + number))
+        cache.clear()
+        with capture_queries() as more_queries:
+            response = self.client.get(reverse('core:index'))
+        self.assertContains(response, 'CSM 204')
+        self.assertEqual(len(queries), len(more_queries))
+
+        with capture_queries() as cached:
+            self.client.get(reverse('core:index'))
+        self.assertEqual(len(cached), len(more_queries) - 3)
+
+    def test_attendance_writes_invalidate_the_cached_figures(self):
+        session = open_session(self.course)
+        active_sessions.put(session)
+        self.assertEqual(lecturer_dashboard(self.lecturer)[0]['live_session']['scans'], 0)
+
+        student = self.students[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('core:scan_attendance', kwargs={'key': session.key}),
+                {'full_name': student.full_name, 'index_number': student.index_number,
+                 'latitude': '6.6710', 'longitude': '-1.5658'})
+        stats, = lecturer_dashboard(self.lecturer)
+        self.assertEqual(stats['live_session']['scans'], 1)
+        self.assertEqual(stats['sessions_held'], 1)
+
+
+class LiveFeedTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.session = open_session(self.course)
+        self.students = enroll(self.course, 2)
+        active_sessions.clear()
+        self.client.force_login(self.lecturer)
+        self.url = reverse('core:live_attendance', kwargs={'key': self.session.key})
+
+    def scan(self, student):
+        with self.captureOnCommitCallbacks(execute=True):
+            Client().post(
+                reverse('core:scan_attendance', kwargs={'key': self.session.key}),
+                {'full_name': student.full_name, 'index_number': student.index_number,
+                 'latitude': '6.6710', 'longitude': '-1.5658'})
+
+    @mock.patch('core.live.time.time', return_value=1_000_000.0)
+    def test_unchanged_feed_is_not_recomputed(self, _):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['present'], 0)
+        etag = response['ETag']
+
+        with capture_queries() as queries:
+            response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('core_attendancerecord' in sql for sql in queries))
+
+        self.scan(self.students[1])
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        data = response.json()
+        self.assertEqual(data['present'], 1)
+        self.assertEqual(data['recent'][0]['full_name'], self.students[1].full_name)
+
+    def test_feed_is_private_to_the_courses_lecturer(self):
+        other = User.objects.create_user('other', password='pass')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ProxyScanDetectionTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.students = enroll(self.course, 8)
+        self.lecture = open_session(self.course).lecture
+
+    def add_scan(self, student, seconds, lat, lon, matched_by_name=False):
+        AttendanceRecord.objects.create(
+            course=self.course, student=student, session=self.lecture,
+            timestamp=self.lecture.held_at + timedelta(seconds=seconds),
+            student_latitude=lat, student_longitude=lon,
+            matched_by_name=matched_by_name)
+
+    def test_clusters_split_by_a_bucket_boundary_are_found(self):
+        students = np.array(['a', 'b', 'c', 'd'])
+        # 'a' to 'c' scanned within a metre and three seconds, 'd' is 110 m away
+        lats = np.array([6.6710000, 6.6710040, 6.6710050, 6.6720000])
+        lons = np.array([-1.5658, -1.5658, -1.5658, -1.5658])
+        times = np.array([19.0, 21.0, 22.0, 20.0])
+        cluster, = find_clusters(students, lats, lons, times)
+        self.assertEqual(cluster.student_ids, ['a', 'b', 'c'])
+        self.assertEqual(find_clusters(students, lats, lons, times + [0, 0, 60, 0]), [])
+
+    def test_sessions_with_one_phone_marking_friends_are_flagged(self):
+        for i, student in enumerate(self.students[:3]):
+            self.add_scan(student, 5 + i, '6.671000', '-1.565800')
+        for i, student in enumerate(self.students[3:]):
+            self.add_scan(student, 60 * i, f'6.67{11 + i}000', '-1.565800')
+        # Manual registers have no coordinates and are not analyzed
+        record_manual_session(self.course, 'Week 1', [s.index_number for s in self.students])
+
+        finding, = scan_sessions(AttendanceRecord.objects.filter(course=self.course))
+        self.assertEqual(finding.session_id, self.lecture.pk)
+        self.assertEqual(finding.scans, 8)
+        self.assertEqual(finding.clusters[0].student_ids,
+                         sorted(s.index_number for s in self.students[:3]))
+
+    def test_sessions_dominated_by_name_matches_are_flagged(self):
+        for i, student in enumerate(self.students):
+            self.add_scan(student, 60 * i, f'6.67{10 + i}000', '-1.565800',
+                          matched_by_name=i < 3)
+        finding, = scan_sessions(AttendanceRecord.objects.all())
+        self.assertEqual(finding.clusters, [])
+        self.assertEqual(finding.name_matches, 3)
+
+
+# Read before any test overrides them
+CONFIGURED_RATE_LIMIT_RULES = settings.ATTENDANCE_RATE_LIMIT['RULES']
+
+TIGHT_LIMITS = {
+    'BACKEND': 'core.ratelimit.MemoryBackend',
+    'FORWARDED_PROXIES': 1,
+    'RULES': {'ip': {'capacity': 3, 'per_second': 0.01},
+              'student': {'capacity': 2, 'per_second': 0.01}},
+}
+
+
+@override_settings(ATTENDANCE_RATE_LIMIT=TIGHT_LIMITS)
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.session = open_session(self.course)
+        self.url = reverse('core:scan_attendance', kwargs={'key': self.session.key})
+        self.student = enroll(self.course, 1)[0]
+        reset_rate_limits()
+        active_sessions.clear()
+        registry.clear()
+
+    def post(self, address, index_number):
+        return self.client.post(self.url, {
+            'full_name': self.student.full_name, 'index_number': index_number,
+            'latitude': '6.6710', 'longitude': '-1.5658'},
+            # Only the hop appended by the trusted proxy counts
+            headers={'X-Forwarded-For': f'spoofed, {address}'})
+
+    def test_replayed_submissions_are_refused_before_any_query(self):
+        for address in ('1.1.1.1', '2.2.2.2'):
+            self.assertContains(self.post(address, self.student.index_number),
+                                'Attendance recorded')
+        with capture_queries() as queries:
+            response = self.post('3.3.3.3', self.student.index_number)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Too many attempts', response.content.decode())
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(queries, [])
+
+    def test_each_forwarded_address_has_its_own_bucket(self):
+        for index_number in ('a', 'b', 'c'):
+            self.post('1.1.1.1', index_number)
+        self.assertEqual(self.post('1.1.1.1', 'd').status_code, 429)
+        self.assertContains(self.post('2.2.2.2', self.student.index_number),
+                            'Attendance recorded')
+
+        User.objects.create_user('ops', password='pass', is_staff=True)
+        self.client.login(username='ops', password='pass')
+        body = self.client.get(reverse('core:metrics')).content.decode()
+        self.assertIn('# TYPE core_throttled_requests_total counter', body)
+        self.assertIn('core_throttled_requests_total{rule="ip"} 1', body)
+
+    @mock.patch('core.ratelimit.time')
+    def test_a_full_hall_behind_one_address_is_not_refused(self, clock):
+        factory = RequestFactory()
+        for rules in (CONFIGURED_RATE_LIMIT_RULES, RATE_LIMIT_DEFAULTS['RULES']):
+            with override_settings(ATTENDANCE_RATE_LIMIT={'RULES': rules}):
+                reset_rate_limits()
+                refused = 0
+                # 400 students load the form and submit it within one minute
+                for seat in range(400):
+                    clock.monotonic.return_value = 1000 + seat * 60 / 400
+                    form = factory.get(self.url, REMOTE_ADDR='10.0.0.1')
+                    scan = factory.post(self.url, {'index_number': f'20{seat}'},
+                                        REMOTE_ADDR='10.0.0.1')
+                    refused += bool(throttle_scan(form, self.session.key))
+                    refused += bool(throttle_scan(scan, self.session.key))
+                self.assertEqual(refused, 0)
+
+    def test_cache_backend_buckets_are_shared_between_instances(self):
+        cache.clear()
+        first, second = CacheBackend(), CacheBackend()
+        self.assertEqual(first.consume('ip:1.1.1.1', 2, 0.01), 0)
+        self.assertEqual(second.consume('ip:1.1.1.1', 2, 0.01), 0)
+        self.assertGreater(first.consume('ip:1.1.1.1', 2, 0.01), 0)
+
+
+class APITests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        active_sessions.clear()
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.students = enroll(self.course, 3)
+        self.session = open_session(self.course)
+        self.auth = {'Authorization': f'Bearer {issue_token(self.lecturer)}'}
+
+    def submit(self, scans, key=None):
+        return self.client.post(
+            reverse('core:api_submit_scans', kwargs={'key': key or self.session.key}),
+            {'scans': scans}, content_type='application/json', headers=self.auth)
+
+    def scan(self, student, **extra):
+        return {'index_number': student.index_number, 'full_name': student.full_name,
+                'latitude': 6.6710, 'longitude': -1.5658, **extra}
+
+    def test_tokens_are_issued_for_credentials_and_revoked_with_the_password(self):
+        url = reverse('core:api_token')
+        self.assertEqual(self.client.post(
+            url, {'username': 'lecturer', 'password': 'wrong'},
+            content_type='application/json').status_code, 401)
+        token = self.client.post(url, {'username': 'lecturer', 'password': 'pass'},
+                                 content_type='application/json').json()['token']
+
+        headers = {'Authorization': f'Bearer {token}'}
+        response = self.client.get(reverse('core:api_courses'), headers=headers)
+        self.assertEqual([c['course_code'] for c in response.json()['courses']], ['CSM 101'])
+
+        self.lecturer.set_password('changed')
+        self.lecturer.save()
+        self.assertEqual(self.client.get(
+            reverse('core:api_courses'), headers=headers).status_code, 401)
+
+    @mock.patch('core.api.time')
+    def test_roster_is_revalidated_with_its_etag(self, clock):
+        clock.time.return_value = 1_000_000.0
+        url = reverse('core:api_roster', kwargs={'course_id': self.course.pk})
+        response = self.client.get(url, headers=self.auth)
+        self.assertEqual(len(response.json()['students']), 3)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(
+            url, headers={**self.auth, 'If-None-Match': etag}).status_code, 304)
+
+        enroll(self.course, 1, prefix='30')
+        response = self.client.get(url, headers={**self.auth, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['students']), 4)
+
+        # Another worker's ETag may rest on a version it never saw bumped,
+        # so ETags lapse with the roster TTL
+        etag = response['ETag']
+        clock.time.return_value += 300
+        self.assertEqual(self.client.get(
+            url, headers={**self.auth, 'If-None-Match': etag}).status_code, 200)
+
+    def test_sessions_open_only_for_the_lecturers_courses(self):
+        url = reverse('core:api_open_session')
+        response = self.client.post(url, {'course_id': self.course.pk, 'duration': 15},
+                                    content_type='application/json', headers=self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(response.json()['key'], active_sessions._entries)
+
+        other = make_course(User.objects.create_user('other'), code='CSM 102')
+        self.assertEqual(self.client.post(
+            url, {'course_id': other.pk}, content_type='application/json',
+            headers=self.auth).status_code, 404)
+
+    def test_sessions_can_be_opened_with_a_hall_outline(self):
+        url = reverse('core:api_open_session')
+        response = self.client.post(
+            url, {'course_id': self.course.pk, 'geofence_polygon': GeofenceTests.HALL},
+            content_type='application/json', headers=self.auth)
+        self.assertEqual(response.status_code, 201)
+        key = response.json()['key']
+        self.assertEqual(SessionKey.objects.get(pk=key).geofence_polygon, GeofenceTests.HALL)
+        self.assertEqual(active_sessions.get(key).fence.kind, 'polygon')
+
+        for polygon in ([[6.67, -1.56], [6.68, -1.56]], [[6.67, -1.56], 'x', [95, 0]],
+                        [[6.67, -1.56], [6.68, -1.56], [95, 0]]):
+            response = self.client.post(
+                url, {'course_id': self.course.pk, 'geofence_polygon': polygon},
+                content_type='application/json', headers=self.auth)
+            self.assertEqual(response.status_code, 400)
+
+    def test_batch_reports_each_scan_and_writes_once(self):
+        named = Student.objects.create(index_number='2041', full_name='Abena Mensah')
+        named.courses.add(self.course)
+        outsider = Student.objects.create(index_number='2042', full_name='Kofi Boateng')
+        future = (timezone.now() + timedelta(hours=1)).isoformat()
+        before_opening = (timezone.now() - timedelta(hours=1)).isoformat()
+        first, second, third = self.students
+
+        with capture_queries() as queries:
+            response = self.submit([
+                self.scan(first),
+                self.scan(first),
+                self.scan(named, index_number='mistyped'),
+                self.scan(outsider),
+                self.scan(second, latitude=6.6800),
+                self.scan(third, scanned_at=future),
+                self.scan(third, latitude=None),
+                self.scan(third, scanned_at='2024-02-30T10:00:00'),
+                self.scan(third, scanned_at=before_opening),
+            ])
+        body = response.json()
+        self.assertEqual([r['status'] for r in body['results']], [
+            'recorded', 'duplicate', 'recorded', 'rejected', 'rejected',
+            'rejected', 'rejected', 'rejected', 'rejected'])
+        self.assertEqual((body['recorded'], body['duplicate'], body['rejected']), (2, 1, 6))
+        self.assertTrue(body['results'][2]['matched_by_name'])
+        self.assertIn('not registered', body['results'][3]['error'])
+        self.assertIn('Attendance flagged', body['results'][4]['error'])
+        self.assertIn('future', body['results'][5]['error'])
+        self.assertIn('geolocation', body['results'][6]['error'])
+        self.assertIn('ISO 8601', body['results'][7]['error'])
+        self.assertIn('before the session was opened', body['results'][8]['error'])
+
+        inserts = [sql for sql in queries
+                   if sql.startswith('INSERT') and 'core_attendancerecord' in sql]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AttendanceTally.objects.get(student=first).attended_count, 1)
+        self.assertEqual(self.submit([self.scan(first)]).json()['duplicate'], 1)
+
+    def test_offline_scans_sync_after_the_session_expired(self):
+        taken = timezone.now() - timedelta(minutes=30)
+        self.session.created_at = timezone.now() - timedelta(minutes=40)
+        self.session.expires_at = timezone.now() - timedelta(minutes=20)
+        self.session.save()
+        response = self.submit([self.scan(self.students[0], scanned_at=taken.isoformat()),
+                                self.scan(self.students[1])])
+        self.assertEqual([r['status'] for r in response.json()['results']],
+                         ['recorded', 'rejected'])
+        self.assertEqual(AttendanceRecord.objects.get().timestamp, taken)
+
+        with override_settings(ATTENDANCE_API={'SYNC_GRACE_SECONDS': 600}):
+            self.assertEqual(self.submit([self.scan(self.students[0])]).status_code, 410)
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.lecturer = User.objects.create_user('lecturer', password='pass')
+        self.course = make_course(self.lecturer)
+        self.students = enroll(self.course, 3)
+        self.long_ago = timezone.now() - timedelta(days=200)
+
+        # Last semester: a QR session and a manual register
+        self.old_session = open_session(self.course, key='old', minutes=10)
+        SessionKey.objects.filter(pk='old').update(expires_at=self.long_ago)
+        LectureSession.objects.filter(session_key='old').update(held_at=self.long_ago)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_manual_session(self.course, 'Week 1', [s.index_number for s in self.students])
+            LectureSession.objects.filter(label='Week 1').update(held_at=self.long_ago)
+            AttendanceRecord.objects.create(course=self.course, student=self.students[0],
+                                            session=self.old_session.lecture,
+                                            timestamp=self.long_ago)
+            # This semester
+            record_manual_session(self.course, 'Week 1 (new)', [self.students[1].index_number])
+        self.current = open_session(self.course, key='current')
+
+    def prune(self, *args):
+        out = StringIO()
+        call_command('prune_attendance', *args, stdout=out)
+        return out.getvalue()
+
+    def test_expired_unscanned_session_keys_are_deleted_in_batches(self):
+        for key in ('abandoned', 'regenerated'):
+            open_session(self.course, key=key)
+            SessionKey.objects.filter(pk=key).update(expires_at=self.long_ago)
+        self.assertIn('Would delete 2 expired', self.prune('--dry-run'))
+        self.prune('--batch-size', '1', '--no-vacuum')
+        self.assertEqual(set(SessionKey.objects.values_list('pk', flat=True)),
+                         {'old', 'current'})
+        self.assertFalse(LectureSession.objects.filter(label__in=['abandoned', 'regenerated'])
+                         .exists())
+        self.assertEqual(AttendanceRecord.objects.count(), 5)
+
+    def test_scanned_sessions_stay_auditable_after_purging(self):
+        far = AttendanceRecord.objects.create(
+            course=self.course, student=self.students[1], session=self.old_session.lecture,
+            timestamp=self.long_ago, student_latitude='6.6800', student_longitude='-1.5658')
+        self.prune('--no-vacuum')
+        flagged = audit_records(AttendanceRecord.objects.all())
+        self.assertEqual([(record_id, key) for record_id, key, _ in flagged], [(far.pk, 'old')])
+
+    def test_old_semesters_are_rolled_into_summary_rows(self):
+        cutoff = (timezone.now() - timedelta(days=100)).strftime('%Y-%m-%d')
+        output = self.prune('--archive-before', cutoff, '--semester', '2025 S1')
+        self.assertIn('Archived 2 lecture(s) and 4 attendance record(s)', output)
+        self.assertIn('Skipped VACUUM', output)  # TestCase wraps tests in a transaction
+
+        archived = {row.student_id: (row.attended_count, row.sessions_held)
+                    for row in ArchivedAttendance.objects.all()}
+        first, second, third = (s.index_number for s in self.students)
+        self.assertEqual(archived, {first: (2, 2), second: (1, 2), third: (1, 2)})
+        self.assertEqual(LectureSession.objects.count(), 2)
+        self.assertFalse(SessionKey.objects.filter(pk='old').exists())
+        # Tallies and grades now only count this semester
+        self.assertEqual(dict(AttendanceTally.objects.values_list('student_id', 'attended_count')),
+                         {second: 1})
+        self.assertEqual(check_tallies(), [])
+
+        # Archiving more of the same semester adds to its rows
+        lecture(self.course, 'Week 2').records.create(
+            course=self.course, student=self.students[2])
+        LectureSession.objects.filter(label='Week 2').update(held_at=self.long_ago)
+        self.prune('--archive-before', cutoff, '--semester', '2025 S1', '--no-vacuum')
+        self.assertEqual(ArchivedAttendance.objects.get(student=self.students[2]).attended_count, 2)
+        self.assertEqual(set(ArchivedAttendance.objects.values_list('sessions_held', flat=True)), {3})
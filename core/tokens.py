@@ -0,0 +1,56 @@
+"""Stateless rotating tokens for QR sessions.
+
+A rotating session's QR code changes every ``rotation_seconds``. Each code
+carries an HMAC of (session key, time slot) signed with a key derived
+from SECRET_KEY, so the scan view can check it in constant time without
+a database row per rotation. A screenshot forwarded to a friend stops
+working once its slot falls outside the accepted window.
+"""
+import base64
+import hashlib
+import hmac
+import math
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+KEY_SALT = 'core.tokens.qr-rotation'
+TOKEN_BYTES = 12
+
+
+@lru_cache(maxsize=4)
+def _signing_key(secret):
+    return hashlib.sha256((KEY_SALT + secret).encode()).digest()
+
+
+def current_slot(period, now=None):
+    return int((time.time() if now is None else now) // period)
+
+
+def make_token(session_key, slot):
+    """Returns the URL-safe token for one time slot of a session."""
+    digest = hmac.new(_signing_key(settings.SECRET_KEY),
+                      f'{session_key}|{slot}'.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:TOKEN_BYTES]).decode()
+
+
+def current_token(session_key, period, now=None):
+    return make_token(session_key, current_slot(period, now))
+
+
+def seconds_left_in_slot(period, now=None):
+    now = time.time() if now is None else now
+    return period - (now % period)
+
+
+def verify_token(session_key, token, period, max_age, now=None):
+    """Checks ``token`` against the current slot and those of the last ``max_age`` seconds."""
+    if not token:
+        return False
+    slot = current_slot(period, now)
+    accepted = False
+    # Every slot in the window is compared, so timing does not reveal which matched
+    for age in range(max(1, math.ceil(max_age / period)) + 1):
+        accepted |= hmac.compare_digest(make_token(session_key, slot - age), token)
+    return accepted
@@ -1,5 +1,5 @@
 # core/urls.py
-from . import views
+from . import api, views
 from django.urls import path
 app_name = 'core'
 
@@ -7,9 +7,28 @@ app_name = 'core'
 urlpatterns = [
     path('', views.index, name='index'),
     path('attendance/record/', views.record_attendance, name='record_attendance'),
+    path('students/import/', views.import_students, name='import_students'),
     path('grades/', views.view_grades, name='view_grades'),
+    path('grades/export/', views.export_attendance, name='export_attendance'),
 
     path('attendance/generate/', views.generate_qr_code, name='generate_qr_code'),
+    path('attendance/qr/<str:key>/', views.qr_image, name='qr_image'),
+    path('attendance/live/<str:key>/', views.live_attendance,
+         name='live_attendance'),
     path('attendance/scan/<str:key>/',
          views.scan_attendance, name='scan_attendance'),
+    path('attendance/scan/<str:key>/async/',
+         views.scan_attendance_async, name='scan_attendance_async'),
+
+    path('api/v1/token/', api.api_token, name='api_token'),
+    path('api/v1/courses/', api.api_courses, name='api_courses'),
+    path('api/v1/courses/<int:course_id>/roster/', api.api_roster,
+         name='api_roster'),
+    path('api/v1/sessions/', api.api_open_session, name='api_open_session'),
+    path('api/v1/sessions/<str:key>/scans/', api.api_submit_scans,
+         name='api_submit_scans'),
+
+    path('ops/session-cache/', views.session_cache_stats,
+         name='session_cache_stats'),
+    path('ops/metrics/', views.metrics, name='metrics'),
 ]
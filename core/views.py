@@ -1,15 +1,32 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.urls import reverse
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseForbidden,
+    HttpResponseNotModified, JsonResponse, StreamingHttpResponse)
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags, quote_etag
 from django.utils import timezone
-from datetime import timedelta
-from fuzzywuzzy import fuzz
-from math import radians, sin, cos, sqrt, atan2
-import os
-import qrcode
-import io
-import base64
-from .models import Course, Student, AttendanceRecord, SessionKey
+import tempfile
+from asgiref.sync import sync_to_async
+from .models import Course, Student, LectureSession
+from .attendance import (
+    UnknownStudentsError, arecord_scans, open_qr_session, record_manual_session,
+    record_scans)
+from .dashboard import lecturer_dashboard
+from .exports import CONTENT_TYPES, iter_grade_sheet, iter_register, stream_csv, write_xlsx
+from .fragments import fragment_versions
+from .grading import course_grades
+from .live import feed_etag, feed_snapshot
+from .metrics import metrics_settings, render_prometheus
+from .qr import DEFAULT_BOX_SIZE, FORMATS, MAX_BOX_SIZE, scan_url, session_qr_image
+from .ratelimit import throttle_scan
+from .roster_import import import_roster, iter_roster_rows
+from .scans import check_scans
+from .session_cache import active_sessions
+from .tokens import current_token, seconds_left_in_slot, verify_token
 
 
 # --- CORE VIEWS (Requires Login to Filter Data) ---
@@ -18,7 +35,9 @@ from .models import Course, Student, AttendanceRecord, SessionKey
 def index(request):
     """View function for the home page of the site."""
     context = {
-        'message': 'Routing is finally successful!',
+        # Cached per lecturer; see core.dashboard
+        'course_stats': lecturer_dashboard(request.user),
+        'now': timezone.now(),
         'title': 'Lecturer Dashboard',
     }
     return render(request, 'core/index.html', context=context)
@@ -41,23 +60,25 @@ def record_attendance(request):
 
         course = get_object_or_404(Course, pk=course_id)
 
-        # Check for duplicate session key
-        if AttendanceRecord.objects.filter(session_key=session_key, course=course).exists():
+        # Check for duplicate session (served by the course/label unique index)
+        if LectureSession.objects.filter(course=course, label=session_key).exists():
             return render(request, 'core/attendance_record.html', {
                 'courses': courses,
+                **fragment_versions(request.user.pk),
                 'error_message': f'Attendance for session "{session_key}" has already been recorded for this course.',
                 'title': 'Record Attendance',
             })
 
-        # Mark attendance for all present students
-        for student_index in present_students_index:
-            student = get_object_or_404(Student, index_number=student_index)
-            AttendanceRecord.objects.create(
-                course=course,
-                student=student,
-                session_key=session_key,
-                timestamp=timezone.now()
-            )
+        # Mark attendance for all present students in one transaction
+        try:
+            record_manual_session(course, session_key, present_students_index)
+        except UnknownStudentsError as exc:
+            return render(request, 'core/attendance_record.html', {
+                'courses': courses,
+                **fragment_versions(request.user.pk),
+                'error_message': f'No students found with index numbers: {", ".join(exc.index_numbers)}. No attendance was recorded.',
+                'title': 'Record Attendance',
+            })
 
         return redirect('core:index')
 
@@ -70,11 +91,14 @@ def record_attendance(request):
             students = Student.objects.filter(
                 courses=selected_course).order_by('full_name')
 
+        # The course list and roster are lazy; they are only queried when
+        # their cached fragments are stale
         context = {
             'courses': courses,
             'selected_course': selected_course,
             'students': students,
             'title': 'Record Attendance',
+            **fragment_versions(request.user.pk, selected_course.pk if selected_course else None),
         }
         return render(request, 'core/attendance_record.html', context)
 
@@ -85,51 +109,86 @@ def view_grades(request):
 
     # Filter courses to show only those taught by the logged-in user
     courses = Course.objects.filter(lecturer=request.user)
-    context = {'courses': courses, 'title': 'View Student Grades'}
+    context = {'courses': courses, 'title': 'View Student Grades',
+               **fragment_versions(request.user.pk)}
 
     if request.method == 'POST':
         course_id = request.POST.get('course_id')
         course = get_object_or_404(Course, pk=course_id)
 
-        students_in_course = Student.objects.filter(courses=course)
+        # Scores and warnings for the whole course in a constant number of queries
+        student_data = course_grades(course)
 
-        # Calculate scores and check for warnings
-        student_data = []
-        for student in students_in_course:
-            score = student.attendance_score
+        context['selected_course'] = course
+        context['student_data'] = student_data
 
-            # --- WARNING LOGIC ---
-            warning_status = ""
+    return render(request, 'core/view_grades.html', context)
 
-            recent_attendance = AttendanceRecord.objects.filter(
-                student=student,
-                course=course
-            ).order_by('-timestamp')
 
-            total_lectures = course.total_lectures_possible
-            present_sessions = recent_attendance.count()
-            missed_count = total_lectures - present_sessions
+@login_required
+def export_attendance(request):
+    """Streams a grade sheet or attendance register as CSV or XLSX.
+
+    Grade sheets cover the selected course, or every course taught by the
+    lecturer when none is selected. Registers need a course.
+    """
+    courses = Course.objects.filter(lecturer=request.user).order_by('course_code')
+    kind = request.GET.get('kind', 'grades')
+    fmt = request.GET.get('format', 'csv')
+    course_id = request.GET.get('course_id')
+    if kind not in ('grades', 'register') or fmt not in CONTENT_TYPES:
+        raise Http404('Unsupported export.')
+
+    if course_id:
+        courses = [get_object_or_404(courses, pk=course_id)]
+    elif kind == 'register':
+        raise Http404('Attendance registers are exported one course at a time.')
+
+    if kind == 'grades':
+        rows = iter_grade_sheet(courses)
+        name = courses[0].course_code if course_id else 'all-courses'
+    else:
+        rows = iter_register(courses[0])
+        name = courses[0].course_code
+    filename = f"{kind}-{name}.{fmt}".replace(' ', '_')
 
-            # Issue warnings based on missed sessions
-            if total_lectures >= 3:
-                if missed_count >= 3:
-                    warning_status = "CRITICAL: Missed 3 or more lectures."
-                elif missed_count == 2:
-                    warning_status = "WARNING: Missed 2 lectures."
+    if fmt == 'csv':
+        response = StreamingHttpResponse(stream_csv(rows), content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
-            # --- END WARNING LOGIC ---
+    # XLSX is a zip archive, so it is built in a temporary file, not in memory
+    target = tempfile.TemporaryFile()
+    write_xlsx(target, [(kind.title(), rows)])
+    target.seek(0)
+    return FileResponse(target, as_attachment=True, filename=filename,
+                        content_type=CONTENT_TYPES[fmt])
 
-            student_data.append({
-                'full_name': student.full_name,
-                'index_number': student.index_number,
-                'attendance_score': score,
-                'warning': warning_status,
-            })
 
-        context['selected_course'] = course
-        context['student_data'] = student_data
+@login_required
+def import_students(request):
+    """Imports a CSV or XLSX roster of students into the lecturer's courses."""
+    courses = Course.objects.filter(lecturer=request.user)
+    context = {'courses': courses, 'title': 'Import Student Roster',
+               **fragment_versions(request.user.pk)}
 
-    return render(request, 'core/view_grades.html', context)
+    if request.method == 'POST':
+        upload = request.FILES.get('roster')
+        course_id = request.POST.get('course_id')
+        course = get_object_or_404(courses, pk=course_id) if course_id else None
+
+        if not upload:
+            context['error_message'] = 'Please choose a roster file to upload.'
+        else:
+            fmt = 'xlsx' if upload.name.lower().endswith('.xlsx') else 'csv'
+            try:
+                context['report'] = import_roster(
+                    iter_roster_rows(upload, fmt), course=course,
+                    allowed_courses=courses)
+            except ValueError as exc:
+                context['error_message'] = str(exc)
+
+    return render(request, 'core/roster_import.html', context)
 
 
 # --- ADVANCED FEATURES (QR SCAN & FUZZY MATCH) ---
@@ -143,46 +202,21 @@ def generate_qr_code(request):
     if request.method == 'POST':
         course_id = request.POST.get('course_id')
         duration_minutes = int(request.POST.get('duration', 10))
+        rotation_seconds = max(0, int(request.POST.get('rotation', 0) or 0))
 
         course = get_object_or_404(Course, pk=course_id)
 
-        # 1. Generate a unique key
-        unique_key_data = f"{course_id}|{timezone.now().timestamp()}"
-
-        # 2. Set expiry time
-        expires_at = timezone.now() + timedelta(minutes=duration_minutes)
-
-        # 3. Save the session details to the database (Hardcoded location for now)
-        session_obj = SessionKey.objects.create(
-            key=unique_key_data,
-            course=course,
-            expires_at=expires_at,
-            required_latitude=6.6710,  # Example KNUST Lat
-            required_longitude=-1.5658  # Example KNUST Lon
-        )
-
-        # 4. Generate the QR code data (This will be the URL the student scans)
-        # NOTE: Using a hardcoded port 8002 for local testing, replace with public URL on deployment
-        public_host = f"http://127.0.0.1:8002"
-        qr_content = f"{public_host}{reverse('core:scan_attendance', kwargs={'key': unique_key_data})}"
-
-        # 5. Create the QR code image
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(qr_content)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill='black', back_color='white')
-
-        # 6. Convert image to base64 for embedding in HTML
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        qr_image = base64.b64encode(buffer.getvalue()).decode()
+        # Creates the session and its lecture, and caches it for the scans
+        session_obj = open_qr_session(course, duration_minutes, rotation_seconds)
 
+        # The QR image itself is served (and cached) by the qr_image view
+        # so this page stays lightweight
         context = {
-            'qr_image': qr_image,
-            'session_key': unique_key_data,
+            'scan_url': scan_url(session_obj.key),
+            'rotation_seconds': rotation_seconds,
+            'session_key': session_obj.key,
             'course': course,
-            'expires_at': expires_at,
+            'expires_at': session_obj.expires_at,
             'location': "6.6710 Lat, -1.5658 Lon",
             'title': 'QR Code Generated'
         }
@@ -191,106 +225,197 @@ def generate_qr_code(request):
     # GET request: Display form to select course
     context = {
         'courses': courses,
-        'title': 'Generate Attendance QR'
+        'title': 'Generate Attendance QR',
+        **fragment_versions(request.user.pk),
     }
     return render(request, 'core/qr_form.html', context)
 
 
-def scan_attendance(request, key):
-    """Handles the student's submission via QR code scan."""
+@login_required
+def qr_image(request, key):
+    """Serves a session's QR code as PNG or SVG with cache headers and an ETag."""
+    fmt = request.GET.get('format', 'png')
+    if fmt not in FORMATS:
+        raise Http404('Unsupported QR image format.')
+    try:
+        box_size = min(MAX_BOX_SIZE, max(1, int(request.GET.get('size', DEFAULT_BOX_SIZE))))
+    except ValueError:
+        box_size = DEFAULT_BOX_SIZE
+
+    session_obj = active_sessions.get(key)
+    if session_obj is None:
+        raise Http404('No active session matches the given key.')
+
+    if session_obj.rotation_seconds:
+        token = current_token(key, session_obj.rotation_seconds)
+        # Cacheable only until the code rotates
+        lifetime = seconds_left_in_slot(session_obj.rotation_seconds)
+    else:
+        token = None
+        lifetime = (session_obj.expires_at - timezone.now()).total_seconds()
+
+    data, etag = session_qr_image(key, fmt, box_size, token)
+    etag = quote_etag(etag)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(data, content_type=FORMATS[fmt])
+    response['ETag'] = etag
+
+    patch_cache_control(response, private=True, max_age=max(0, int(lifetime)))
+    return response
 
-    session_obj = get_object_or_404(SessionKey, key=key)
 
+@login_required
+def live_attendance(request, key):
+    """Present count and latest arrivals of a session, for the QR display page.
+
+    Polled with If-None-Match; unchanged feeds are answered 304 without
+    querying the attendance records.
+    """
+    session_obj = active_sessions.get(key)
+    if session_obj is None or session_obj.lecturer_id != request.user.pk:
+        raise Http404('No active session matches the given key.')
+
+    etag = quote_etag(feed_etag(session_obj.lecture_id))
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(feed_snapshot(session_obj))
+    response['ETag'] = etag
+    # Browsers revalidate on every poll and turn 304s back into the cached body
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _session_error(request, session_obj, key):
+    """Returns why a scan of this session must be refused, or None."""
     # 1. Check if key has expired
     if session_obj.expires_at < timezone.now():
-        return render(request, 'core/scan_result.html', {'message': 'Attendance session has expired.', 'success': False})
+        return 'Attendance session has expired.'
 
-    if request.method == 'POST':
-        # Capture student data and location (if available)
-        student_name_input = request.POST.get('full_name')
-        index_number_input = request.POST.get('index_number')
-        student_lat = request.POST.get('latitude')
-        student_lon = request.POST.get('longitude')
+    # 2. Rotating sessions: the scanned code must be recent (HMAC check, no DB)
+    if session_obj.rotation_seconds:
+        max_age = (settings.ATTENDANCE_QR_FORM_SECONDS if request.method == 'POST'
+                   else session_obj.rotation_seconds)
+        if not verify_token(key, request.GET.get('t'), session_obj.rotation_seconds, max_age):
+            return 'This QR code is no longer valid. Please scan the code currently on screen.'
+    return None
 
-        # 1. Find student by exact index number (Priority 1)
-        try:
-            student = Student.objects.get(index_number=index_number_input)
-        except Student.DoesNotExist:
-            student = None
-
-        # 2. Fuzzy Name Match (Priority 2)
-        if not student:
-            students_in_course = Student.objects.filter(
-                courses=session_obj.course)
-            best_match = None
-            highest_score = 0
-
-            for s in students_in_course:
-                score = fuzz.partial_ratio(
-                    student_name_input.lower(), s.full_name.lower())
-
-                if score > 85 and score > highest_score:
-                    best_match = s
-                    highest_score = score
-
-            if best_match:
-                student = best_match
-            else:
-                return render(request, 'core/scan_result.html', {'message': 'Student not found or name did not match database records.', 'success': False})
-
-        # 3. Final verification and logging
-        if student and student in session_obj.course.student_set.all():
-
-            # --- GEOLOCATION CHECK ---
-            if not student_lat or not student_lon:
-                return render(request, 'core/scan_result.html', {
-                    'message': 'Attendance requires geolocation. Please enable location services in your browser.',
-                    'success': False
-                })
-
-            if session_obj.required_latitude and student_lat:
-
-                # Convert degrees to radians
-                lat1, lon1 = map(
-                    radians, [session_obj.required_latitude, session_obj.required_longitude])
-                lat2, lon2 = map(
-                    radians, [float(student_lat), float(student_lon)])
-
-                # Haversine formula to calculate distance in meters
-                R = 6371  # Earth radius in km
-                dlon = lon2 - lon1
-                dlat = lat2 - lat1
-
-                a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-                c = 2 * atan2(sqrt(a), sqrt(1 - a))
-                distance_km = R * c
-                distance_m = distance_km * 1000
-
-                if distance_m > session_obj.location_tolerance_m:
-                    return render(request, 'core/scan_result.html', {
-                        'message': f"Attendance flagged: You are {round(distance_m)}m away, but the limit is {session_obj.location_tolerance_m}m. Please move closer to the lecture hall.",
-                        'success': False
-                    })
-            # --- END GEOLOCATION CHECK ---
-
-            # Mark attendance
-            AttendanceRecord.objects.create(
-                course=session_obj.course,
-                student=student,
-                session_key=session_obj.key,
-                timestamp=timezone.now(),
-                student_latitude=student_lat,
-                student_longitude=student_lon
-            )
-            return render(request, 'core/scan_result.html', {'message': f'Attendance recorded for {student.full_name}!', 'success': True})
-
-        return render(request, 'core/scan_result.html', {'message': 'Error: Student is not registered for this course.', 'success': False})
 
-    # GET request: Display the form to the student
-    context = {
+def _throttled(request, wait):
+    """The 429 answer to a scan refused by the rate limiter."""
+    seconds = max(1, round(wait))
+    response = render(request, 'core/scan_result.html', {
+        'message': f'Too many attempts. Please wait {seconds} seconds and try again.',
+        'success': False}, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def _scan_form_context(request, session_obj, key):
+    return {
         'session_key': key,
-        'course_code': session_obj.course.course_code,
+        'token': request.GET.get('t') if session_obj.rotation_seconds else None,
+        'course_code': session_obj.course_code,
         'expires_at': session_obj.expires_at,
         'title': 'Record Your Attendance'
     }
-    return render(request, 'core/scan_form.html', context)
+
+
+def scan_attendance(request, key):
+    """Handles the student's submission via QR code scan."""
+
+    # Rate limits are keyed on the request alone, so hammering is refused
+    # before any lookup or matching work
+    wait = throttle_scan(request, key)
+    if wait:
+        return _throttled(request, wait)
+
+    # Served from the active-session cache; the database is only hit on a miss
+    session_obj = active_sessions.get(key)
+    if session_obj is None:
+        raise Http404('No active session matches the given key.')
+
+    error = _session_error(request, session_obj, key)
+    if error:
+        return render(request, 'core/scan_result.html', {'message': error, 'success': False})
+
+    if request.method == 'POST':
+        # Capture student data and location (if available), then find the
+        # student by index number or, failing that, by name (see core.scans)
+        scan, = check_scans(session_obj, [{
+            'index_number': request.POST.get('index_number'),
+            'full_name': request.POST.get('full_name'),
+            'latitude': request.POST.get('latitude'),
+            'longitude': request.POST.get('longitude'),
+        }])
+        if scan.error:
+            return render(request, 'core/scan_result.html', {'message': scan.error, 'success': False})
+
+        # Mark attendance (queued for a batched write when ingestion is enabled)
+        record_scans(session_obj, [scan])
+        return render(request, 'core/scan_result.html', {'message': f'Attendance recorded for {scan.full_name}!', 'success': True})
+
+    # GET request: Display the form to the student
+    return render(request, 'core/scan_form.html', _scan_form_context(request, session_obj, key))
+
+
+async def scan_attendance_async(request, key):
+    """scan_attendance for ASGI servers, awaiting the database instead of
+    holding a worker thread for each scan."""
+
+    # Resolve the user up front: base.html reads request.user, whose lazy
+    # session lookup is not allowed from the event loop
+    request.user = await request.auser()
+
+    wait = throttle_scan(request, key)
+    if wait:
+        return _throttled(request, wait)
+
+    session_obj = await active_sessions.aget(key)
+    if session_obj is None:
+        raise Http404('No active session matches the given key.')
+
+    error = _session_error(request, session_obj, key)
+    if error:
+        return render(request, 'core/scan_result.html', {'message': error, 'success': False})
+
+    if request.method != 'POST':
+        return render(request, 'core/scan_form.html', _scan_form_context(request, session_obj, key))
+
+    # The checks of scan_attendance, run on a worker thread
+    scan, = await sync_to_async(check_scans)(session_obj, [{
+        'index_number': request.POST.get('index_number'),
+        'full_name': request.POST.get('full_name'),
+        'latitude': request.POST.get('latitude'),
+        'longitude': request.POST.get('longitude'),
+    }])
+    if scan.error:
+        return render(request, 'core/scan_result.html', {'message': scan.error, 'success': False})
+
+    await arecord_scans(session_obj, [scan])
+    return render(request, 'core/scan_result.html', {'message': f'Attendance recorded for {scan.full_name}!', 'success': True})
+
+
+# --- OPERATIONS ---
+
+@staff_member_required
+def session_cache_stats(request):
+    """Reports the active-session cache hit/miss counters as JSON."""
+    return JsonResponse(active_sessions.stats())
+
+
+def metrics(request):
+    """Serves the request histograms in the Prometheus text format.
+
+    Open to staff, and to scrapers sending ``Authorization: Bearer <token>``
+    when ATTENDANCE_METRICS['TOKEN'] is set.
+    """
+    token = metrics_settings()['TOKEN']
+    bearer = request.headers.get('Authorization', '')
+    if not (request.user.is_staff
+            or (token and constant_time_compare(bearer, f'Bearer {token}'))):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')